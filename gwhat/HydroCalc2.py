@@ -127,6 +127,7 @@ class WLCalc(DialogWindow, SaveFileMixin):
         self.canvas.mpl_connect('button_press_event', self.onclick)
         self.canvas.mpl_connect('button_release_event', self.onrelease)
         self.canvas.mpl_connect('resize_event', self.setup_ax_margins)
+        self.canvas.mpl_connect('resize_event', self._update_obs_wl_lod)
         self.canvas.mpl_connect('motion_notify_event', self.on_mouse_move)
         self.canvas.mpl_connect('figure_leave_event', self.on_fig_leave)
         self.canvas.mpl_connect('axes_enter_event', self.on_axes_enter)
@@ -149,6 +150,7 @@ class WLCalc(DialogWindow, SaveFileMixin):
         ax0 = self.fig.add_axes([0, 0, 1, 1], zorder=100)
         ax0.patch.set_visible(False)
         ax0.invert_yaxis()
+        ax0.callbacks.connect('xlim_changed', self._update_obs_wl_lod)
 
         # Precipitation :
         ax1 = ax0.twinx()
@@ -392,6 +394,16 @@ class WLCalc(DialogWindow, SaveFileMixin):
         self.MRC_ObjFnType.addItems(['RMSE', 'MAE'])
         self.MRC_ObjFnType.setCurrentIndex(0)
 
+        self.MRC_wlseries = QComboBox()
+        self.MRC_wlseries.addItems(['Measured', 'Corrected'])
+        self.MRC_wlseries.setCurrentIndex(0)
+        self.MRC_wlseries.setToolTip(
+            "<p>Use the measured water levels or the water levels corrected"
+            " for the barometric pressure and earth tides effects, when"
+            " they were computed for the dataset, to evaluate the MRC.</p>")
+        self.MRC_wlseries.currentIndexChanged.connect(
+            self.mrc_wlseries_changed)
+
         self.MRC_results = QTextEdit()
         self.MRC_results.setReadOnly(True)
         self.MRC_results.setMinimumHeight(25)
@@ -447,6 +459,9 @@ class WLCalc(DialogWindow, SaveFileMixin):
         mrc_lay.addWidget(QLabel('MRC Type :'), row, 0)
         mrc_lay.addWidget(self.MRC_type, row, 1)
         row += 1
+        mrc_lay.addWidget(QLabel('Water Levels :'), row, 0)
+        mrc_lay.addWidget(self.MRC_wlseries, row, 1)
+        row += 1
         mrc_lay.addWidget(self.MRC_results, row, 0, 1, 3)
         row += 1
         mrc_lay.addWidget(mrc_tb, row, 0, 1, 3)
@@ -516,9 +531,18 @@ class WLCalc(DialogWindow, SaveFileMixin):
         mainGrid.setColumnStretch(0, 100)
         mainGrid.setColumnMinimumWidth(2, 250)
 
+    @property
+    def use_corrected_wl(self):
+        """
+        Return whether the corrected water levels are used instead of the
+        measured water levels.
+        """
+        return self.MRC_wlseries.currentIndex() == 1
+
     @property
     def water_lvl(self):
-        return np.array([]) if self.wldset is None else self.wldset.waterlevels
+        return (np.array([]) if self.wldset is None else
+                self.wldset.get_waterlevels(self.use_corrected_wl))
 
     @property
     def time(self):
@@ -560,6 +584,14 @@ class WLCalc(DialogWindow, SaveFileMixin):
             self.btn_delpeak.setValue(False)
         self.draw_mrc()
 
+    def mrc_wlseries_changed(self):
+        """
+        Handle when the water level series used to evaluate the MRC is
+        changed.
+        """
+        self._draw_obs_wl(draw=False)
+        self.draw_mrc()
+
     def btn_MRCalc_isClicked(self):
         if self.wldset is None:
             return
@@ -1230,14 +1262,28 @@ class WLCalc(DialogWindow, SaveFileMixin):
     def _draw_obs_wl(self, draw=True):
         """Draw the observed water level data on the graph."""
         self.clear_selected_wl(draw=False)
-        if self.wldset is not None:
-            self._obs_wl_plt.set_data(
-                self.time + (self.dt4xls2mpl * self.dformat),
-                self.water_lvl)
+        self._update_obs_wl_lod()
         self._obs_wl_plt.set_visible(self.wldset is not None)
         if draw:
             self.draw()
 
+    def _update_obs_wl_lod(self, *args, **kargs):
+        """
+        Update the observed water level data that are plotted on the graph
+        with the level of detail that matches the current range and width
+        in pixels of the x-axis.
+        """
+        if self.wldset is None:
+            self._obs_wl_plt.set_data([], [])
+            return
+        ax0 = self.fig.axes[0]
+        offset = self.dt4xls2mpl * self.dformat
+        xmin, xmax = ax0.get_xlim()
+        time, water_lvl = self.wldset.get_lod_data(
+            xmin - offset, xmax - offset, ax0.get_window_extent().width,
+            self.use_corrected_wl)
+        self._obs_wl_plt.set_data(time + offset, water_lvl)
+
     def _draw_mrc_wl(self):
         """Draw the water levels that were predicted with the MRC."""
         if (self.wldset is not None and self.btn_show_mrc.value() and
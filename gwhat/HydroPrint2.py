@@ -35,7 +35,6 @@ from gwhat.utils.icons import QToolButtonNormal, QToolButtonSmall
 from gwhat.utils import icons
 import gwhat.common.widgets as myqt
 from gwhat.common.utils import find_unique_filename
-from gwhat.projet.reader_waterlvl import load_waterlvl_measures
 from gwhat.widgets.layout import OnOffToggleWidget, VSep
 from gwhat.gwrecharge.glue import GLUEDataFrameBase
 from gwhat.widgets.buttons import LangToolButton
@@ -438,7 +437,8 @@ class HydroprintGUI(myqt.DialogWindow):
 
         fname = os.path.join(
             self.workdir, "Water Levels", 'waterlvl_manual_measurements')
-        tmeas, wlmeas = load_waterlvl_measures(fname, self.wldset['Well'])
+        tmeas, wlmeas = self.dmngr.projet.get_wlmeas(
+            fname, self.wldset['Well'])
         self.wldset.set_wlmeas(tmeas, wlmeas)
 
         # Setup the layout of the hydrograph.
@@ -480,7 +480,8 @@ class HydroprintGUI(myqt.DialogWindow):
     def best_fit_time(self):
         wldset = self.dmngr.get_current_wldset()
         if wldset is not None:
-            date0, date1 = self.hydrograph.best_fit_time(wldset.xldates)
+            date0, date1 = self.hydrograph.best_fit_time(
+                wldset.get_xldate_bounds())
             self.date_start_widget.setDate(QDate(date0[0], date0[1], date0[2]))
             self.date_end_widget.setDate(QDate(date1[0], date1[1], date1[2]))
 
@@ -551,6 +552,7 @@ class HydroprintGUI(myqt.DialogWindow):
             self.hydrograph.draw_ylabels()
         elif sender in [self.date_start_widget, self.date_end_widget]:
             self.hydrograph.set_time_scale()
+            self.hydrograph.draw_waterlvl()
             self.hydrograph.draw_weather()
             self.hydrograph.draw_figure_title()
         elif sender == self.dateDispFreq_spinBox:
@@ -570,6 +572,7 @@ class HydroprintGUI(myqt.DialogWindow):
             self.hydrograph.draw_ylabels()
         elif sender == self.time_scale_label:
             self.hydrograph.set_time_scale()
+            self.hydrograph.draw_waterlvl()
             self.hydrograph.draw_weather()
         else:
             print('No action for this widget yet.')
@@ -628,6 +631,7 @@ class HydroprintGUI(myqt.DialogWindow):
         self.hydrograph.va_ratio = self.page_setup_win.va_ratio
 
         self.hydrograph.trend_line = self.page_setup_win.isTrendLine
+        self.hydrograph.corrected_wl = self.page_setup_win.is_corrected_wl_on
         self.hydrograph.isLegend = self.page_setup_win.isLegend
         self.hydrograph.isGraphTitle = self.page_setup_win.isGraphTitle
         self.hydrograph.set_meteo_on(self.page_setup_win.is_meteo_on)
@@ -755,6 +759,7 @@ class HydroprintGUI(myqt.DialogWindow):
         self.page_setup_win.isLegend = layout['legend_on']
         self.page_setup_win.isGraphTitle = layout['title_on']
         self.page_setup_win.isTrendLine = layout['trend_line']
+        self.page_setup_win.is_corrected_wl_on = layout['corrected_wl_on']
         self.page_setup_win.is_meteo_on = layout['meteo_on']
         self.page_setup_win.is_glue_wl_on = layout['glue_wl_on']
         self.page_setup_win.is_mrc_wl_on = layout['mrc_wl_on']
@@ -763,6 +768,8 @@ class HydroprintGUI(myqt.DialogWindow):
         self.page_setup_win.legend_on.set_value(layout['legend_on'])
         self.page_setup_win.title_on.set_value(layout['title_on'])
         self.page_setup_win.wltrend_on.set_value(layout['trend_line'])
+        self.page_setup_win.corrected_wl_on.set_value(
+            layout['corrected_wl_on'])
         self.page_setup_win.meteo_on.set_value(layout['meteo_on'])
         self.page_setup_win.glue_wl_on.set_value(layout['glue_wl_on'])
         self.page_setup_win.mrc_wl_on.set_value(layout['mrc_wl_on'])
@@ -838,6 +845,8 @@ class HydroprintGUI(myqt.DialogWindow):
         layout['legend_on'] = bool(self.page_setup_win.isLegend)
         layout['language'] = self.btn_language.language
         layout['trend_line'] = bool(self.page_setup_win.isTrendLine)
+        layout['corrected_wl_on'] = bool(
+            self.page_setup_win.is_corrected_wl_on)
         layout['meteo_on'] = bool(self.page_setup_win.is_meteo_on)
         layout['glue_wl_on'] = bool(self.page_setup_win.is_glue_wl_on)
         layout['mrc_wl_on'] = bool(self.page_setup_win.is_mrc_wl_on)
@@ -876,6 +885,7 @@ class PageSetupWin(QWidget):
         self.isLegend = True
         self.isGraphTitle = True
         self.isTrendLine = False
+        self.is_corrected_wl_on = False
         self.is_meteo_on = True
         self.is_glue_wl_on = False
         self.is_mrc_wl_on = False
@@ -979,6 +989,8 @@ class PageSetupWin(QWidget):
         self.legend_on = OnOffToggleWidget('Legend', True)
         self.title_on = OnOffToggleWidget('Figure Title', True)
         self.wltrend_on = OnOffToggleWidget('Water Level Trend', False)
+        self.corrected_wl_on = OnOffToggleWidget(
+            'Corrected Water Levels', False)
         self.meteo_on = OnOffToggleWidget('Weather Data', True)
         self.glue_wl_on = OnOffToggleWidget('GLUE Water Levels', False)
         self.mrc_wl_on = OnOffToggleWidget('MRC Water Levels', False)
@@ -986,8 +998,9 @@ class PageSetupWin(QWidget):
         grpbox = QGroupBox("Graph Components Visibility :")
         layout = QGridLayout(grpbox)
         for i, widget in enumerate([self.legend_on, self.title_on,
-                                    self.wltrend_on, self.meteo_on,
-                                    self.glue_wl_on, self.mrc_wl_on]):
+                                    self.wltrend_on, self.corrected_wl_on,
+                                    self.meteo_on, self.glue_wl_on,
+                                    self.mrc_wl_on]):
             layout.addWidget(widget, i, 0)
         layout.setContentsMargins(10, 10, 10, 10)
 
@@ -1006,6 +1019,7 @@ class PageSetupWin(QWidget):
         self.isLegend = self.legend_on.value()
         self.isGraphTitle = self.title_on.value()
         self.isTrendLine = self.wltrend_on.value()
+        self.is_corrected_wl_on = self.corrected_wl_on.value()
         self.is_meteo_on = self.meteo_on.value()
         self.is_glue_wl_on = self.glue_wl_on.value()
         self.is_mrc_wl_on = self.mrc_wl_on.value()
@@ -1032,6 +1046,7 @@ class PageSetupWin(QWidget):
         self.legend_on.set_value(self.isLegend)
         self.title_on.set_value(self.isGraphTitle)
         self.wltrend_on.set_value(self.isTrendLine)
+        self.corrected_wl_on.set_value(self.is_corrected_wl_on)
         self.meteo_on.set_value(self.is_meteo_on)
         self.glue_wl_on.set_value(self.is_glue_wl_on)
         self.mrc_wl_on.set_value(self.is_mrc_wl_on)
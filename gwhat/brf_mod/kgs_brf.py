@@ -7,97 +7,353 @@
 # Licensed under the terms of the GNU General Public License.
 
 # ---- Standard library imports
-import os
 import os.path as osp
 import csv
 
 # ---- Third party imports
 import pandas as pd
 import numpy as np
-from xlrd import xldate_as_tuple
 
 # ---- Local imports
 from gwhat.brf_mod import __install_dir__
 
 
-def produce_BRFInputtxt(well, time, wl, bp, et):
+# Conversion factor from meters to feet. The water levels and barometric
+# pressure are converted to feet as it was done for the KGS_BRF program,
+# so that the results are comparable with those computed previously.
+M_TO_FEET = 3.28084
 
-    comment = 'No comment men'
-    wlu = 'feet'
-    bpu = 'feet'
-    etu = 'NONE'
-    sampleinterval = time[1]-time[0]
-    timeunits = 'days'
-    N = len(time)
+# The regressors are standardized before the barometric response function
+# is computed and the directions of the standardized lagged design matrix
+# with a singular value smaller than this fraction of the largest one are
+# dropped from the solution. Those directions, like the combinations of the
+# lagged changes of a smooth earth tides signal, cannot be resolved from
+# the data and would otherwise make the coefficients oscillate wildly from
+# one lag to the next.
+BRF_RCOND = 1e-6
 
-    yr, mth, day, hr, mn, sec = xldate_as_tuple(time[0], 0)
-    dst = '%02d/%02d/%d, %02d:%02d:%02d' % (yr, mth, day, hr, mn, sec)
+BRF_COLUMNS = ['Lag', 'A', 'sdA', 'SumA', 'sdSumA',
+               'B', 'sdB', 'SumB', 'sdSumB']
 
-    yr, mth, day, hr, mn, sec = xldate_as_tuple(time[-1], 0)
-    det = '%02d/%02d/%d, %02d:%02d:%02d' % (yr, mth, day, hr, mn, sec)
 
-    fcontent = []
-    fcontent.append(['Comment: %s' % comment])
-    fcontent.append(['Well: %s' % well])
-    fcontent.append(['WL Units: %s' % wlu])
-    fcontent.append(['BP Units: %s' % bpu])
-    fcontent.append(['ET Units: %s' % etu])
+def calcul_brf(time, wl, bp, et, lagBP, lagET, detrend_waterlevels=True):
+    """
+    Compute the barometric response function of a well with the regression
+    deconvolution method of Rasmussen and Crawford (1997) that is used in
+    the KGS_BRF program (Butler et al., 2011).
 
-    fcontent.append(['Sample Interval: %f' % sampleinterval])
-    fcontent.append(['Time Units: %s' % timeunits])
-    fcontent.append(['Data Start Time: %s' % dst])
-    fcontent.append(['Data End Time: %s' % det])
+    The changes in water level are regressed on the current and lagged
+    changes in barometric pressure and earth tides with a least-squares
+    solve of the lagged design matrix. When detrend_waterlevels is True,
+    a constant is added to the regression to remove any linear trend in
+    the water levels. No earth tide lags are used when lagET is negative.
+    The barometric response function is positive when the water levels
+    drop in response to an increase of the barometric pressure, as in the
+    results of the KGS_BRF program.
 
-    fcontent.append(['Number of Data: %d' % N])
-    fcontent.append(['Time WL BP ET'])
+    The time must be a series of numerical Excel dates sampled at a regular
+    interval, the water levels must be in meters below ground surface and
+    the barometric pressure in meters of water. Return a dataframe with
+    the same structure as the one returned by read_brf_output.
+    """
+    time = np.asarray(time, dtype='float64')
+    lagBP = int(lagBP)
+    lagET = max(int(lagET), -1)
+    X, y = _build_lagged_system(
+        wl, bp, et, lagBP, lagET, detrend_waterlevels)
+    nrows = len(y)
 
-    # Add the data to the file content.
-    wl = (np.max(wl) - wl) * 3.28084
-    bp = bp * 3.28084
-    fcontent.extend([[time[i], wl[i], bp[i], et[i]] for i in range(N)])
+    # The barometric pressure and earth tides have very different scales,
+    # so the regressors are standardized to keep the least-squares solve
+    # well conditioned. The coefficients are unscaled afterwards.
+    scales = _regressor_scales(X.T @ X, nrows)
+    Xs = X / scales
+    coeffs, _, rank, _ = np.linalg.lstsq(Xs, y, rcond=BRF_RCOND)
+    residuals = y - Xs @ coeffs
+    variance = (residuals @ residuals) / max(nrows - rank, 1)
+    cov = np.linalg.pinv(Xs.T @ Xs, rcond=BRF_RCOND**2) * variance
+    coeffs = coeffs / scales
+    cov = cov / np.outer(scales, scales)
 
-    filename = os.path.join(__install_dir__, 'BRFInput.txt')
-    with open(filename, 'w', encoding='utf8') as f:
-        writer = writer = csv.writer(f, delimiter='\t', lineterminator='\n')
-        writer.writerows(fcontent)
+    return _format_brf_results(
+        coeffs, cov, lagBP, lagET, time[1] - time[0])
 
 
-def produce_par_file(lagBP, lagET, detrend_waterlevels=True,
-                     correct_waterlevels=True):
+def calcul_brf_windows(time, wl, bp, et, lagBP, lagET, window, step,
+                       detrend_waterlevels=True):
     """
-    Create the parameter file requires by the KGS_BRF program.
+    Compute the barometric response function of a well over windows of
+    window samples sliding by step samples across the whole record.
+
+    The lagged system is built only once for the whole record and the
+    normal equations of each window are obtained by updating those of the
+    previous window with the rows that enter and leave the window.
+
+    The arguments are the same as those of calcul_brf. Return a list of
+    (date_start, date_end, dataframe) tuples, where date_start and date_end
+    are the numerical Excel dates of the first and last samples used to
+    compute the barometric response function of each window.
     """
-    brfinput = os.path.join(__install_dir__, 'BRFInput.txt')
-    brfoutput = os.path.join(__install_dir__, 'BRFOutput.txt')
-    wlcinput = os.path.join(__install_dir__, 'WLCInput.txt')
-    wlcoutput = os.path.join(__install_dir__, 'WLCOutput.txt')
+    time = np.asarray(time, dtype='float64')
+    lagBP = int(lagBP)
+    lagET = max(int(lagET), -1)
+    window = int(window)
+    step = max(int(step), 1)
+    X, y = _build_lagged_system(
+        wl, bp, et, lagBP, lagET, detrend_waterlevels)
+    maxlag = max(lagBP, lagET)
 
-    detrend = 'Yes' if detrend_waterlevels else 'No'
-    correct = 'No'
+    # Row i of the lagged system uses the samples i to i + maxlag + 1.
+    nrows = window - maxlag - 1
+    if nrows <= X.shape[1] + 1 or nrows > len(y):
+        raise ValueError("Not enough data to compute the BRF.")
+    row_starts = np.arange(0, len(y) - nrows + 1, step)
 
-    par = []
-    par.append(['BRF Option (C[ompute] or R[ead]): Compute'])
-    par.append(['BRF Input Data File: %s' % brfinput])
-    par.append(['Number of BP Lags:  %d' % lagBP])
-    par.append(['Number of BP ET:  %d' % lagET])
-    par.append(['BRF Output Data File: %s' % brfoutput])
-    par.append(['Detrend data? (Y[es] or N[o]): %s' % detrend])
-    par.append(['Correct WL? (Y[es] or N[o]): %s' % correct])
-    par.append(['WLC Input Data File: %s' % wlcinput])
-    par.append(['WLC Output Data File: %s' % wlcoutput])
+    dt = time[1] - time[0]
 
-    filename = os.path.join(__install_dir__, 'kgs_brf.par')
-    with open(filename, 'w', encoding='utf8') as f:
-        writer = csv.writer(f, delimiter='\t',  lineterminator='\n')
-        writer.writerows(par)
+    def normal_equations(rows):
+        return X[rows].T @ X[rows], X[rows].T @ y[rows], y[rows] @ y[rows]
 
+    results = []
+    XtX, Xty, yty = normal_equations(slice(0, nrows))
+    for prev, i in zip(np.hstack([0, row_starts[:-1]]), row_starts):
+        if i - prev >= nrows:
+            XtX, Xty, yty = normal_equations(slice(i, i + nrows))
+        elif i > prev:
+            # Update the normal equations of the previous window with
+            # the rows that entered and left the window.
+            new_XtX, new_Xty, new_yty = normal_equations(
+                slice(prev + nrows, i + nrows))
+            old_XtX, old_Xty, old_yty = normal_equations(slice(prev, i))
+            XtX = XtX + new_XtX - old_XtX
+            Xty = Xty + new_Xty - old_Xty
+            yty = yty + new_yty - old_yty
 
-def run_kgsbrf():
-    exename = os.path.join(__install_dir__, 'kgs_brf.exe')
-    parname = os.path.join(__install_dir__, 'kgs_brf.par')
-    if os.path.exists(exename) and os.path.exists(parname):
-        if os.name == 'nt':
-            os.system('""%s" < "%s""' % (exename, parname))
+        XtX_inv, rank = _solve_normal_equations(XtX, nrows)
+        coeffs = XtX_inv @ Xty
+        variance = max(yty - coeffs @ Xty, 0) / max(nrows - rank, 1)
+        dataf = _format_brf_results(
+            coeffs, XtX_inv * variance, lagBP, lagET, dt)
+        results.append((time[i], time[i + nrows + maxlag], dataf))
+    return results
+
+
+def calcul_brf_correction(bp, et, brf):
+    """
+    Compute the water level correction that removes the response of a well
+    to the barometric pressure and earth tides with the specified barometric
+    response function, as returned by calcul_brf.
+
+    The changes in barometric pressure and earth tides are convolved with
+    the impulse response of the well given by the barometric response
+    function. The barometric pressure and earth tides must be sampled at
+    the same regular interval as the lags of the barometric response
+    function and the barometric pressure must be in meters of water.
+    Missing values are considered as no change in barometric pressure or
+    earth tides. Return the cumulative correction in meters that must be
+    added to the water levels in meters below ground surface.
+    """
+    response = np.zeros(len(bp) - 1)
+    for values, column, factor in [(bp, 'SumA', 1), (et, 'SumB', M_TO_FEET)]:
+        if column not in brf.columns:
+            continue
+        kernel = np.diff(np.hstack([0, brf[column].dropna().values]))
+        if len(kernel) == 0:
+            continue
+        dvalues = np.diff(np.asarray(values, dtype='float64'))
+        dvalues[np.isnan(dvalues)] = 0
+        response += _causal_convolve(dvalues, kernel) / factor
+    return np.hstack([0, -np.cumsum(response)])
+
+
+def _causal_convolve(x, kernel):
+    """
+    Return the causal convolution of x with the specified kernel, truncated
+    to the length of x. The convolution is computed with FFTs when the
+    kernel is long, since a direct convolution scales with the product of
+    the lengths of x and kernel.
+    """
+    if len(kernel) <= 64:
+        return np.convolve(x, kernel)[:len(x)]
+    n = len(x) + len(kernel) - 1
+    nfft = 1 << int(np.ceil(np.log2(n)))
+    return np.fft.irfft(
+        np.fft.rfft(x, nfft) * np.fft.rfft(kernel, nfft), nfft)[:len(x)]
+
+
+def calcul_brf_spectral(time, wl, bp, et, lagBP, lagET,
+                        detrend_waterlevels=True, nperseg=None):
+    """
+    Compute the barometric response function of a well from the transfer
+    function between the changes in water level and the changes in
+    barometric pressure and earth tides.
+
+    The transfer function is estimated from the Welch-averaged cross
+    spectral densities of the series, computed over Hann-windowed segments
+    of nperseg samples overlapping by half, and is then inverted to an
+    impulse response that is truncated at the specified number of lags.
+    The standard errors are estimated from the normal equations of the
+    lagged regression, which are assembled from the auto and cross
+    correlations of the series computed with FFTs. Unlike calcul_brf, the
+    cost of this estimator does not scale with the product of the record
+    length and the number of lags, so it is best suited for very long
+    records with many lags.
+
+    The arguments are the same as those of calcul_brf. When nperseg is
+    None, the length of the segments is set to the smallest power of two
+    that is at least 8 times the number of lags. When detrend_waterlevels
+    is True, the mean of the changes is removed from each series.
+    Return a dataframe with the same structure as the one returned by
+    read_brf_output.
+    """
+    time = np.asarray(time, dtype='float64')
+    lagBP = int(lagBP)
+    lagET = max(int(lagET), -1)
+    dwl, dbp, det = _differenced_series(wl, bp, et)
+    inputs = [dbp] if lagET < 0 else [dbp, det]
+    nlags = [lagBP + 1] if lagET < 0 else [lagBP + 1, lagET + 1]
+    maxlag = max(lagBP, lagET)
+    n = len(dwl)
+    if n - maxlag <= lagBP + lagET + 2 + int(detrend_waterlevels):
+        raise ValueError("Not enough data to compute the BRF.")
+    if detrend_waterlevels:
+        dwl = dwl - np.mean(dwl)
+        inputs = [x - np.mean(x) for x in inputs]
+
+    if nperseg is None:
+        nperseg = max(1 << int(np.ceil(np.log2(8 * (maxlag + 1)))), 256)
+        nperseg = min(nperseg, 1 << int(np.log2(n)))
+    nperseg = int(nperseg)
+    if nperseg <= 2 * maxlag or nperseg > n:
+        raise ValueError("Not enough data to compute the BRF.")
+
+    # Compute the Welch-averaged cross spectral densities of the series.
+    # The inputs are scaled to unit variance, so that the frequencies
+    # where an input has no power can be discarded with a relative
+    # tolerance when computing the transfer function.
+    scales = np.array([np.std(x) or 1 for x in inputs])
+    starts = np.arange(0, n - nperseg + 1, nperseg // 2)
+    segments = starts[:, None] + np.arange(nperseg)
+    window = np.hanning(nperseg)
+    fy = np.fft.rfft(dwl[segments] * window, axis=1)
+    fx = np.stack([np.fft.rfft(x[segments] / scale * window, axis=1)
+                   for x, scale in zip(inputs, scales)], axis=-1)
+    Sxx = np.einsum('sfi,sfj->fij', np.conj(fx), fx)
+    Sxy = np.einsum('sfi,sf->fi', np.conj(fx), fy)
+
+    # Compute the transfer function and invert it to an impulse response.
+    H = (np.linalg.pinv(Sxx, rcond=1e-3) @ Sxy[:, :, None])[:, :, 0]
+    impulses = np.fft.irfft(H / scales, nperseg, axis=0)
+    coeffs = np.hstack([impulses[:nlag, i] for i, nlag in enumerate(nlags)])
+
+    # Assemble the normal equations of the lagged regression from the
+    # auto and cross correlations of the series.
+    nfft = 1 << int(np.ceil(np.log2(2 * n)))
+    fxx = [np.fft.rfft(x, nfft) for x in inputs]
+    fyy = np.fft.rfft(dwl, nfft)
+    offsets = np.cumsum([0] + nlags)
+    XtX = np.empty((offsets[-1], offsets[-1]))
+    Xty = np.empty(offsets[-1])
+    for i, nlag_i in enumerate(nlags):
+        Xty[offsets[i]:offsets[i + 1]] = np.fft.irfft(
+            np.conj(fxx[i]) * fyy, nfft)[:nlag_i]
+        for j, nlag_j in enumerate(nlags):
+            corr = np.fft.irfft(np.conj(fxx[i]) * fxx[j], nfft)
+            lags = np.arange(nlag_i)[:, None] - np.arange(nlag_j)[None, :]
+            XtX[offsets[i]:offsets[i + 1],
+                offsets[j]:offsets[j + 1]] = corr[lags]
+    dof = max(n - maxlag - offsets[-1] - int(detrend_waterlevels), 1)
+    variance = max(
+        dwl @ dwl - 2 * coeffs @ Xty + coeffs @ XtX @ coeffs, 0) / dof
+    cov = _solve_normal_equations(XtX, n - maxlag)[0] * variance
+
+    return _format_brf_results(
+        coeffs, cov, lagBP, lagET, time[1] - time[0])
+
+
+def _regressor_scales(XtX, nrows):
+    """
+    Return the root mean square of the regressors of the lagged system
+    computed from its normal equations, so that the regressors can be
+    standardized before the barometric response function is computed.
+    """
+    scales = np.sqrt(np.diag(XtX) / max(nrows, 1))
+    scales[scales == 0] = 1
+    return scales
+
+
+def _solve_normal_equations(XtX, nrows):
+    """
+    Return the pseudo-inverse and the rank of the normal equations of the
+    lagged system, which are computed from the standardized regressors and
+    with the same tolerance as the least-squares solve of calcul_brf.
+    """
+    scales = _regressor_scales(XtX, nrows)
+    XtX = XtX / np.outer(scales, scales)
+    singular_values = np.linalg.svd(XtX, compute_uv=False)
+    rank = int(np.sum(
+        singular_values > BRF_RCOND**2 * singular_values[0]))
+    XtX_inv = np.linalg.pinv(XtX, rcond=BRF_RCOND**2)
+    return XtX_inv / np.outer(scales, scales), rank
+
+
+def _differenced_series(wl, bp, et):
+    """
+    Return the changes in water level, barometric pressure and earth tides
+    that are used to compute the barometric response function. The water
+    levels, which are in meters below ground surface, and the barometric
+    pressure are converted to feet, so that the changes in water level are
+    positive when the water levels drop.
+    """
+    wl = np.asarray(wl, dtype='float64') * M_TO_FEET
+    bp = np.asarray(bp, dtype='float64') * M_TO_FEET
+    et = np.asarray(et, dtype='float64')
+    return np.diff(wl), np.diff(bp), np.diff(et)
+
+
+def _build_lagged_system(wl, bp, et, lagBP, lagET, detrend_waterlevels):
+    """
+    Build the lagged design matrix and the vector of water level changes
+    that are used to compute the barometric response function.
+    """
+    dwl, dbp, det = _differenced_series(wl, bp, et)
+    maxlag = max(lagBP, lagET)
+    nrows = len(dwl) - maxlag
+    if nrows <= lagBP + lagET + 2 + int(detrend_waterlevels):
+        raise ValueError("Not enough data to compute the BRF.")
+
+    columns = [dbp[maxlag - i:maxlag - i + nrows] for i in range(lagBP + 1)]
+    columns += [det[maxlag - i:maxlag - i + nrows] for i in range(lagET + 1)]
+    if detrend_waterlevels:
+        columns.append(np.ones(nrows))
+    return np.column_stack(columns), dwl[maxlag:]
+
+
+def _format_brf_results(coeffs, cov, lagBP, lagET, dt):
+    """
+    Format the regression coefficients and their covariance matrix in a
+    dataframe with the same structure as the one returned by
+    read_brf_output.
+    """
+    # Compute the standard errors of the coefficients and of their
+    # cumulative sums from the covariance matrix.
+    nlags = max(lagBP, lagET) + 1
+    data = np.full((nlags, len(BRF_COLUMNS)), np.nan)
+    data[:, 0] = np.arange(nlags) * dt
+    for col, (istart, n) in zip([1, 5], [(0, lagBP + 1),
+                                        (lagBP + 1, lagET + 1)]):
+        if n == 0:
+            continue
+        subcov = cov[istart:istart + n, istart:istart + n]
+        data[:n, col] = coeffs[istart:istart + n]
+        data[:n, col + 1] = np.sqrt(np.diag(subcov))
+        data[:n, col + 2] = np.cumsum(coeffs[istart:istart + n])
+        data[:n, col + 3] = np.sqrt(np.diag(
+            np.cumsum(np.cumsum(subcov, axis=0), axis=1)))
+
+    dataf = pd.DataFrame(data, columns=BRF_COLUMNS)
+    dataf.index.name = 'LagNo'
+    return dataf
 
 
 def read_brf_output(filename=None):
@@ -136,11 +392,3 @@ def read_brf_output(filename=None):
     dataf[(dataf <= -999.999) & (dataf >= -999.9999)] = np.nan
 
     return dataf
-
-
-if __name__ == "__main__":
-#    plt.close('all')
-    # produce_par_file()
-    run_kgsbrf()
-    load_BRFOutput(show_ebar=True, msize=5, draw_line=False)
-#    plt.show()
@@ -9,10 +9,7 @@
 
 # ---- Imports: Standard Libraries
 
-import os
 import os.path as osp
-import requests
-import zipfile
 import io
 
 
@@ -29,6 +26,7 @@ from PyQt5.QtWidgets import (QLabel, QDateTimeEdit, QCheckBox, QPushButton,
 
 from xlrd.xldate import xldate_from_datetime_tuple, xldate_as_datetime
 import numpy as np
+import pandas as pd
 import matplotlib as mpl
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
 
@@ -42,89 +40,14 @@ from gwhat.widgets.buttons import (LangToolButton, OnOffToolButton,
 from gwhat.common import StyleDB
 from gwhat.utils import icons
 from gwhat.utils.icons import QToolButtonNormal, QToolButtonSmall
-from gwhat.utils.dates import qdatetime_from_xldate
+from gwhat.utils.dates import qdatetime_from_xldate, datetimeindex_to_xldates
 from gwhat import brf_mod as bm
-from gwhat.brf_mod import __install_dir__
 from gwhat.brf_mod.kgs_plot import BRFFigure
 from gwhat import __rootdir__
 
 mpl.rc('font', **{'family': 'sans-serif', 'sans-serif': ['Arial']})
 
 
-class KGSBRFInstaller(myqt.QFrameLayout):
-    """
-    A simple widget to download the kgs_brf program and install it in the
-    proper directory.
-    http://www.kgs.ku.edu/HighPlains/OHP/index_program/brf.html
-    """
-
-    sig_kgs_brf_installed = QSignal(str)
-
-    def __init__(self, parent=None):
-        super(KGSBRFInstaller, self).__init__(parent)
-
-        self.setAutoFillBackground(True)
-        self.setAttribute(Qt.WA_DeleteOnClose)
-
-        self.install_btn = QPushButton("Install")
-        self.install_btn.clicked.connect(self.install_kgsbrf)
-
-        self.addWidget(self.install_btn, 1, 1)
-        self.setRowStretch(0, 100)
-        self.setRowStretch(self.rowCount(), 100)
-        self.setColumnStretch(0, 100)
-        self.setColumnStretch(self.columnCount(), 100)
-
-    @property
-    def install_dir(self):
-        """Path to the installation folder."""
-        return __install_dir__
-
-    @property
-    def kgs_brf_name(self):
-        """Name of the kgs_brf binary executable."""
-        return "kgs_brf.exe"
-
-    @property
-    def kgs_brf_path(self):
-        """Path to the kgs_brf binary executable."""
-        return os.path.join(self.install_dir, self.kgs_brf_name)
-
-    def kgsbrf_is_installed(self):
-        """Returns whether kgs_brf is installed or not."""
-        return os.path.exists(self.kgs_brf_path)
-
-    def install_kgsbrf(self):
-        """Download and install the kgs_brf software."""
-        if os.name != 'nt':
-            url_t = "https://github.com/jnsebgosselin/gwhat/issues"
-            msg = ("This feature is currently not supported for your"
-                   " operating system. Please open a ticket in our"
-                   " <a href=\"%s\">Issues Tracker</a>.") % url_t
-            QMessageBox.warning(self, 'Warning', msg, QMessageBox.Ok)
-            return
-
-        print("Installing KGS_BRF software...", end=" ")
-        QApplication.setOverrideCursor(Qt.WaitCursor)
-        url = "http://www.kgs.ku.edu/HighPlains/OHP/index_program/KGS_BRF.zip"
-        request = requests.get(url)
-        zfile = zipfile.ZipFile(io.BytesIO(request .content))
-
-        if not os.path.exists(self.install_dir):
-            os.makedirs(self.install_dir)
-
-        with open(self.kgs_brf_path, 'wb') as f:
-            f.write(zfile.read(self.kgs_brf_name))
-
-        if self.kgsbrf_is_installed():
-            self.sig_kgs_brf_installed.emit(self.install_dir)
-            self.close()
-            print("done")
-        else:
-            print("failed")
-        QApplication.restoreOverrideCursor()
-
-
 class BRFManager(myqt.QFrameLayout):
     sig_brfperiod_changed = QSignal(list)
 
@@ -132,7 +55,6 @@ class BRFManager(myqt.QFrameLayout):
         super(BRFManager, self).__init__(parent)
 
         self.viewer = BRFViewer(wldset, parent)
-        self.kgs_brf_installer = None
         self.__initGUI__()
 
     def __initGUI__(self):
@@ -157,6 +79,21 @@ class BRFManager(myqt.QFrameLayout):
         self.detrend_waterlevels_cbox = QCheckBox('Detrend water levels')
         self.detrend_waterlevels_cbox.setChecked(True)
 
+        self.method_cbox = QComboBox()
+        self.method_cbox.addItems(['Lag regression', 'Cross-spectral'])
+        self.method_cbox.setToolTip(
+            "Method used to compute the BRF. The cross-spectral method is "
+            "much faster for very long records with many lags.")
+
+        # ---- Sliding Window Options
+        self.window_spinbox = myqt.QDoubleSpinBox(30, 1, show_buttons=True)
+        self.window_spinbox.setRange(0.1, 9999)
+        self.window_spinbox.setKeyboardTracking(True)
+
+        self.step_spinbox = myqt.QDoubleSpinBox(15, 1, show_buttons=True)
+        self.step_spinbox.setRange(0.1, 9999)
+        self.step_spinbox.setKeyboardTracking(True)
+
         # Setup options layout.
         options_layout = QGridLayout()
         options_layout.addWidget(QLabel('Nbr of BP lags :'), 0, 0)
@@ -164,6 +101,12 @@ class BRFManager(myqt.QFrameLayout):
         options_layout.addWidget(self.earthtides_cbox, 1, 0)
         options_layout.addWidget(self.earthtides_spinbox, 1, 2)
         options_layout.addWidget(self.detrend_waterlevels_cbox, 2, 0, 1, 3)
+        options_layout.addWidget(QLabel('BRF method :'), 5, 0)
+        options_layout.addWidget(self.method_cbox, 5, 2)
+        options_layout.addWidget(QLabel('Window length (days) :'), 3, 0)
+        options_layout.addWidget(self.window_spinbox, 3, 2)
+        options_layout.addWidget(QLabel('Window step (days) :'), 4, 0)
+        options_layout.addWidget(self.step_spinbox, 4, 2)
         options_layout.setColumnStretch(1, 100)
         options_layout.setContentsMargins(0, 0, 0, 0)
 
@@ -207,6 +150,13 @@ class BRFManager(myqt.QFrameLayout):
         btn_comp.clicked.connect(self.calc_brf)
         btn_comp.setFocusPolicy(Qt.NoFocus)
 
+        self.btn_comp_windows = QPushButton('Compute Sliding BRFs')
+        self.btn_comp_windows.setToolTip(
+            "Compute the BRF over windows of the specified length sliding "
+            "by the specified step across the whole record.")
+        self.btn_comp_windows.clicked.connect(self.calc_brf_windows)
+        self.btn_comp_windows.setFocusPolicy(Qt.NoFocus)
+
         self.btn_show = QToolButtonSmall(icons.get_icon('search'))
         self.btn_show.clicked.connect(self.viewer.show)
 
@@ -219,12 +169,9 @@ class BRFManager(myqt.QFrameLayout):
         self.setRowStretch(3, 100)
         self.addWidget(btn_comp, 4, 0)
         self.addWidget(self.btn_show, 4, 1)
+        self.addWidget(self.btn_comp_windows, 5, 0)
         self.setColumnStretch(0, 100)
 
-        # ---- Install Panel
-        if not KGSBRFInstaller().kgsbrf_is_installed():
-            self.__install_kgs_brf_installer()
-
     # ---- Properties
 
     @property
@@ -242,6 +189,24 @@ class BRFManager(myqt.QFrameLayout):
     def detrend_waterlevels(self):
         return self.detrend_waterlevels_cbox.isChecked()
 
+    @property
+    def brf_method(self):
+        """
+        Return the method used to compute the BRF, either 'regression' or
+        'spectral'.
+        """
+        return ['regression', 'spectral'][self.method_cbox.currentIndex()]
+
+    @property
+    def window_length(self):
+        """Return the length in days of the sliding BRF windows."""
+        return self.window_spinbox.value()
+
+    @property
+    def window_step(self):
+        """Return the step in days between the sliding BRF windows."""
+        return self.step_spinbox.value()
+
     @property
     def correct_waterlevels(self):
         return True
@@ -280,26 +245,6 @@ class BRFManager(myqt.QFrameLayout):
                 widget.blockSignals(False)
         self.wldset.save_brfperiod(period)
 
-    # ---- KGS BRF installer
-    def __install_kgs_brf_installer(self):
-        """
-        Installs a KGSBRFInstaller that overlays the whole brf tool
-        layout until the KGS_BRF program is installed correctly.
-        """
-        self.kgs_brf_installer = KGSBRFInstaller()
-        self.kgs_brf_installer.sig_kgs_brf_installed.connect(
-                self.__uninstall_kgs_brf_installer)
-        self.addWidget(self.kgs_brf_installer, 0, 0,
-                       self.rowCount(), self.columnCount())
-
-    def __uninstall_kgs_brf_installer(self):
-        """
-        Uninstall the KGSBRFInstaller after the KGS_BRF program has been
-        installed properly.
-        """
-        self.kgs_brf_installer.sig_kgs_brf_installed.disconnect()
-        self.kgs_brf_installer = None
-
     def set_wldset(self, wldset):
         """Set the namespace for the wldset in the widget."""
         self.wldset = wldset
@@ -330,73 +275,102 @@ class BRFManager(myqt.QFrameLayout):
         """Prepare the data, calcul the brf, and save and plot the results."""
 
         # Prepare the datasets.
-        well = self.wldset['Well']
-
         brfperiod = self.get_brfperiod()
-        t1 = min(brfperiod)
-        i1 = np.where(self.wldset.xldates >= t1)[0][0]
-        t2 = max(brfperiod)
-        i2 = np.where(self.wldset.xldates <= t2)[0][-1]
-
-        time = np.copy(self.wldset.xldates[i1:i2+1])
-        wl = np.copy(self.wldset['WL'][i1:i2+1])
-        bp = np.copy(self.wldset['BP'][i1:i2+1])
-        if len(bp) == 0:
-            msg = ("The barometric response function cannot be computed"
-                   " because the currently selected water level dataset does"
-                   " not contain any barometric data for the selected period.")
-            QMessageBox.warning(self, 'Warning', msg, QMessageBox.Ok)
+        data = self._prepare_brf_data(min(brfperiod), max(brfperiod))
+        if data is None:
             return
-        et = np.copy(self.wldset['ET'][i1:i2+1])
-        if len(et) == 0:
-            et = np.zeros(len(wl))
-
-        # Fill the gaps in the waterlevel data.
-        dt = np.min(np.diff(time))
-        tc = np.arange(t1, t2+dt/2, dt)
-        if len(tc) != len(time) or np.any(np.isnan(wl)):
-            print('Filling gaps in data with linear interpolation.')
-            indx = np.where(~np.isnan(wl))[0]
-            wl = np.interp(tc, time[indx], wl[indx])
-
-            indx = np.where(~np.isnan(bp))[0]
-            bp = np.interp(tc, time[indx], bp[indx])
-
-            indx = np.where(~np.isnan(et))[0]
-            et = np.interp(tc, time[indx], et[indx])
+        time, wl, bp, et = data
 
-            time = tc
-
-        QApplication.setOverrideCursor(Qt.WaitCursor)
-        print('calculating the BRF')
-
-        bm.produce_BRFInputtxt(well, time, wl, bp, et)
         msg = ("Not enough data. Try enlarging the selected period "
                "or reduce the number of BP lags.")
         if self.nlag_baro >= len(time) or self.nlag_earthtides >= len(time):
+            QMessageBox.warning(self, 'Warning', msg, QMessageBox.Ok)
+            return
+
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        print('calculating the BRF')
+        try:
+            calcul_brf = {'regression': bm.calcul_brf,
+                          'spectral': bm.calcul_brf_spectral}[self.brf_method]
+            dataf = calcul_brf(
+                time, wl, bp, et, self.nlag_baro, self.nlag_earthtides,
+                self.detrend_waterlevels)
+        except (ValueError, np.linalg.LinAlgError) as e:
+            print(e)
             QApplication.restoreOverrideCursor()
             QMessageBox.warning(self, 'Warning', msg, QMessageBox.Ok)
             return
 
-        bm.produce_par_file(
-            self.nlag_baro, self.nlag_earthtides, self.detrend_waterlevels,
-            self.correct_waterlevels)
-        bm.run_kgsbrf()
+        date_start, date_end = (xldate_as_datetime(xldate, 0) for
+                                xldate in self.get_brfperiod())
+        self.wldset.save_brf(dataf, date_start, date_end,
+                             self.detrend_waterlevels)
+        self.viewer.new_brf_added()
+        self.viewer.show()
+        QApplication.restoreOverrideCursor()
 
+    def calc_brf_windows(self):
+        """
+        Prepare the data, calcul the brf over sliding windows across the
+        whole record, and save and plot the results.
+        """
+        xldates = self.wldset.xldates
+        data = self._prepare_brf_data(xldates[0], xldates[-1])
+        if data is None:
+            return
+        time, wl, bp, et = data
+
+        dt = time[1] - time[0] if len(time) > 1 else 1
+        window = int(round(self.window_length / dt))
+        step = max(int(round(self.window_step / dt)), 1)
+
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        print('calculating the BRF over sliding windows')
         try:
-            dataf = bm.read_brf_output()
-            date_start, date_end = (xldate_as_datetime(xldate, 0) for
-                                    xldate in self.get_brfperiod())
-            self.wldset.save_brf(dataf, date_start, date_end,
-                                 self.detrend_waterlevels)
-            self.viewer.new_brf_added()
-            self.viewer.show()
-            QApplication.restoreOverrideCursor()
-        except Exception:
+            brfs = bm.calcul_brf_windows(
+                time, wl, bp, et, self.nlag_baro, self.nlag_earthtides,
+                window, step, self.detrend_waterlevels)
+        except (ValueError, np.linalg.LinAlgError) as e:
+            print(e)
             QApplication.restoreOverrideCursor()
+            msg = ("Not enough data. Try enlarging the length of the "
+                   "windows or reduce the number of BP lags.")
             QMessageBox.warning(self, 'Warning', msg, QMessageBox.Ok)
             return
 
+        for date_start, date_end, dataf in brfs:
+            self.wldset.save_brf(
+                dataf, xldate_as_datetime(date_start, 0),
+                xldate_as_datetime(date_end, 0), self.detrend_waterlevels)
+        self.viewer.new_brf_added()
+        self.viewer.show()
+        QApplication.restoreOverrideCursor()
+
+    def _prepare_brf_data(self, tmin, tmax):
+        """
+        Return the time, water level, barometric pressure and earth tides
+        data resampled on a regular time grid between tmin and tmax or
+        None if there is no barometric data for that period.
+        """
+        data = self.wldset.get_data_window(tmin, tmax)
+        if data['BP'].isnull().all():
+            msg = ("The barometric response function cannot be computed"
+                   " because the currently selected water level dataset does"
+                   " not contain any barometric data for the selected period.")
+            QMessageBox.warning(self, 'Warning', msg, QMessageBox.Ok)
+            return None
+
+        # Resample the data on a regular time grid and fill the gaps in the
+        # data with linear interpolation.
+        dt = np.min(np.diff(data.index.values)) if len(data) > 1 else '1D'
+        data = self.wldset.get_regularized_data(
+            dt, 'linear', tmin=tmin, tmax=tmax)
+        data = data.fillna({'ET': 0} if data['ET'].isnull().all() else {})
+        data = data.dropna()
+
+        return (datetimeindex_to_xldates(data.index), data['WL'].values,
+                data['BP'].values, data['ET'].values)
+
 
 class BRFViewer(QWidget):
     """
@@ -460,6 +434,13 @@ class BRFViewer(QWidget):
             'Delete all BRF results for the current water level dataset.')
         self.btn_del_all.clicked.connect(self.del_all_brf)
 
+        self.btn_correct = QToolButtonNormal(icons.get_icon('work'))
+        self.btn_correct.setToolTip(
+            'Correct the water levels of the current water level dataset for'
+            ' the barometric pressure and earth tides effects with the'
+            ' current BRF.')
+        self.btn_correct.clicked.connect(self.correct_waterlevels)
+
         self.btn_save = btn_save = QToolButtonNormal(icons.get_icon('save'))
         btn_save.setToolTip('Save current BRF graph as...')
         btn_save.clicked.connect(self.select_savefig_path)
@@ -481,9 +462,9 @@ class BRFViewer(QWidget):
         self.tbar = myqt.QFrameLayout()
 
         buttons = [btn_save, self.btn_copy, self.btn_export, self.btn_del,
-                   self.btn_del_all, VSep(), self.btn_prev, self.current_brf,
-                   self.total_brf, self.btn_next, VSep(), self.btn_setp,
-                   self.btn_language]
+                   self.btn_del_all, self.btn_correct, VSep(), self.btn_prev,
+                   self.current_brf, self.total_brf, self.btn_next, VSep(),
+                   self.btn_setp, self.btn_language]
 
         for btn in buttons:
             if isinstance(btn, QLayout):
@@ -661,6 +642,39 @@ class BRFViewer(QWidget):
         """Export the current BRF data to to file."""
         self.wldset.export_brf_to_csv(fname, self.current_brf.value()-1)
 
+    # ---- Water level correction
+    def correct_waterlevels(self):
+        """
+        Correct the water levels of the dataset for the barometric pressure
+        and earth tides effects with the current BRF and save the corrected
+        water levels in the dataset.
+        """
+        if self.wldset.brf_count() == 0:
+            return
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        print('Correcting the water levels...', end=' ')
+        name = self.wldset.get_brfname_at(self.current_brf.value()-1)
+        databrf = self.wldset.get_brf(name)
+
+        # The correction is computed on a regular time grid with the same
+        # interval as the lags of the BRF and is then interpolated at the
+        # time of the water level data.
+        if len(databrf) > 1:
+            dt = pd.Timedelta(
+                databrf['Lag'].values[1] - databrf['Lag'].values[0],
+                unit='D').round('s')
+        else:
+            dt = np.min(np.diff(self.wldset.data.index.values))
+        data = self.wldset.get_regularized_data(dt, 'linear')
+        correction = bm.calcul_brf_correction(
+            data['BP'].values, data['ET'].values, databrf)
+        wlc = self.wldset.waterlevels + np.interp(
+            self.wldset.xldates, datetimeindex_to_xldates(data.index),
+            correction)
+        self.wldset.save_corrected_waterlevels(wlc)
+        print('done')
+        QApplication.restoreOverrideCursor()
+
     # ---- Others
     def set_wldset(self, wldset):
         self.wldset = wldset
@@ -11,12 +11,12 @@ import os
 import os.path as osp
 
 # Third party imports
+import numpy as np
 import pytest
 from PyQt5.QtCore import Qt
 
 # Local imports
-from gwhat.brf_mod.kgs_gui import (BRFManager, KGSBRFInstaller, QMessageBox,
-                                   QFileDialog)
+from gwhat.brf_mod.kgs_gui import BRFManager, QMessageBox, QFileDialog
 from gwhat.projet.reader_projet import ProjetReader
 from gwhat.projet.reader_waterlvl import WLDataFrame
 
@@ -53,31 +53,6 @@ def brfmanager(qtbot):
 
 
 # ---- Tests BRFManager
-@pytest.mark.skipif(os.environ.get('CI', None) is None,
-                    reason="We do not want to run this locally")
-def test_install_kgs_brf(brfmanager, mocker, qtbot):
-    """Test the installation of the kgs_brf software."""
-    brfmanager.show()
-    assert brfmanager
-    assert brfmanager.kgs_brf_installer
-
-    # In Linux, a warning message will popup telling the user that this
-    # feature is not supported for their system.
-    mocker.patch.object(QMessageBox, 'warning', return_value=QMessageBox.Ok)
-
-    # Install the KGS_BRF software and assert that it was correctly
-    # installed and that the kgs_brf installer was uninstalled correctly.
-    qtbot.mouseClick(brfmanager.kgs_brf_installer.install_btn, Qt.LeftButton)
-
-    if os.name == 'nt':
-        qtbot.waitUntil(lambda: brfmanager.kgs_brf_installer is None)
-        assert KGSBRFInstaller().kgsbrf_is_installed()
-    else:
-        assert not KGSBRFInstaller().kgsbrf_is_installed()
-
-
-@pytest.mark.skipif(os.name == 'posix',
-                    reason="This feature is not supported on Linux")
 def test_kgs_brf_defaults(brfmanager, wldataset, qtbot):
     """
     Assert that the default values are set as expected when setting
@@ -94,8 +69,6 @@ def test_kgs_brf_defaults(brfmanager, wldataset, qtbot):
     assert brfmanager.get_brfperiod() == [41334.0, 41425.0]
 
 
-@pytest.mark.skipif(os.name == 'posix',
-                    reason="This feature is not supported on Linux")
 def test_set_brfperiod(brfmanager, wldataset, qtbot):
     """
     Test that setting the period in the manager correctly set the values
@@ -110,8 +83,6 @@ def test_set_brfperiod(brfmanager, wldataset, qtbot):
     assert wldataset.get_brfperiod() == expected_brfperiod
 
 
-@pytest.mark.skipif(os.name == 'posix',
-                    reason="This feature is not supported on Linux")
 def test_calcul_brf(brfmanager, wldataset, qtbot):
     """Calcul the brf and assert the the results are plotted as expected."""
     brfmanager.show()
@@ -124,11 +95,20 @@ def test_calcul_brf(brfmanager, wldataset, qtbot):
     assert brfmanager.viewer.current_brf.value() == 1
     assert brfmanager.viewer.tbar.isEnabled()
 
+    # Calcul the brf with the cross-spectral method.
+    brfmanager.method_cbox.setCurrentIndex(1)
+    assert brfmanager.brf_method == 'spectral'
+    brfmanager.calc_brf()
+    assert brfmanager.viewer.current_brf.value() == 2
+
+    # Delete the brf computed with the cross-spectral method.
+    brfmanager.method_cbox.setCurrentIndex(0)
+    qtbot.mouseClick(brfmanager.viewer.btn_del, Qt.LeftButton)
+    assert brfmanager.viewer.current_brf.value() == 1
+
 
 # ---- Tests BRFViewer
 
-@pytest.mark.skipif(os.name == 'posix',
-                    reason="This feature is not supported on Linux")
 def test_save_brf_figure(brfmanager, wldataset, mocker, qtbot,
                          tmp_path_factory):
     """Test that the BRF figures are saved correctly from the GUI."""
@@ -148,8 +128,6 @@ def test_save_brf_figure(brfmanager, wldataset, mocker, qtbot,
     os.remove(filename)
 
 
-@pytest.mark.skipif(os.name == 'posix',
-                    reason="This feature is not supported on Linux")
 def test_graph_panel(brfmanager, wldataset, mocker, qtbot):
     brfmanager.show()
     brfmanager.set_wldset(wldataset)
@@ -208,8 +186,6 @@ def test_graph_panel(brfmanager, wldataset, mocker, qtbot):
     assert(brfmanager.viewer.graph_opt_panel.isVisible() is False)
 
 
-@pytest.mark.skipif(os.name == 'posix',
-                    reason="This feature is not supported on Linux")
 def test_del_brf_result(brfmanager, wldataset, mocker, qtbot):
     """Test that the BRF results are deleted correctly."""
     brfmanager.show()
@@ -222,8 +198,6 @@ def test_del_brf_result(brfmanager, wldataset, mocker, qtbot):
     assert brfmanager.viewer.tbar.isEnabled() is False
 
 
-@pytest.mark.skipif(os.name == 'posix',
-                    reason="This feature is not supported on Linux")
 def test_del_all_brf_result(brfmanager, wldataset, mocker, qtbot):
     """Test that the BRF results are deleted correctly."""
     brfmanager.show()
@@ -247,6 +221,49 @@ def test_del_all_brf_result(brfmanager, wldataset, mocker, qtbot):
     assert brfmanager.viewer.tbar.isEnabled() is False
 
 
+def test_calcul_brf_windows(brfmanager, wldataset, mocker, qtbot):
+    """
+    Test that the BRF is computed over sliding windows across the whole
+    record and that the resulting BRFs can be browsed in the viewer.
+    """
+    brfmanager.show()
+    brfmanager.set_wldset(wldataset)
+    brfmanager.baro_spinbox.setValue(5)
+    brfmanager.earthtides_cbox.setChecked(False)
+    brfmanager.window_spinbox.setValue(30)
+    brfmanager.step_spinbox.setValue(15)
+
+    assert brfmanager.viewer.current_brf.value() == 0
+    qtbot.mouseClick(brfmanager.btn_comp_windows, Qt.LeftButton)
+    count = wldataset.brf_count()
+    assert count > 1
+    assert brfmanager.viewer.current_brf.value() == count
+
+    # Assert that the windows are sliding by the specified step.
+    databrf = [wldataset.get_brf(wldataset.get_brfname_at(i)) for
+               i in range(count)]
+    for brf1, brf2 in zip(databrf[:-1], databrf[1:]):
+        assert brf2.date_start > brf1.date_start
+        assert brf2.date_start < brf1.date_end
+    assert len(databrf[0]) == 6
+
+    # Browse the BRFs in the viewer.
+    qtbot.mouseClick(brfmanager.viewer.btn_prev, Qt.LeftButton)
+    assert brfmanager.viewer.current_brf.value() == count - 1
+
+    # Correct the water levels with the current BRF.
+    assert wldataset.get_corrected_waterlevels() is None
+    qtbot.mouseClick(brfmanager.viewer.btn_correct, Qt.LeftButton)
+    wlc = wldataset.get_corrected_waterlevels()
+    assert len(wlc) == len(wldataset.waterlevels)
+    assert not np.allclose(wlc, wldataset.waterlevels)
+
+    # Delete all BRF results.
+    mocker.patch.object(QMessageBox, 'question', return_value=QMessageBox.Yes)
+    qtbot.mouseClick(brfmanager.viewer.btn_del_all, Qt.LeftButton)
+    assert brfmanager.viewer.current_brf.value() == 0
+
+
 if __name__ == "__main__":
     pytest.main(['-x', os.path.basename(__file__), '-v', '-rw'])
     # pytest.main()
@@ -12,14 +12,30 @@ import os.path as osp
 
 # Third party imports
 import numpy as np
+import pandas as pd
 import pytest
 
 # Local imports
-from gwhat.brf_mod.kgs_brf import read_brf_output
+from gwhat.brf_mod.kgs_brf import (
+    read_brf_output, calcul_brf, calcul_brf_windows, calcul_brf_spectral,
+    calcul_brf_correction, _causal_convolve, M_TO_FEET)
 from gwhat.brf_mod import __install_dir__
 
 BRFOUT_FNAME = osp.join(
     __install_dir__, 'tests', 'data', 'sample_BRFOutput.txt')
+WLFILENAME = osp.join(
+    __install_dir__, 'tests', 'data', 'sample_water_level_datafile.csv')
+
+
+# ---- Pytest Fixtures
+@pytest.fixture(scope='module')
+def sample_well():
+    """
+    Return the time, water levels, barometric pressure and earth tides of
+    the sample water level datafile.
+    """
+    dataf = pd.read_csv(WLFILENAME, skiprows=7)
+    return [dataf[column].values for column in dataf.columns[:4]]
 
 
 # ---- Tests BRFManager
@@ -62,5 +78,180 @@ def test_read_brf_output():
             assert a == b
 
 
+def test_calcul_brf():
+    """
+    Test that the barometric response function is computed correctly from
+    synthetic data produced with a known barometric response function.
+    """
+    np.random.seed(0)
+    n = 2000
+    time = 41000 + np.arange(n) / 96
+    bp = 10 + np.cumsum(np.random.randn(n)) * 0.01
+    et = np.sin(np.arange(n) * 2 * np.pi / 48)
+
+    # The water levels are in meters below ground surface, so they increase
+    # when the barometric pressure increases.
+    expected_brf = np.array([0.3, 0.1, 0.05, 0.05])
+    dwl = np.convolve(np.diff(bp), expected_brf)[:n - 1] + 0.0002
+    wl = np.hstack([5, 5 + np.cumsum(dwl)])
+
+    dataf = calcul_brf(time, wl, bp, et, 5, 3, detrend_waterlevels=True)
+    assert dataf.index.name == 'LagNo'
+    assert list(dataf.columns) == ['Lag', 'A', 'sdA', 'SumA', 'sdSumA',
+                                   'B', 'sdB', 'SumB', 'sdSumB']
+    assert len(dataf) == 6
+    assert np.allclose(dataf['Lag'].values, np.arange(6) / 96)
+    assert np.allclose(dataf['A'].values, [0.3, 0.1, 0.05, 0.05, 0, 0])
+    assert np.allclose(dataf['SumA'].values, np.cumsum(dataf['A'].values))
+    assert np.allclose(dataf['B'].values[:4], 0)
+    assert np.isnan(dataf['B'].values[4:]).all()
+
+    # Assert that no earth tides lags are used when lagET is negative.
+    dataf = calcul_brf(time, wl, bp, et, 5, -1, detrend_waterlevels=False)
+    assert len(dataf) == 6
+    assert np.isnan(dataf[['B', 'sdB', 'SumB', 'sdSumB']].values).all()
+
+
+def test_calcul_brf_kgs_output(sample_well):
+    """
+    Test that the barometric response function computed by the KGS_BRF
+    program is recovered from water levels produced with it and with the
+    barometric pressure and earth tides of the sample well.
+    """
+    time, _, bp, et = sample_well
+    expected = read_brf_output(BRFOUT_FNAME)
+
+    np.random.seed(0)
+    n = len(time)
+    dwl = (np.convolve(np.diff(bp) * M_TO_FEET,
+                       expected['A'].dropna().values)[:n - 1] +
+           np.convolve(np.diff(et), expected['B'].dropna().values)[:n - 1])
+    dwl = dwl / M_TO_FEET + np.random.randn(n - 1) * 0.0002
+    wl = np.hstack([5, 5 + np.cumsum(dwl)])
+
+    dataf = calcul_brf(time, wl, bp, et, 4, 6)
+    assert dataf.index.name == 'LagNo'
+    assert list(dataf.columns) == list(expected.columns)
+    assert np.allclose(dataf['Lag'].values, expected['Lag'].values,
+                       atol=1e-5)
+    for column in ['A', 'SumA']:
+        assert np.allclose(dataf[column].values, expected[column].values,
+                           atol=0.005, equal_nan=True)
+
+    # The individual earth tides coefficients cannot all be resolved from
+    # a smooth earth tides signal, but their cumulative sum can.
+    assert np.allclose(dataf['SumB'].values, expected['SumB'].values,
+                       atol=0.02)
+
+
+def test_calcul_brf_scaling(sample_well):
+    """
+    Test that the barometric response function of the sample well does
+    not depend on the scale of the earth tides and that its cumulative
+    earth tides response does not oscillate from one lag to the next.
+    """
+    time, wl, bp, et = sample_well
+    dataf = calcul_brf(time, wl, bp, et, 12, 6)
+    assert np.all(np.abs(dataf['SumB'].dropna().values) < 0.05)
+    assert np.all(np.abs(dataf['SumA'].values) < 0.1)
+
+    scaled = calcul_brf(time, wl, bp, et / 600, 12, 6)
+    assert np.allclose(scaled['SumA'].values, dataf['SumA'].values)
+    assert np.allclose(scaled['SumB'].values / 600, dataf['SumB'].values,
+                       equal_nan=True)
+
+
+def test_calcul_brf_windows():
+    """
+    Test that the barometric response functions computed over sliding
+    windows are the same as those computed separately for each window.
+    """
+    np.random.seed(0)
+    n = 1000
+    time = 41000 + np.arange(n) / 96
+    bp = 10 + np.cumsum(np.random.randn(n)) * 0.01
+    et = np.sin(np.arange(n) * 2 * np.pi / 48)
+    wl = 5 + np.cumsum(np.random.randn(n)) * 0.001 + 0.3 * bp
+
+    window, step = 200, 70
+    results = calcul_brf_windows(time, wl, bp, et, 5, 3, window, step)
+    assert len(results) == (n - window) // step + 1
+    for k, (date_start, date_end, dataf) in enumerate(results):
+        i = k * step
+        assert date_start == time[i]
+        assert date_end == time[i + window - 1]
+        expected = calcul_brf(
+            time[i:i + window], wl[i:i + window], bp[i:i + window],
+            et[i:i + window], 5, 3)
+        assert np.allclose(dataf.values, expected.values, equal_nan=True)
+
+    # Assert that an error is raised when the windows are too short.
+    with pytest.raises(ValueError):
+        calcul_brf_windows(time, wl, bp, et, 5, 3, 10, 5)
+
+
+def test_calcul_brf_spectral():
+    """
+    Test that the barometric response function computed from the cross
+    spectral densities is the same as the one computed with the lagged
+    regression for synthetic data with a known barometric response function.
+    """
+    np.random.seed(0)
+    n = 20000
+    time = 41000 + np.arange(n) / 96
+    bp = 10 + np.cumsum(np.random.randn(n)) * 0.01
+    et = np.sin(np.arange(n) * 2 * np.pi / 48)
+
+    expected_brf = np.array([0.3, 0.1, 0.05, 0.05])
+    dwl = (np.convolve(np.diff(bp), expected_brf)[:n - 1] +
+           np.random.randn(n - 1) * 0.0005)
+    wl = np.hstack([5, 5 + np.cumsum(dwl)])
+
+    dataf = calcul_brf_spectral(time, wl, bp, et, 20, -1)
+    expected = calcul_brf(time, wl, bp, et, 20, -1)
+    assert list(dataf.columns) == list(expected.columns)
+    assert dataf.index.name == 'LagNo'
+    assert np.allclose(dataf['Lag'].values, expected['Lag'].values)
+    assert np.allclose(dataf['A'].values, expected['A'].values, atol=0.002)
+    assert np.allclose(dataf['sdA'].values, expected['sdA'].values, rtol=0.01)
+    assert np.isnan(dataf[['B', 'sdB', 'SumB', 'sdSumB']].values).all()
+
+    # Assert that earth tides lags are used when lagET is positive.
+    dataf = calcul_brf_spectral(time, wl, bp, et, 20, 3)
+    assert np.allclose(dataf['A'].values, expected['A'].values, atol=0.002)
+    assert np.allclose(dataf['B'].values[:4], 0, atol=0.002)
+
+
+def test_calcul_brf_correction():
+    """
+    Test that the water levels corrected with the barometric response
+    function no longer respond to the barometric pressure.
+    """
+    np.random.seed(0)
+    n = 2000
+    time = 41000 + np.arange(n) / 96
+    bp = 10 + np.cumsum(np.random.randn(n)) * 0.01
+    et = np.sin(np.arange(n) * 2 * np.pi / 48)
+
+    expected_brf = np.array([0.3, 0.1, 0.05, 0.05])
+    dwl = np.convolve(np.diff(bp), expected_brf)[:n - 1] + 0.0002
+    wl = np.hstack([5, 5 + np.cumsum(dwl)])
+
+    brf = calcul_brf(time, wl, bp, et, 5, 3, detrend_waterlevels=True)
+    wlc = wl + calcul_brf_correction(bp, et, brf)
+    assert np.allclose(wlc, 5 + np.arange(n) * 0.0002)
+
+
+def test_causal_convolve():
+    """
+    Test that the direct and FFT causal convolutions give the same results.
+    """
+    np.random.seed(0)
+    x = np.random.randn(1000)
+    for kernel in [np.random.randn(10), np.random.randn(200)]:
+        assert np.allclose(_causal_convolve(x, kernel),
+                           np.convolve(x, kernel)[:len(x)])
+
+
 if __name__ == "__main__":
     pytest.main(['-x', os.path.basename(__file__), '-v', '-rw'])
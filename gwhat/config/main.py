@@ -31,6 +31,14 @@ DEFAULTS = [
          'last_project_filepath': '../Projects/Example/Example.gwt'
          }
      ),
+    ('project_storage',
+        {'compression': 'gzip',
+         'compression_level': 4,
+         'shuffle': True,
+         'chunk_length': 16384,
+         'derived_float32': False
+         }
+     ),
 ]
 
 
@@ -18,12 +18,12 @@ from time import strftime
 # ---- Third parties imports
 
 import numpy as np
-from xlrd import xldate_as_tuple
 
 # ---- Local imports
 
 from gwhat.common.utils import save_content_to_file
 from gwhat.utils.math import nan_as_text_tolist
+from gwhat.utils.dates import xldates_to_ymd
 from gwhat import __namever__
 
 
@@ -296,17 +296,11 @@ def calcul_dly_budget(data, glue_limits):
 
         # We extend the time and date arrays.
         times2add = np.arange(deltat) + times[-1] + 1
-        years2add = []
-        months2add = []
-        days2add = []
-        for time_ in times2add:
-            date = xldate_as_tuple(time_, 0)
-            years2add.append(date[0])
-            months2add.append(date[1])
-            days2add.append(date[2])
+        years2add, months2add, days2add = xldates_to_ymd(times2add)
         times = np.hstack([times, times2add])
         years = np.hstack([years, years2add])
         months = np.hstack([months, months2add])
+        days = np.hstack([days, days2add])
 
     return {'recharge': glue_rechg_dly,
             'evapo': glue_evapo_dly,
@@ -22,7 +22,8 @@ from PyQt5.QtCore import pyqtSignal as QSignal
 
 # ---- Imports: local
 
-from gwhat.utils.math import clip_time_series, calcul_rmse
+from gwhat.utils.math import (clip_time_series, calcul_rmse,
+                              downsample_time_series)
 from gwhat.gwrecharge.glue import GLUEDataFrame
 from gwhat.gwrecharge.gwrecharge_calculs import (calcul_surf_water_budget,
                                                  calc_hydrograph_forward)
@@ -98,8 +99,10 @@ class RechgEvalWorker(QObject):
 
         self.wldset = wldset
         self.A, self.B = wldset['mrc/params']
-        self.twlvl, self.wlobs = self.make_data_daily(
-            wldset.xldates, wldset['WL'])
+        # Only the last water level measurement made on a given day is kept
+        # in the daily time series.
+        self.twlvl, self.wlobs = downsample_time_series(
+            wldset.xldates, wldset['WL'], period='day', how='last')
 
         if not self.A and not self.B:
             error = ("Groundwater recharge cannot be computed because a"
@@ -119,26 +122,6 @@ class RechgEvalWorker(QObject):
         else:
             return None
 
-    def make_data_daily(self, t, h):
-        """
-        Convert a given time series to a daily basis. Only the last water level
-        measurements made on a given day is kept in the daily time series.
-        If there is no measurement at all for a given day, the default nan
-        value is kept instead in the daily time series.
-        """
-        argsort = np.argsort(t)
-        t = np.floor(t[argsort])
-        h = h[argsort]
-
-        td = np.arange(np.min(t), np.max(t)+1, 1).astype(int)
-        hd = np.ones(len(td)) * np.nan
-        for i in range(len(td)):
-            indx = np.where(t == td[i])[0]
-            if len(indx) > 0:
-                hd[i] = h[indx[-1]]
-
-        return td, hd
-
     def produce_params_combinations(self):
         """
         Produce a set of parameter combinations (RASmax + Cro) from the ranges
@@ -34,6 +34,10 @@ from gwhat.colors2 import ColorsReader
 
 mpl.rc('font', **{'family': 'sans-serif', 'sans-serif': ['Arial']})
 
+# The resolution that is used to select the level of detail at which the
+# water levels are plotted.
+LOD_DPI = 300
+
 
 class LabelDatabase():
 
@@ -125,6 +129,11 @@ class Hydrograph(Figure):
         self.trend_MAW = 30
         # trend_MAW = width of the Moving Average Window used to
         #             smooth the water level data
+        self.corrected_wl = False
+        # corrected_wl = whether the water levels corrected for the
+        #                barometric pressure and earth tides effects are
+        #                plotted instead of the raw water levels, when
+        #                they are available for the dataset.
         self.meteo_on = True
         self.glue_wl_on = False
         self.mrc_wl_on = False
@@ -744,12 +753,14 @@ class Hydrograph(Figure):
         self.draw_figure_title()
 
     def best_fit_waterlvl(self):
-        WL = self.wldset['WL']
+        # The range of the water levels is taken from the level of detail
+        # pyramid, so that the water levels do not need to be read from
+        # the project.
+        wlmin, wlmax = self.wldset.get_waterlevel_bounds(self.corrected_wl)
         if self.WLdatum == 1:  # masl
-            WL = self.wldset['Elevation'] - WL
-
-        WL = WL[~np.isnan(WL)]
-        dWL = np.max(WL) - np.min(WL)
+            wlmin, wlmax = (self.wldset['Elevation'] - wlmax,
+                            self.wldset['Elevation'] - wlmin)
+        dWL = wlmax - wlmin
         ygrid = self.NZGrid - 5
 
         # --- WL Scale --- #
@@ -764,10 +775,10 @@ class Hydrograph(Figure):
         # ---- WL Min Value --- #
 
         if self.WLdatum == 0:  # mbgs
-            N = np.ceil(np.max(WL)/self.WLscale)
+            N = np.ceil(wlmax / self.WLscale)
         elif self.WLdatum == 1:  # masl
             # WL = self.WaterLvlObj.ALT - WL
-            N = np.floor(np.min(WL) / self.WLscale)
+            N = np.floor(wlmin / self.WLscale)
 
         self.WLmin = self.WLscale * N
 
@@ -873,17 +884,39 @@ class Hydrograph(Figure):
 
         # ---- Logger Measures
 
-        time = self.wldset.xldates
+        # The water levels are plotted with the level of detail that
+        # matches the width of the graph at the printing resolution.
+        npixels = self.ax2.get_window_extent().width / self.dpi * LOD_DPI
+        time, water_lvl = self.wldset.get_lod_data(
+            self.TIMEmin, self.TIMEmax, npixels, self.corrected_wl)
         if self.WLdatum == 1:  # masl
-            water_lvl = self.wldset['Elevation']-self.wldset['WL']
-        else:  # mbgs -> yaxis is inverted
-            water_lvl = self.wldset['WL']
+            water_lvl = self.wldset['Elevation'] - water_lvl
 
         if self.trend_line == 1:
-            tfilt, wlfilt = filt_data(time, water_lvl, self.trend_MAW)
+            # The daily resampled data of the dataset are shared with the
+            # other tools through the cache of the dataset. Only the data
+            # within the time frame of the graph are used, plus a margin
+            # corresponding to the width of the moving average window. The
+            # values that could not be interpolated, at the edges of the
+            # window or where there is no valid water level at all, are
+            # dropped.
+            wlcol = ('WLc' if self.corrected_wl and
+                     self.wldset.has_corrected_waterlevels() else 'WL')
+            data = self.wldset.get_regularized_data(
+                '1D', 'linear', tmin=self.TIMEmin - self.trend_MAW,
+                tmax=self.TIMEmax + self.trend_MAW)[[wlcol]]
+            data = data.interpolate(limit_area='inside').dropna()
+            if len(data) >= self.trend_MAW:
+                wlfilt = data[wlcol].values
+                if self.WLdatum == 1:  # masl
+                    wlfilt = self.wldset['Elevation'] - wlfilt
+                tfilt, wlfilt = filt_data(
+                    datetimeindex_to_xldates(data.index), wlfilt,
+                    self.trend_MAW)
+            else:
+                tfilt, wlfilt = [], []
             self.l1_ax2.set_data(tfilt, wlfilt)
             self.l2_ax2.set_data(time, water_lvl)
-
         else:
             self.l1_ax2.set_data(time, water_lvl)
             self.l2_ax2.set_data([], [])
@@ -1241,21 +1274,16 @@ class Hydrograph(Figure):
 
 def filt_data(time, waterlvl, N):
     """
-    Resamples the water level measurements on a daily basis and run a
-    moving average window of N days on the resampled data.
+    Run a centered moving average window of N days on water level data that
+    were resampled on a daily basis.
     """
-    # Resample the data on a daily basis.
-    days = np.arange(np.floor(time[0]), np.floor(time[-1])+1)
-    index_nonan = np.where(~np.isnan(waterlvl))[0]
-    waterlvl = np.interp(days, time[index_nonan], waterlvl[index_nonan])
-
     # Compute a centered moving average window on the daily resampled data.
     # Based on the codes provided by StackOverflow user Alleo.
     # https://stackoverflow.com/a/27681394/4481445
     N = int(N)
     cumsum = np.cumsum(np.insert(waterlvl, 0, 0))
     wlf = (cumsum[N:] - cumsum[:-N])/float(N)
-    tf = days[N//2:-N//2+1]
+    tf = time[N//2:-N//2+1]
 
     return tf, wlf
 
@@ -1299,7 +1327,7 @@ if __name__ == '__main__':
     # 0: daily | 1: weekly | 2: monthly | 3: yearly
     hydrograph.RAINscale = 100
 
-    hydrograph.best_fit_time(wldset.xldates)
+    hydrograph.best_fit_time(wldset.get_xldate_bounds())
     hydrograph.best_fit_waterlvl()
     hydrograph.generate_hydrograph()
 
@@ -8,11 +8,20 @@
 # -----------------------------------------------------------------------------
 
 
+# ---- Standard library imports
+from functools import lru_cache
+
 # ---- Third party imports
 import numpy as np
 from numpy import pi, sin, cos, arccos, arcsin
 import pandas as pd
 
+PET_METHODS = ['thornthwaite', 'hargreaves', 'oudin']
+
+# Solar constant in MJ/m²/min and latent heat of vaporization in MJ/kg.
+SOLAR_CONSTANT = 0.0820
+LATENT_HEAT = 2.45
+
 
 def calcul_thornthwaite(Tavg, latitude):
     """
@@ -38,24 +47,46 @@ def calcul_thornthwaite(Tavg, latitude):
         for estimating daily reference evapotranspiration. Agricultural Water
         Management, 66, 251-257.
     """
-    Ta = Tavg.groupby(Tavg.index.month).mean()
-    Ta[Ta < 0] = 0
+    PET0 = calcul_thornthwaite_batch(Tavg.to_frame(), [latitude])
+    return PET0.iloc[:, 0].rename(Tavg.name)
+
+
+def calcul_thornthwaite_batch(Tavg, latitudes):
+    """
+    Calcul reference potential evapotranspiration, PET0(mm/d) with
+    the method of Thornwaite (1948) for several stations at once.
+
+    Parameters
+    ----------
+    Tavg: :class:`pandas.DataFrame`
+        A pandas dataframe with a datetime index containing average daily
+        air temperatures in Celcius, with one column per station.
+    latitudes: array_like
+        The latitudes in decimal degrees of the stations, in the same
+        order as the columns of Tavg.
+
+    Returns
+    -------
+    PET0:
+        A :class:`pandas.DataFrame` containing the corresponding reference
+        daily potential evapotranspiration values in mm/d.
+    """
+    Ta = np.maximum(Tavg.groupby(Tavg.index.month).mean().values, 0)
 
-    I = np.sum((0.2 * Ta)**1.514)  # Heat index
+    I = np.sum((0.2 * Ta)**1.514, axis=0)  # Heat index
     a = (6.75e-7 * I**3) - (7.71e-5 * I**2) + (1.7912e-2 * I) + 0.49239
 
-    # Calcul photoperiod in hours per day.
-    day_length = calcul_daylength(Tavg.index, latitude)
+    # Get the photoperiod in hours per day from the lookup table.
+    day_length = get_daylength_table(latitudes)[Tavg.index.dayofyear - 1]
 
     # Calcul the reference evapotranspiration.
 
     # Note that we need to force all negative values to zeros in the
     # average air temperature time series.
-    Tavg_corr = Tavg.copy(deep=True)
-    Tavg_corr[Tavg_corr < 0] = 0
+    Tavg_corr = np.maximum(Tavg.values, 0)
     PET0 = 16 * (10 * Tavg_corr / I)**a * (day_length / (12 * 30))
 
-    return PET0
+    return pd.DataFrame(PET0, index=Tavg.index, columns=Tavg.columns)
 
 
 def calcul_daylength(dtimes, latitude):
@@ -76,32 +107,185 @@ def calcul_daylength(dtimes, latitude):
         A :class:`pandas.DatetimeIndex` containing the photoperiod for the
         specified dates and latitude.
     """
-    latitude = np.radians(latitude)
+    daylen = get_daylength_table([latitude])[dtimes.dayofyear.values - 1, 0]
+    return pd.Series(daylen, index=dtimes)
+
+
+def get_daylength_table(latitudes):
+    """
+    Return a (366 x n) lookup table with the photoperiod in hours for each
+    day of the year and each of the n specified latitudes in decimal degrees.
+
+    The tables are cached for the most recently requested latitudes, so
+    that the photoperiod is not computed again each time a dataset is
+    imported for the same stations.
+    """
+    return _daylength_table(tuple(float(lat) for lat in latitudes))
+
+
+@lru_cache(maxsize=128)
+def _daylength_table(latitudes):
+    latitudes = np.radians(latitudes)[None, :]
+    sun_declination = _sun_declination()[:, None]
 
+    # Solve the sunrise equation.
+    # https://en.wikipedia.org/wiki/Sunrise_equation
+
+    # We take the equation that take into account corrections for
+    # astronomical refraction and solar disc diameter.
+    num = sin(-0.83 * pi / 180) - sin(latitudes) * sin(sun_declination)
+    denum = cos(latitudes) * cos(sun_declination)
+    hour_angle = arccos(num / denum)
+
+    daylen = 2 * hour_angle * 24 / (2 * pi)
+    daylen.flags.writeable = False
+    return daylen
+
+
+@lru_cache(maxsize=None)
+def _sun_declination():
+    """Return the sun declination in radians for each day of the year."""
     # Calculate sun declination.
     # http://en.wikipedia.org/wiki/Position_of_the_Sun#Calculations
 
     # N is the number of days since midnight UT as January 1 begins (
     # i.e. the days part of the ordinal date −1)
-    N = dtimes.dayofyear.values - 1
+    N = np.arange(366)
     A = 2 * pi / 365.24 * (N - 2)
     B = 2 * pi / pi * 0.0167
     C = 2 * pi / 365.24 * (N + 10)
     D = -23.44 * pi / 180
     sun_declination = arcsin(sin(D) * cos(C + B * sin(A)))
+    sun_declination.flags.writeable = False
+    return sun_declination
 
-    # Solve the sunrise equation.
-    # https://en.wikipedia.org/wiki/Sunrise_equation
 
-    # We take the equation that take into account corrections for
-    # astronomical refraction and solar disc diameter.
-    num = sin(-0.83 * pi / 180) - sin(latitude) * sin(sun_declination)
-    denum = cos(latitude) * cos(sun_declination)
-    hour_angle = arccos(num / denum)
+def calcul_hargreaves_batch(Tmax, Tmin, Tavg, latitudes):
+    """
+    Calcul reference potential evapotranspiration, PET0(mm/d) with
+    the method of Hargreaves and Samani (1985) for several stations at once.
 
-    daylen = 2 * hour_angle * 24 / (2 * pi)
+    Parameters
+    ----------
+    Tmax, Tmin, Tavg: :class:`pandas.DataFrame`
+        Pandas dataframes with a datetime index containing maximum, minimum
+        and average daily air temperatures in Celcius, with one column per
+        station.
+    latitudes: array_like
+        The latitudes in decimal degrees of the stations, in the same
+        order as the columns of the temperature dataframes.
 
-    return pd.Series(daylen, index=dtimes)
+    Returns
+    -------
+    PET0:
+        A :class:`pandas.DataFrame` containing the corresponding reference
+        daily potential evapotranspiration values in mm/d.
+
+    Hargreaves, G.H. and Z.A. Samani. 1985. Reference crop evapotranspiration
+        from temperature. Applied Engineering in Agriculture, 1, 96-99.
+    """
+    Ra = get_radiation_table(latitudes)[Tavg.index.dayofyear - 1]
+    Trange = np.maximum(Tmax.values - Tmin.values, 0)
+    PET0 = 0.0023 * (Ra / LATENT_HEAT) * (Tavg.values + 17.8) * Trange**0.5
+    return pd.DataFrame(
+        np.maximum(PET0, 0), index=Tavg.index, columns=Tavg.columns)
+
+
+def calcul_oudin_batch(Tavg, latitudes):
+    """
+    Calcul reference potential evapotranspiration, PET0(mm/d) with
+    the method of Oudin et al. (2005) for several stations at once.
+
+    Parameters
+    ----------
+    Tavg: :class:`pandas.DataFrame`
+        A pandas dataframe with a datetime index containing average daily
+        air temperatures in Celcius, with one column per station.
+    latitudes: array_like
+        The latitudes in decimal degrees of the stations, in the same
+        order as the columns of Tavg.
+
+    Returns
+    -------
+    PET0:
+        A :class:`pandas.DataFrame` containing the corresponding reference
+        daily potential evapotranspiration values in mm/d.
+
+    Oudin, L., F. Hervieu, C. Michel, C. Perrin, V. Andreassian, F. Anctil and
+        C. Loumagne. 2005. Which potential evapotranspiration input for a
+        lumped rainfall-runoff model? Journal of Hydrology, 303, 290-306.
+    """
+    Ra = get_radiation_table(latitudes)[Tavg.index.dayofyear - 1]
+    PET0 = (Ra / LATENT_HEAT) * np.maximum(Tavg.values + 5, 0) / 100
+    return pd.DataFrame(PET0, index=Tavg.index, columns=Tavg.columns)
+
+
+def calcul_pet(data, latitude, method='thornthwaite'):
+    """
+    Calcul reference potential evapotranspiration, PET0(mm/d) with
+    the specified method.
+
+    Parameters
+    ----------
+    data: :class:`pandas.DataFrame`
+        A pandas dataframe with a datetime index containing the Tmax, Tmin
+        and Tavg daily air temperatures in Celcius.
+    latitude: float
+        The latitude in decimal degrees where we want to calculate the
+        evapotranspiration.
+    method: str
+        The method used to calculate the evapotranspiration. See PET_METHODS
+        for the list of available methods.
+
+    Returns
+    -------
+    PET0:
+        A :class:`pandas.Series` containing the corresponding reference
+        daily potential evapotranspiration values in mm/d.
+    """
+    if method == 'thornthwaite':
+        PET0 = calcul_thornthwaite_batch(data[['Tavg']], [latitude])
+    elif method == 'hargreaves':
+        PET0 = calcul_hargreaves_batch(
+            data[['Tmax']], data[['Tmin']], data[['Tavg']], [latitude])
+    elif method == 'oudin':
+        PET0 = calcul_oudin_batch(data[['Tavg']], [latitude])
+    else:
+        raise ValueError("Supported PET methods are: ", PET_METHODS)
+    return PET0.iloc[:, 0].rename('PET')
+
+
+def get_radiation_table(latitudes):
+    """
+    Return a (366 x n) lookup table with the daily extraterrestrial
+    radiation in MJ/m²/d for each day of the year and each of the n
+    specified latitudes in decimal degrees, as given in Allen et al. (1998).
+
+    The tables are cached for the most recently requested latitudes.
+
+    Allen, R.G., L.S. Pereira, D. Raes and M. Smith. 1998. Crop
+        evapotranspiration. FAO Irrigation and Drainage Paper 56.
+    """
+    return _radiation_table(tuple(float(lat) for lat in latitudes))
+
+
+@lru_cache(maxsize=128)
+def _radiation_table(latitudes):
+    latitudes = np.radians(latitudes)[None, :]
+    sun_declination = _sun_declination()[:, None]
+
+    # Inverse relative distance Earth-Sun.
+    dr = 1 + 0.033 * cos(2 * pi / 365 * np.arange(1, 367))[:, None]
+
+    # Sunset hour angle, which is clipped for the polar days and nights.
+    ws = arccos(np.clip(
+        -np.tan(latitudes) * np.tan(sun_declination), -1, 1))
+
+    Ra = 24 * 60 / pi * SOLAR_CONSTANT * dr * (
+        ws * sin(latitudes) * sin(sun_declination) +
+        cos(latitudes) * cos(sun_declination) * sin(ws))
+    Ra.flags.writeable = False
+    return Ra
 
 
 if __name__ == '__main__':
@@ -0,0 +1,481 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © GWHAT Project Contributors
+# https://github.com/jnsebgosselin/gwhat
+#
+# This file is part of GWHAT (Ground-Water Hydrograph Analysis Toolbox).
+# Licensed under the terms of the GNU General Public License.
+
+"""
+Interpolation of the daily weather data of several stations at the location
+of one or more sites (virtual stations) and gapfilling of the daily weather
+data of stations from their neighbour stations.
+"""
+
+# ---- Third party imports
+import numpy as np
+import pandas as pd
+
+# ---- Local library imports
+from gwhat.meteo.weather_reader import (
+    WXDataFrameBase, METEO_VARIABLES, PRECIP_VARIABLES, calcul_rain_from_ptot)
+from gwhat.meteo.evapotranspiration import (
+    calcul_thornthwaite_batch, calcul_hargreaves_batch, calcul_oudin_batch,
+    PET_METHODS)
+from gwhat.common.utils import calc_dist_from_coord
+
+# The environmental lapse rate in °C/m that is used to correct the air
+# temperature of the stations for the difference of elevation.
+LAPSE_RATE = -0.0065
+
+# The air temperature variables that are corrected with the lapse rate.
+LAPSE_VARIABLES = ['Tmax', 'Tmin', 'Tavg']
+
+# The variables that are gapfilled with the data of the neighbour stations.
+GAPFILL_VARIABLES = ['Tmax', 'Tmin', 'Tavg', 'Ptot']
+
+# The minimal number of days with measured data in common that is required
+# to correlate two stations.
+MIN_OVERLAP = 365
+
+# The minimal distance in km that is used to compute the weights, so that a
+# station located at a site gets almost all the weight without dividing
+# by zero.
+MIN_IDW_DIST = 0.001
+
+
+class VirtualWXDataFrame(WXDataFrameBase):
+    """
+    A daily weather dataset container for weather data interpolated from
+    several stations.
+    """
+
+    def __init__(self, metadata, data, missing_value_indexes,
+                 *args, **kwargs):
+        super(VirtualWXDataFrame, self).__init__(*args, **kwargs)
+        self.metadata.update(metadata)
+        self.data = data
+        self.missing_value_indexes.update(missing_value_indexes)
+
+    def __getitem__(self, key):
+        raise NotImplementedError
+
+    def __setitem__(self, key, value):
+        raise NotImplementedError
+
+    def __iter__(self):
+        raise NotImplementedError
+
+    def __len__(self, key):
+        raise NotImplementedError
+
+    def __load_dataset__(self):
+        pass
+
+
+def calcul_idw_weights(distances, k=3, power=2):
+    """
+    Return the inverse distance weights of the k nearest stations of
+    each site.
+
+    Parameters
+    ----------
+    distances: array_like
+        A (n_sites x n_stations) array with the distances in km between
+        the sites and the stations.
+    k: int
+        The number of nearest stations whose data are used for each site.
+    power: float
+        The power of the inverse distance that is used to compute the
+        weights.
+
+    Returns
+    -------
+    weights:
+        A (n_sites x n_stations) array with the weights of the stations,
+        which are 0 for the stations that are not among the k nearest
+        stations of a site. The weights are not normalized, since they
+        are normalized each day with the stations that have data.
+    """
+    distances = np.atleast_2d(np.asarray(distances, dtype='float64'))
+    k = max(min(int(k), distances.shape[1]), 1)
+    rows = np.arange(distances.shape[0])[:, None]
+    nearest = np.argsort(distances, axis=1, kind='mergesort')[:, :k]
+
+    weights = np.zeros(distances.shape)
+    weights[rows, nearest] = np.maximum(
+        distances[rows, nearest], MIN_IDW_DIST)**-power
+    return weights
+
+
+def align_wxdsets(wxdsets, variables=METEO_VARIABLES):
+    """
+    Align the daily data of the weather datasets on a common daily index.
+
+    Returns the common daily index, a (n_days x n_stations x n_variables)
+    array with the data of the stations, which is nan when a station has
+    no data, and a boolean array of the same shape that is True where the
+    data of the stations were measured and not gapfilled.
+    """
+    start = min(wxdset.data.index[0] for wxdset in wxdsets)
+    end = max(wxdset.data.index[-1] for wxdset in wxdsets)
+    index = pd.date_range(start, end, freq='D')
+
+    values = np.full((len(index), len(wxdsets), len(variables)), np.nan)
+    measured = np.zeros(values.shape, dtype=bool)
+    for j, wxdset in enumerate(wxdsets):
+        values[:, j, :] = wxdset.data.reindex(
+            index, columns=variables).values
+        measured[:, j, :] = ~np.isnan(values[:, j, :])
+        for i, var in enumerate(variables):
+            missing = wxdset.missing_value_indexes.get(var)
+            if missing is not None and len(missing):
+                measured[index.isin(missing), j, i] = False
+    return index, values, measured
+
+
+def interpolate_wxdsets(wxdsets, latitudes, longitudes, elevations, k=3,
+                        power=2, lapse_rate=LAPSE_RATE,
+                        variables=METEO_VARIABLES):
+    """
+    Interpolate the daily weather data of the weather datasets at the
+    specified sites with the inverse distance weighting of their k nearest
+    stations.
+
+    The air temperature of the stations is corrected for the difference of
+    elevation between the stations and the sites with the lapse rate. Each
+    day, only the stations with measured data are used. The days for
+    which none of the k nearest stations of a site have measured data are
+    interpolated from the gapfilled data of the stations instead and are
+    flagged as missing.
+
+    Returns the common daily index and two (n_days x n_sites x n_variables)
+    arrays, one with the interpolated data, which is nan where none of the
+    nearest stations of a site have data, and the other that is True where
+    the interpolated data are missing.
+    """
+    latitudes = np.atleast_1d(np.asarray(latitudes, dtype='float64'))
+    longitudes = np.atleast_1d(np.asarray(longitudes, dtype='float64'))
+    elevations = np.atleast_1d(np.asarray(elevations, dtype='float64'))
+    stations_elev = np.array(
+        [wxdset.metadata['Elevation'] for wxdset in wxdsets], dtype='float64')
+
+    # Compute the weights of the stations for all sites at once.
+    distances = calc_dist_from_coord(
+        latitudes[:, None], longitudes[:, None],
+        np.array([wxdset.metadata['Latitude'] for wxdset in wxdsets],
+                 dtype='float64')[None, :],
+        np.array([wxdset.metadata['Longitude'] for wxdset in wxdsets],
+                 dtype='float64')[None, :])
+    weights = calcul_idw_weights(distances, k, power)
+
+    index, values, measured = align_wxdsets(wxdsets, variables)
+    available = ~np.isnan(values)
+
+    # The precipitation variables are all weighted with the stations that
+    # have measured total precipitation, so that Rain + Snow = Ptot
+    # remains true for the interpolated data.
+    if 'Ptot' in variables:
+        iptot = variables.index('Ptot')
+        for i, var in enumerate(variables):
+            if var in PRECIP_VARIABLES:
+                measured[:, :, i] = measured[:, :, iptot]
+                available[:, :, i] = available[:, :, iptot]
+
+    blended = np.full((len(index), len(latitudes), len(variables)), np.nan)
+    missing = np.zeros(blended.shape, dtype=bool)
+    for i, var in enumerate(variables):
+        lapse = lapse_rate if var in LAPSE_VARIABLES else 0
+        blended[:, :, i], norm = _blend_stations(
+            values[:, :, i], measured[:, :, i], weights,
+            elevations, stations_elev, lapse)
+        missing[:, :, i] = norm == 0
+        if missing[:, :, i].any():
+            fallback, _ = _blend_stations(
+                values[:, :, i], available[:, :, i], weights,
+                elevations, stations_elev, lapse)
+            blended[:, :, i] = np.where(
+                missing[:, :, i], fallback, blended[:, :, i])
+    missing &= ~np.isnan(blended)
+    return index, blended, missing
+
+
+def _blend_stations(values, mask, weights, elevations, stations_elev,
+                    lapse_rate):
+    """
+    Return the (n_days x n_sites) weighted average of the (n_days x
+    n_stations) values where mask is True and the sum of the weights that
+    were used for each day and site.
+
+    The values of the stations are corrected each day with the lapse rate
+    for the difference of elevation between the stations and the sites.
+    Because the correction is linear, it is computed with the weighted mean
+    elevation of the stations that are used each day.
+    """
+    mask = mask.astype('float64')
+    norm = mask @ weights.T
+    total = np.where(mask > 0, values, 0) @ weights.T
+    if lapse_rate:
+        total += lapse_rate * (
+            elevations[None, :] * norm - (mask * stations_elev) @ weights.T)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        blended = np.where(norm > 0, total / norm, np.nan)
+    return blended, norm
+
+
+def create_virtual_wxdsets(wxdsets, sites, k=3, power=2,
+                           lapse_rate=LAPSE_RATE, pet_method='thornthwaite'):
+    """
+    Create virtual weather datasets at the specified sites from the data of
+    the k nearest weather datasets of each site.
+
+    Parameters
+    ----------
+    wxdsets: list
+        A list of weather datasets (:class:`WXDataFrameBase`).
+    sites: list
+        A list of dict with the 'Name', 'Latitude', 'Longitude' and
+        'Elevation' of the sites.
+    k: int
+        The number of nearest weather datasets that are used for each site.
+    power: float
+        The power of the inverse distance that is used to compute the
+        weights.
+    lapse_rate: float
+        The lapse rate in °C/m that is used to correct the air temperature
+        for the difference of elevation between the stations and the sites.
+    pet_method: str
+        The method that is used to compute the potential evapotranspiration
+        from the interpolated air temperature. See PET_METHODS for the list
+        of available methods.
+
+    Returns
+    -------
+    virtual_wxdsets: list
+        A list with the :class:`VirtualWXDataFrame` of the sites.
+    """
+    if pet_method not in PET_METHODS:
+        raise ValueError("Supported PET methods are: ", PET_METHODS)
+    latitudes = [site['Latitude'] for site in sites]
+    variables = [var for var in METEO_VARIABLES if var != 'PET']
+    index, blended, missing = interpolate_wxdsets(
+        wxdsets, latitudes, [site['Longitude'] for site in sites],
+        [site['Elevation'] for site in sites], k, power, lapse_rate,
+        variables)
+
+    # Gapfill the days for which none of the nearest stations of a site
+    # had data, as it is done when reading weather datafiles.
+    frames = {}
+    for i, var in enumerate(variables):
+        frames[var] = pd.DataFrame(blended[:, :, i], index=index)
+        if var in PRECIP_VARIABLES:
+            frames[var] = frames[var].fillna(0).where(
+                frames[var].bfill().notnull() & frames[var].ffill().notnull())
+        else:
+            frames[var] = frames[var].interpolate(limit_area='inside')
+
+    # Compute the potential evapotranspiration of all sites at once.
+    if pet_method == 'thornthwaite':
+        frames['PET'] = calcul_thornthwaite_batch(frames['Tavg'], latitudes)
+    elif pet_method == 'hargreaves':
+        frames['PET'] = calcul_hargreaves_batch(
+            frames['Tmax'], frames['Tmin'], frames['Tavg'], latitudes)
+    elif pet_method == 'oudin':
+        frames['PET'] = calcul_oudin_batch(frames['Tavg'], latitudes)
+
+    virtual_wxdsets = []
+    stations = [wxdset.metadata['Station Name'] for wxdset in wxdsets]
+    for j, site in enumerate(sites):
+        data = pd.DataFrame(
+            {var: frames[var].iloc[:, j].values for var in METEO_VARIABLES},
+            index=index, columns=METEO_VARIABLES)
+        isvalid = data['Tavg'].notnull() & data['Ptot'].notnull()
+        data = data[isvalid.values]
+        missing_value_indexes = {
+            var: index[missing[:, j, i] & isvalid.values] for
+            i, var in enumerate(variables)}
+        missing_value_indexes['PET'] = missing_value_indexes['Tavg']
+
+        distances = calc_dist_from_coord(
+            site['Latitude'], site['Longitude'],
+            np.array([wxdset.metadata['Latitude'] for wxdset in wxdsets]),
+            np.array([wxdset.metadata['Longitude'] for wxdset in wxdsets]))
+        nearest = np.argsort(distances, kind='mergesort')[:k]
+        metadata = {
+            'Station Name': 'Virtual {}'.format(site['Name']),
+            'Station ID': '',
+            'Location': ', '.join(stations[n] for n in nearest),
+            'Latitude': site['Latitude'],
+            'Longitude': site['Longitude'],
+            'Elevation': site['Elevation']}
+        virtual_wxdsets.append(
+            VirtualWXDataFrame(metadata, data, missing_value_indexes))
+    return virtual_wxdsets
+
+
+def calcul_correlation_matrix(values, measured, min_overlap=MIN_OVERLAP):
+    """
+    Return the (n_stations x n_stations) matrix of the Pearson correlation
+    coefficients between the daily data of all pairs of stations, computed
+    with the days for which both stations have measured data.
+
+    Parameters
+    ----------
+    values: array_like
+        A (n_days x n_stations) array with the daily data of the stations.
+    measured: array_like
+        A (n_days x n_stations) boolean array that is True where the data
+        of the stations were measured.
+    min_overlap: int
+        The minimal number of days with measured data in common that is
+        required to correlate two stations.
+
+    Returns
+    -------
+    corrcoef:
+        The matrix of the correlation coefficients, which is nan on the
+        diagonal and for the pairs of stations that do not have enough
+        measured data in common.
+    """
+    mask = measured.astype('float64')
+    x = np.where(measured, values, 0)
+
+    # All the sums that are needed to compute the correlation coefficients
+    # of all pairs of stations are computed with matrix products.
+    count = mask.T @ mask
+    sum_x = x.T @ mask
+    sum_xx = (x**2).T @ mask
+    sum_xy = x.T @ x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sum_xy - sum_x * sum_x.T / count
+        var = sum_xx - sum_x**2 / count
+        corrcoef = cov / np.sqrt(var * var.T)
+    corrcoef[count < max(min_overlap, 2)] = np.nan
+    np.fill_diagonal(corrcoef, np.nan)
+    return corrcoef
+
+
+def gapfill_wxdsets(wxdsets, k=3, variables=GAPFILL_VARIABLES,
+                    min_overlap=MIN_OVERLAP):
+    """
+    Fill the missing daily data of the weather datasets with a multiple
+    linear regression on the data of their k best correlated neighbour
+    weather datasets that have measured data for each day.
+
+    The data of the weather datasets are updated in place. Only the data
+    saved in the missing value time indexes of the datasets are filled,
+    so that measured data are never modified. Rain and snow are estimated
+    from the gapfilled total precipitation and air temperature.
+
+    Parameters
+    ----------
+    wxdsets: list
+        A list of weather datasets (:class:`WXDataFrameBase`).
+    k: int
+        The maximum number of neighbour stations that are used to fill
+        a missing value.
+    variables: list
+        The weather variables that are gapfilled.
+    min_overlap: int
+        The minimal number of days with measured data in common that is
+        required to use a neighbour station.
+
+    Returns
+    -------
+    filled: list
+        A list with a dict for each dataset with the time indexes of the
+        data that were gapfilled for each variable.
+    """
+    index, values, measured = align_wxdsets(wxdsets, variables)
+    filled = [{var: pd.DatetimeIndex([]) for var in variables} for
+              wxdset in wxdsets]
+    for i, var in enumerate(variables):
+        corrcoef = calcul_correlation_matrix(
+            values[:, :, i], measured[:, :, i], min_overlap)
+        for j, wxdset in enumerate(wxdsets):
+            days = np.where(
+                ~np.isnan(values[:, j, i]) & ~measured[:, j, i])[0]
+            predicted = _regress_from_neighbours(
+                values[:, :, i], measured[:, :, i], corrcoef[j], j, days,
+                k, min_overlap)
+            isfilled = ~np.isnan(predicted)
+            if not isfilled.any():
+                continue
+            if var in PRECIP_VARIABLES:
+                predicted = np.maximum(predicted, 0)
+            filled[j][var] = index[days[isfilled]]
+            wxdset.data.loc[filled[j][var], var] = predicted[isfilled]
+
+    for wxdset, station_filled in zip(wxdsets, filled):
+        # Estimate rain and snow for the days when the total precipitation
+        # or the air temperature was gapfilled.
+        days = pd.DatetimeIndex([])
+        for var in ['Ptot', 'Tavg']:
+            days = days.union(station_filled.get(var, days))
+        if len(days):
+            data = wxdset.data.loc[days]
+            wxdset.data.loc[days, 'Rain'] = calcul_rain_from_ptot(
+                data['Tavg'], data['Ptot'], Tcrit=0)
+            wxdset.data.loc[days, 'Snow'] = (
+                data['Ptot'] - wxdset.data.loc[days, 'Rain'])
+            for var in ['Rain', 'Snow']:
+                station_filled[var] = days
+
+        for var, days in station_filled.items():
+            wxdset.missing_value_indexes[var] = (
+                wxdset.missing_value_indexes.get(
+                    var, pd.DatetimeIndex([])).union(days))
+        wxdset._cumsum_tables = None
+    return filled
+
+
+def _regress_from_neighbours(values, measured, corrcoef, target, days, k,
+                             min_overlap):
+    """
+    Return the values of the target station predicted for the specified
+    days with a multiple linear regression on its k best correlated
+    neighbour stations that have measured data for each day.
+
+    The days are grouped by the set of neighbour stations that are used to
+    predict them, so that a regression model is fitted only once for each
+    set of neighbour stations. The values are nan for the days that could
+    not be predicted.
+    """
+    predicted = np.full(len(days), np.nan)
+    if len(days) == 0:
+        return predicted
+
+    # The candidate neighbour stations are sorted by decreasing
+    # correlation with the target station.
+    corrcoef = np.nan_to_num(corrcoef)
+    candidates = np.where(corrcoef > 0)[0]
+    candidates = candidates[np.argsort(-corrcoef[candidates])][:3 * k]
+    if len(candidates) == 0:
+        return predicted
+    cand_values = values[:, candidates]
+    cand_measured = measured[:, candidates]
+
+    # Select for each day the k best correlated candidates with measured
+    # data and identify each selection with an integer.
+    available = cand_measured[days]
+    selected = available & (np.cumsum(available, axis=1) <= k)
+    keys = selected @ (2 ** np.arange(len(candidates), dtype='int64'))
+
+    target_measured = measured[:, target]
+    order = np.argsort(keys, kind='mergesort')
+    unique_keys, starts = np.unique(keys[order], return_index=True)
+    for key, indexes in zip(unique_keys, np.split(order, starts[1:])):
+        if key == 0:
+            continue
+        columns = np.where(selected[indexes[0]])[0]
+        calibration = (target_measured &
+                       cand_measured[:, columns].all(axis=1))
+        if calibration.sum() < max(min_overlap, len(columns) + 1):
+            continue
+        A = np.column_stack([
+            np.ones(calibration.sum()), cand_values[calibration][:, columns]])
+        coeffs = np.linalg.lstsq(
+            A, values[calibration, target], rcond=None)[0]
+        predicted[indexes] = (
+            coeffs[0] + cand_values[days[indexes]][:, columns] @ coeffs[1:])
+    return predicted
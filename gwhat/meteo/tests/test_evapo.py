@@ -16,7 +16,10 @@ import pytest
 import numpy as np
 
 # ---- Local library imports
-from gwhat.meteo.evapotranspiration import calcul_daylength
+from gwhat.meteo.evapotranspiration import (
+    calcul_daylength, calcul_thornthwaite, calcul_thornthwaite_batch,
+    calcul_hargreaves_batch, calcul_oudin_batch, calcul_pet,
+    get_daylength_table, get_radiation_table)
 
 
 # =============================================================================
@@ -43,5 +46,91 @@ def test_calcul_daylength():
     assert np.max(np.abs(daylength - expected_daylength)) < 0.1
 
 
+
+def test_calcul_thornthwaite_batch():
+    """
+    Test that the potential evapotranspiration computed for several stations
+    at once is the same as that computed for each station separately.
+    """
+    dtimes = pd.date_range('2010-01-01', '2012-12-31')
+    doy = dtimes.dayofyear.values
+    Tavg = pd.DataFrame({
+        'station1': 10 - 15 * np.cos(2 * np.pi * doy / 365),
+        'station2': 5 - 20 * np.cos(2 * np.pi * doy / 365),
+        'station3': 15 - 10 * np.cos(2 * np.pi * doy / 365)},
+        index=dtimes)
+    latitudes = [45.33, 48.5, 52.1]
+
+    PET0 = calcul_thornthwaite_batch(Tavg, latitudes)
+    assert list(PET0.columns) == list(Tavg.columns)
+    assert (PET0.index == dtimes).all()
+    for column, latitude in zip(Tavg.columns, latitudes):
+        Ta = np.maximum(Tavg[column].groupby(dtimes.month).mean(), 0)
+        I = np.sum((0.2 * Ta)**1.514)
+        a = (6.75e-7 * I**3) - (7.71e-5 * I**2) + (1.7912e-2 * I) + 0.49239
+        expected = (16 * (10 * np.maximum(Tavg[column], 0) / I)**a *
+                    calcul_daylength(dtimes, latitude) / (12 * 30))
+        assert np.allclose(PET0[column].values, expected.values)
+        assert np.allclose(
+            calcul_thornthwaite(Tavg[column], latitude).values,
+            expected.values)
+
+    # Assert that the photoperiod lookup table is cached.
+    assert get_daylength_table(latitudes) is get_daylength_table(latitudes)
+    assert get_daylength_table(latitudes).shape == (366, 3)
+
+
+
+def test_extraterrestrial_radiation():
+    """
+    Test that the extraterrestrial radiation calculations are correct.
+    """
+    # The expected value is from example 8 of the FAO Irrigation and Drainage
+    # Paper 56 (Allen et al., 1998) for the 3rd of September at 20°S. The
+    # tolerance accounts for the different sun declination formula that
+    # is used in the FAO paper.
+    Ra = get_radiation_table([-20])[246 - 1, 0]
+    assert abs(Ra - 32.2) < 0.5
+
+    # Assert that there is no radiation during the polar night.
+    assert get_radiation_table([80])[0, 0] == 0
+
+
+def test_calcul_pet_methods():
+    """
+    Test that the potential evapotranspiration is computed correctly with
+    the Hargreaves and Oudin methods.
+    """
+    dtimes = pd.date_range('2010-01-01', '2010-12-31')
+    doy = dtimes.dayofyear.values
+    data = pd.DataFrame({'Tavg': 10 - 15 * np.cos(2 * np.pi * doy / 365)},
+                        index=dtimes)
+    data['Tmax'] = data['Tavg'] + 5
+    data['Tmin'] = data['Tavg'] - 5
+    Ra = get_radiation_table([45.33])[doy - 1, 0]
+
+    PET0 = calcul_pet(data, 45.33, 'hargreaves')
+    expected = np.maximum(
+        0.0023 * Ra / 2.45 * (data['Tavg'] + 17.8) * 10**0.5, 0)
+    assert np.allclose(PET0.values, expected)
+    assert np.allclose(calcul_hargreaves_batch(
+        data[['Tmax']], data[['Tmin']], data[['Tavg']], [45.33]
+        ).values[:, 0], expected)
+
+    PET0 = calcul_pet(data, 45.33, 'oudin')
+    expected = Ra / 2.45 * np.maximum(data['Tavg'] + 5, 0) / 100
+    assert np.allclose(PET0.values, expected)
+    assert np.allclose(calcul_oudin_batch(
+        data[['Tavg']], [45.33]).values[:, 0], expected)
+    assert (PET0[data['Tavg'] <= -5] == 0).all()
+
+    PET0 = calcul_pet(data, 45.33, 'thornthwaite')
+    assert np.allclose(
+        PET0.values, calcul_thornthwaite(data['Tavg'], 45.33).values)
+
+    with pytest.raises(ValueError):
+        calcul_pet(data, 45.33, 'dummy')
+
+
 if __name__ == "__main__":
     pytest.main(['-x', os.path.basename(__file__), '-v', '-rw'])
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright © GWHAT Project Contributors
+# https://github.com/jnsebgosselin/gwhat
+#
+# This file is part of GWHAT (Ground-Water Hydrograph Analysis Toolbox).
+# Licensed under the terms of the GNU General Public License.
+# -----------------------------------------------------------------------------
+
+# ---- Standard library imports
+import os
+
+# ---- Third party imports
+import pandas as pd
+import pytest
+import numpy as np
+
+# ---- Local library imports
+from gwhat.meteo.weather_reader import METEO_VARIABLES
+from gwhat.meteo.multistation import (
+    VirtualWXDataFrame, calcul_idw_weights, interpolate_wxdsets,
+    create_virtual_wxdsets, calcul_correlation_matrix, gapfill_wxdsets,
+    LAPSE_RATE)
+
+
+# =============================================================================
+# ---- Pytest Fixtures
+# =============================================================================
+def create_station(name, latitude, longitude, elevation, tavg, ptot,
+                   start='2000-01-01', end='2000-12-31', missing=None):
+    index = pd.date_range(start, end, freq='D')
+    data = pd.DataFrame(
+        {'Tmax': tavg + 5, 'Tmin': tavg - 5, 'Tavg': tavg, 'Ptot': ptot,
+         'Rain': ptot * 0.75, 'Snow': ptot * 0.25, 'PET': 0},
+        index=index, columns=METEO_VARIABLES)
+    missing = pd.DatetimeIndex([] if missing is None else missing)
+    metadata = {'Station Name': name, 'Latitude': latitude,
+                'Longitude': longitude, 'Elevation': elevation}
+    return VirtualWXDataFrame(
+        metadata, data, {var: missing for var in METEO_VARIABLES})
+
+
+@pytest.fixture
+def stations():
+    return [create_station('Station1', 45, -73, 100, 10, 2,
+                           missing=['2000-06-01', '2000-06-02']),
+            create_station('Station2', 45, -72, 100, 20, 4,
+                           missing=['2000-06-02']),
+            create_station('Station3', 48, -65, 500, 0, 8)]
+
+
+# =============================================================================
+# ---- Tests
+# =============================================================================
+def test_calcul_idw_weights():
+    """
+    Test that only the k nearest stations of each site get a weight.
+    """
+    distances = np.array([[10, 20, 40], [30, 0, 10]])
+    weights = calcul_idw_weights(distances, k=2, power=2)
+    assert np.allclose(weights, [[1/100, 1/400, 0], [0, 1e6, 1/100]])
+
+    weights = calcul_idw_weights(distances, k=5, power=1)
+    assert np.allclose(weights, [[1/10, 1/20, 1/40], [1/30, 1e3, 1/10]])
+
+
+def test_interpolate_wxdsets(stations):
+    """
+    Test that the weather data of the stations are interpolated correctly
+    at the location of many sites at once.
+    """
+    index, blended, missing = interpolate_wxdsets(
+        stations, [45, 45, 45], [-72.5, -73, -72.5], [100, 100, 300],
+        k=2, variables=['Tavg', 'Ptot'])
+    assert len(index) == 366
+    assert blended.shape == (366, 3, 2)
+
+    # The first site is located midway between the first two stations.
+    assert np.allclose(blended[0, 0], [15, 3])
+    assert np.allclose(blended[0, 1], [10, 2], atol=1e-6)
+
+    # The temperature of the third site is corrected for elevation.
+    assert np.allclose(blended[0, 2], [15 + 200 * LAPSE_RATE, 3])
+
+    # Assert that only the stations with measured data are used.
+    iday = index.get_loc('2000-06-01')
+    assert np.allclose(blended[iday, 0], [20, 4])
+    assert not missing[iday].any()
+
+    # Assert that the gapfilled data are used and flagged as missing when
+    # none of the nearest stations have measured data.
+    iday = index.get_loc('2000-06-02')
+    assert np.allclose(blended[iday, 0], [15, 3])
+    assert missing[iday, :2].all()
+
+
+def test_create_virtual_wxdsets(stations):
+    """
+    Test that virtual weather datasets are created correctly from the
+    interpolated data of the stations.
+    """
+    stations[1] = create_station('Station2', 45, -72, 100, 20, 4,
+                                 start='2000-03-01', end='2001-06-30')
+    sites = [{'Name': 'well1', 'Latitude': 45, 'Longitude': -72.5,
+              'Elevation': 100},
+             {'Name': 'well2', 'Latitude': 45, 'Longitude': -72.2,
+              'Elevation': 100}]
+    virtual_wxdsets = create_virtual_wxdsets(stations, sites, k=2)
+    assert len(virtual_wxdsets) == 2
+
+    wxdset = virtual_wxdsets[0]
+    assert wxdset.metadata['Station Name'] == 'Virtual well1'
+    assert wxdset.metadata['Location'] == 'Station1, Station2'
+    assert wxdset.data.index[0] == pd.Timestamp('2000-01-01')
+    assert wxdset.data.index[-1] == pd.Timestamp('2001-06-30')
+    assert not wxdset.data.isnull().any().any()
+    assert np.allclose(wxdset.data['Rain'] + wxdset.data['Snow'],
+                       wxdset.data['Ptot'])
+    assert (wxdset.data['PET'] >= 0).all()
+    assert wxdset.data['PET'].max() > 0
+    assert np.allclose(wxdset.data.loc['2000-02-01', 'Tavg'], 10)
+    assert np.allclose(wxdset.data.loc['2000-04-01', 'Tavg'], 15)
+    assert np.allclose(wxdset.data.loc['2001-04-01', 'Tavg'], 20)
+
+    with pytest.raises(ValueError):
+        create_virtual_wxdsets(stations, sites, pet_method='dummy')
+
+
+def test_calcul_correlation_matrix():
+    """
+    Test that the correlation coefficients of all pairs of stations are
+    computed correctly with the days when both stations have measured data.
+    """
+    np.random.seed(0)
+    values = np.random.rand(1000, 4)
+    values[:, 1] += values[:, 0]
+    measured = np.ones(values.shape, dtype=bool)
+    measured[:100, 0] = False
+    measured[500:, 3] = False
+
+    corrcoef = calcul_correlation_matrix(values, measured, min_overlap=600)
+    assert np.isnan(np.diag(corrcoef)).all()
+    assert np.isnan(corrcoef[3]).all() and np.isnan(corrcoef[:, 3]).all()
+    assert np.allclose(corrcoef, corrcoef.T, equal_nan=True)
+    assert np.isclose(corrcoef[0, 1],
+                      np.corrcoef(values[100:, 0], values[100:, 1])[0, 1])
+    assert np.isclose(corrcoef[1, 2],
+                      np.corrcoef(values[:, 1], values[:, 2])[0, 1])
+
+
+def test_gapfill_wxdsets():
+    """
+    Test that the missing data of the stations are filled with a regression
+    on their best correlated neighbour stations.
+    """
+    np.random.seed(0)
+    index = pd.date_range('2000-01-01', '2002-12-31', freq='D')
+    regional = 10 - 15 * np.cos(2 * np.pi * index.dayofyear / 365)
+    rainfall = np.random.exponential(3, len(index))
+    truths = []
+    stations = []
+    for i, (offset, scale) in enumerate([(0, 1), (2, 0.9), (-1, 1.1)]):
+        tavg = offset + scale * regional + np.random.normal(0, 0.1, len(index))
+        ptot = scale * rainfall
+        truths.append(pd.DataFrame({'Tavg': tavg, 'Ptot': ptot}, index=index))
+        stations.append(create_station(
+            'Station{}'.format(i), 45, -72 - i, 100, tavg, ptot,
+            end='2002-12-31'))
+    # Add a station that is not correlated with the others.
+    stations.append(create_station(
+        'Station3', 45, -75, 100, np.random.normal(0, 10, len(index)),
+        np.random.exponential(3, len(index)), end='2002-12-31'))
+
+    # Remove a long period of data for the first station and fill the
+    # missing data as it is done when reading weather datafiles.
+    missing = pd.date_range('2001-05-01', '2001-09-30', freq='D')
+    stations[0].data.loc[missing, ['Tmax', 'Tmin', 'Tavg']] = 10
+    stations[0].data.loc[missing, ['Ptot', 'Rain', 'Snow']] = 0
+    stations[0].missing_value_indexes = {
+        var: missing for var in METEO_VARIABLES}
+    # Remove data for the neighbour stations too in the same period.
+    stations[1].missing_value_indexes = {
+        var: missing[:10] for var in METEO_VARIABLES}
+
+    filled = gapfill_wxdsets(stations, k=2, variables=['Tavg', 'Ptot'])
+    assert list(filled[0]['Tavg']) == list(missing)
+    assert list(filled[1]['Tavg']) == list(missing[:10])
+    assert len(filled[2]['Tavg']) == 0 and len(filled[3]['Ptot']) == 0
+    assert list(filled[0]['Rain']) == list(missing)
+    assert stations[0].missing_value_indexes['Tavg'].equals(missing)
+
+    data = stations[0].data.loc[missing]
+    assert np.allclose(data['Tavg'], truths[0].loc[missing, 'Tavg'],
+                       atol=0.5)
+    assert np.allclose(data['Ptot'], truths[0].loc[missing, 'Ptot'],
+                       atol=0.1)
+    assert (data['Ptot'] >= 0).all()
+    assert np.allclose(data['Rain'] + data['Snow'], data['Ptot'])
+    assert (data.loc[data['Tavg'] < 0, 'Rain'] == 0).all()
+
+    # Assert that the measured data were not changed.
+    assert np.array_equal(stations[0].data.loc['2000', 'Tavg'].values,
+                          truths[0].loc['2000', 'Tavg'].values)
+
+
+if __name__ == "__main__":
+    pytest.main(['-x', os.path.basename(__file__), '-v', '-rw'])
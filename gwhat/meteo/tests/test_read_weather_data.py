@@ -7,6 +7,7 @@
 # Licensed under the terms of the GNU General Public License.
 
 # ---- Standard library imports
+import csv
 import os
 import datetime as dt
 import os.path as osp
@@ -17,7 +18,8 @@ import pandas as pd
 import pytest
 
 # ---- Local library imports
-from gwhat.meteo.weather_reader import WXDataFrame
+from gwhat.meteo.weather_reader import WXDataFrame, read_weather_datafile
+from gwhat.common.utils import save_content_to_excel
 from gwhat.utils.dates import datetimeindex_to_xldates
 
 
@@ -60,5 +62,114 @@ def test_read_weather_data(ext):
                           np.array([-0.500, -1.125, -1.750, -2.375, -3.00]))
 
 
+@pytest.mark.parametrize("delimiter", ['\t', ';'])
+def test_read_weather_data_delimiters(delimiter, tmpdir):
+    """
+    Test that the delimiter of csv weather datafiles is guessed correctly
+    and that the same metadata and data are read for any delimiter.
+    """
+    fmeteo = osp.join(osp.dirname(__file__), "sample_weather_datafile.csv")
+    expected_metadata, expected_data = read_weather_datafile(fmeteo)
+
+    filename = osp.join(str(tmpdir), "sample_weather_datafile.csv")
+    with open(fmeteo, 'r') as fin, open(filename, 'w') as fout:
+        fout.write(fin.read().replace(',', delimiter))
+    metadata, data = read_weather_datafile(filename)
+
+    metadata.pop('filename')
+    expected_metadata.pop('filename')
+    assert metadata == expected_metadata
+    assert list(data.columns) == list(expected_data.columns)
+    assert (data.index == expected_data.index).all()
+    np.testing.assert_array_equal(data.values, expected_data.values)
+
+
+def test_read_weather_data_comma_decimals(tmpdir):
+    """
+    Test that weather data with comma decimals, blank entries and empty
+    rows at the ends of the record are read correctly.
+    """
+    fmeteo = osp.join(osp.dirname(__file__), "sample_weather_datafile.csv")
+    expected_metadata, expected_data = read_weather_datafile(fmeteo)
+
+    with open(fmeteo, 'r') as f:
+        lines = f.read().splitlines()
+    istart = [i for i, line in enumerate(lines) if line.startswith('Year')][0]
+    datalines = [line.replace(',', ';').replace('.', ',') for
+                 line in lines[istart + 1:]]
+    filename = osp.join(str(tmpdir), "sample_weather_datafile.csv")
+    with open(filename, 'w') as f:
+        f.write('\n'.join(
+            [line.replace(',', ';') for line in lines[:istart + 1]] +
+            ['2009;12;30; ; ;;', '2009;12;31;;;;'] + datalines +
+            ['2016;1;1;;;;']))
+    metadata, data = read_weather_datafile(filename)
+
+    metadata.pop('filename')
+    expected_metadata.pop('filename')
+    assert metadata == expected_metadata
+    assert (data.index == expected_data.index).all()
+    np.testing.assert_array_equal(data.values, expected_data.values)
+
+
+
+@pytest.mark.parametrize("ext", ['.xls', '.xlsx'])
+def test_read_weather_data_excel_comma_decimals(ext, tmpdir):
+    """
+    Test that the numbers saved as text with a comma decimal separator in
+    xls and xlsx weather datafiles are read correctly.
+    """
+    fmeteo = osp.join(osp.dirname(__file__), "sample_weather_datafile.csv")
+    expected_metadata, expected_data = read_weather_datafile(fmeteo)
+
+    with open(fmeteo, 'r') as f:
+        rows = list(csv.reader(f))
+    istart = [i for i, row in enumerate(rows) if row[0] == 'Year'][0]
+    fcontent = rows[:istart + 1] + [
+        [value.replace('.', ',') for value in row] for
+        row in rows[istart + 1:]]
+    filename = osp.join(str(tmpdir), "sample_weather_datafile" + ext)
+    save_content_to_excel(filename, fcontent)
+    metadata, data = read_weather_datafile(filename)
+
+    assert (data.index == expected_data.index).all()
+    np.testing.assert_array_equal(data.values, expected_data.values)
+
+
+def test_weather_normals():
+    """
+    Test that the weather normals computed from the cumulative sum tables
+    are the same as those computed by grouping the monthly and yearly
+    values of the dataset.
+    """
+    fmeteo = osp.join(osp.dirname(__file__), "sample_weather_datafile.csv")
+    wxdset = WXDataFrame(fmeteo)
+
+    monthly_values = wxdset.get_monthly_values()
+    yearly_values = wxdset.get_yearly_values()
+    for year_range in [None, (2010, 2015), (2011, 2013), (2012, 2012),
+                       (2000, 2011), (2014, 2020)]:
+        monthly = monthly_values
+        yearly = yearly_values
+        if year_range:
+            years = monthly.index.get_level_values(0)
+            monthly = monthly[(years >= year_range[0]) &
+                              (years <= year_range[1])]
+            yearly = yearly[(yearly.index >= year_range[0]) &
+                            (yearly.index <= year_range[1])]
+        expected = monthly.groupby(level=[1]).mean()
+
+        normals = wxdset.get_monthly_normals(year_range)
+        assert normals.index.name == 'Month'
+        assert list(normals.columns) == list(expected.columns)
+        assert np.allclose(normals.values, expected.values)
+        assert np.allclose(wxdset.get_yearly_normals(year_range).values,
+                           yearly.mean().values)
+
+    # Assert that no normals are returned outside of the data period.
+    assert len(wxdset.get_monthly_normals((1990, 2000))) == 0
+    assert wxdset.get_yearly_normals((1990, 2000)).isnull().all()
+
+
 if __name__ == "__main__":
     pytest.main(['-x', os.path.basename(__file__), '-v', '-rw'])
@@ -11,6 +11,7 @@
 # ---- Standard library imports
 import csv
 import datetime as dt
+import io
 import os
 import os.path as osp
 import re
@@ -23,12 +24,13 @@ from abc import abstractmethod
 import numpy as np
 import pandas as pd
 import xlrd
-from xlrd.xldate import xldate_from_datetime_tuple, xldate_as_datetime
+from xlrd.xldate import xldate_from_datetime_tuple
 
 # ---- Local library imports
-from gwhat.meteo.evapotranspiration import calcul_thornthwaite
+from gwhat.meteo.evapotranspiration import calcul_pet
 from gwhat.common.utils import save_content_to_file
 from gwhat.utils.math import nan_as_text_tolist
+from gwhat.utils.dates import datetimeindex_to_xldates
 from gwhat import __namever__
 
 
@@ -44,6 +46,20 @@ VARLABELS_MAP = {'Ptot': 'Ptot (mm)',
                  'PET': 'PET (mm)'}
 FILE_EXTS = ['.out', '.csv', '.xls', '.xlsx']
 
+# Regexes used to find the columns of the data in weather datafiles.
+COL_REGEX = OrderedDict([
+    ('Year', r'(year)'),
+    ('Month', r'(month)'),
+    ('Day', r'(day)'),
+    ('Tmax', r'(maxtemp)'),
+    ('Tmin', r'(mintemp)'),
+    ('Tavg', r'(meantemp)'),
+    ('Ptot', r'(totalprecip)'),
+    ('PET', r'(etp|evapo)'),
+    ('Rain', r'(rain)'),
+    ('Snow', r'(snow)')
+    ])
+
 
 # ---- API
 class WXDataFrameBase(Mapping):
@@ -64,6 +80,7 @@ class WXDataFrameBase(Mapping):
         self.data = pd.DataFrame([], columns=METEO_VARIABLES)
         self.missing_value_indexes = {
             var: pd.DatetimeIndex([]) for var in METEO_VARIABLES}
+        self._cumsum_tables = None
 
     @abstractmethod
     def __load_dataset__(self):
@@ -124,11 +141,7 @@ class WXDataFrameBase(Mapping):
         Return a numpy array containing the Excel numerical dates
         corresponding to the dates of the dataset.
         """
-        print('Converting datetimes to xldates...', end=' ')
-        timedeltas = self.data.index - xldate_as_datetime(4000, 0)
-        xldates = timedeltas.total_seconds() / (3600 * 24) + 4000
-        print('done')
-        return xldates.values
+        return datetimeindex_to_xldates(self.data.index)
 
     # ---- utilities
     def strftime(self):
@@ -165,29 +178,86 @@ class WXDataFrameBase(Mapping):
         return df
 
     # ---- Normals
+    def get_cumsum_tables(self):
+        """
+        Return a dict with the cumulative sums over the years of the monthly
+        and yearly values of the weather variables saved in this data frame
+        and the cumulative number of years with data.
+
+        The tables are computed only once for the dataset and are used
+        to compute the normals for any range of years with a few
+        array lookups.
+        """
+        if self._cumsum_tables is None:
+            self._cumsum_tables = self._calcul_cumsum_tables()
+        return self._cumsum_tables
+
+    def _calcul_cumsum_tables(self):
+        """
+        Calcul the cumulative sums over the years of the monthly and yearly
+        values of the weather variables saved in this data frame.
+        """
+        monthly_values = self.get_monthly_values()
+        yearly_values = self.get_yearly_values()
+        first_year = int(yearly_values.index.min())
+        nyears = int(yearly_values.index.max()) - first_year + 1
+
+        monthly = np.full((nyears, 12, len(monthly_values.columns)), np.nan)
+        monthly[monthly_values.index.get_level_values(0) - first_year,
+                monthly_values.index.get_level_values(1) - 1] = (
+                    monthly_values.values)
+        yearly = np.full((nyears, len(yearly_values.columns)), np.nan)
+        yearly[yearly_values.index - first_year] = yearly_values.values
+
+        tables = {'first_year': first_year}
+        for name, values in [('monthly', monthly), ('yearly', yearly)]:
+            zeros = np.zeros((1,) + values.shape[1:])
+            tables[name + '_cumsum'] = np.vstack(
+                [zeros, np.cumsum(np.nan_to_num(values), axis=0)])
+            tables[name + '_count'] = np.vstack(
+                [zeros, np.cumsum(~np.isnan(values), axis=0)])
+        return tables
+
+    def _get_normals_from_cumsum(self, name, year_range):
+        """
+        Return the normals computed from the cumulative sums of the
+        specified table for the specified range of years.
+        """
+        tables = self.get_cumsum_tables()
+        nyears = len(tables[name + '_cumsum']) - 1
+        if year_range:
+            istart = min(max(year_range[0] - tables['first_year'], 0), nyears)
+            iend = min(max(year_range[1] - tables['first_year'] + 1, 0),
+                       nyears)
+            iend = max(iend, istart)
+        else:
+            istart, iend = 0, nyears
+        total = (tables[name + '_cumsum'][iend] -
+                 tables[name + '_cumsum'][istart])
+        count = (tables[name + '_count'][iend] -
+                 tables[name + '_count'][istart])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return total / count
+
     def get_monthly_normals(self, year_range=None):
         """
         Return the monthly normals for the weather variables saved in this
         data frame.
         """
-        df = self.get_monthly_values()
-        if year_range:
-            df = df.loc[(df.index.get_level_values(0) >= year_range[0]) &
-                        (df.index.get_level_values(0) <= year_range[1])]
-        df = df.groupby(level=[1]).mean()
-        df.index.rename('Month', inplace=True)
-        return df
+        df = pd.DataFrame(
+            self._get_normals_from_cumsum('monthly', year_range),
+            columns=PRECIP_VARIABLES + TEMP_VARIABLES,
+            index=pd.Index(np.arange(1, 13), name='Month'))
+        return df.dropna(how='all')
 
     def get_yearly_normals(self, year_range=None):
         """
         Return the yearly normals for the weather variables saved in this
         data frame.
         """
-        df = self.get_yearly_values()
-        if year_range:
-            df = df.loc[(df.index >= year_range[0]) &
-                        (df.index <= year_range[1])]
-        return df.mean()
+        return pd.Series(
+            self._get_normals_from_cumsum('yearly', year_range),
+            index=PRECIP_VARIABLES + TEMP_VARIABLES)
 
 
 class WXDataFrame(WXDataFrameBase):
@@ -264,8 +334,8 @@ class WXDataFrame(WXDataFrameBase):
 
         # Calculate potential evapotranspiration if missing.
         if 'PET' not in self.data.columns:
-            self.data['PET'] = calcul_thornthwaite(
-                self.data['Tavg'], self.metadata['Latitude'])
+            self.data['PET'] = calcul_pet(
+                self.data, self.metadata['Latitude'], 'thornthwaite')
             print("Potential evapotranspiration evaluated with Thornthwaite.")
 
         isnull = self.data.isnull().any()
@@ -278,7 +348,13 @@ class WXDataFrame(WXDataFrameBase):
 # ---- Base functions: file and data manipulation
 def open_weather_datafile(filename):
     """
-    Open the csv datafile and try to guess the delimiter.
+    Open the datafile and return the rows of its header, up to and
+    including the row with the column labels, the names of the valid
+    columns of the data and a 2D array with the numerical data of
+    these columns.
+
+    For csv datafiles, the delimiter is guessed from the row with the column
+    labels only and the file is read in a single pass.
     Return None if this fails.
     """
     root, ext = os.path.splitext(filename)
@@ -289,26 +365,101 @@ def open_weather_datafile(filename):
               osp.basename(filename))
 
     if ext in ['.csv', '.out']:
-        for dlm in ['\t', ',', ';']:
-            with open(filename, 'r') as csvfile:
-                reader = list(csv.reader(csvfile, delimiter=dlm))
-            for row in reader:
+        with open(filename, 'r') as csvfile:
+            header = []
+            for line in csvfile:
+                header.append(line)
                 if re.search(r'(time|datetime|year)',
-                             ''.join(row).replace(" ", "").replace("_", ""),
+                             line.replace(" ", "").replace("_", ""),
                              re.IGNORECASE):
-                    if len(row) >= 2:
-                        return reader
-                    else:
-                        break
-        else:
-            print("Failed to open %s." % os.path.basename(filename))
-            return None
+                    dlm = sniff_weather_datafile_delimiter(line)
+                    break
+            else:
+                dlm = None
+            if dlm is None:
+                print("Failed to open %s." % os.path.basename(filename))
+                return None
+            header = list(csv.reader(header, delimiter=dlm))
+            columns, indexes = get_weather_datafile_columns(header[-1])
+            data = parse_weather_datafile_data(csvfile.read(), dlm, indexes)
+        return header, columns, data
     elif ext in ['.xls', '.xlsx']:
         with xlrd.open_workbook(filename, on_demand=True) as wb:
             sheet = wb.sheet_by_index(0)
             reader = [sheet.row_values(rowx, start_colx=0, end_colx=None) for
                       rowx in range(sheet.nrows)]
-            return reader
+        for i, row in enumerate(reader):
+            if re.search(r'(time|datetime|year)',
+                         ''.join([str(v) for v in row]
+                                 ).replace(" ", "").replace("_", ""),
+                         re.IGNORECASE):
+                header = reader[:i + 1]
+                columns, indexes = get_weather_datafile_columns(header[-1])
+                data = pd.DataFrame(
+                    [[row[j] if j < len(row) else '' for j in indexes]
+                     for row in reader[i + 1:]], columns=columns)
+                # The numbers that were saved as text in the workbook may
+                # use a comma as the decimal separator.
+                data = data.applymap(
+                    lambda v: v.replace(',', '.') if isinstance(v, str) else v)
+                data = data.apply(pd.to_numeric, errors='coerce')
+                return header, columns, data.values.astype('float64')
+        print("Failed to open %s." % os.path.basename(filename))
+        return None
+
+
+def get_weather_datafile_columns(labels):
+    """
+    Return the names and indexes of the valid columns of the data from
+    the labels of the columns of a weather datafile.
+    """
+    columns = []
+    indexes = []
+    for i, label in enumerate(labels):
+        label = str(label).replace(" ", "").replace("_", "")
+        for column, regex in COL_REGEX.items():
+            if re.search(regex, label, re.IGNORECASE):
+                columns.append(column)
+                indexes.append(i)
+                break
+    return columns, indexes
+
+
+def parse_weather_datafile_data(text, delimiter, indexes):
+    """
+    Parse the data of a csv weather datafile directly to a 2D array of
+    float64 values, keeping only the columns at the specified indexes.
+
+    Blank entries are read as nan. The data are parsed with the C parser
+    of pandas and parsing is attempted again with a comma as the decimal
+    separator if this fails.
+    """
+    decimals = ['.', ','] if delimiter != ',' else ['.']
+    for decimal in decimals:
+        try:
+            data = pd.read_csv(
+                io.StringIO(text), sep=delimiter, header=None,
+                usecols=indexes, dtype='float64', skipinitialspace=True,
+                decimal=decimal, engine='c')
+        except pd.errors.EmptyDataError:
+            return np.empty((0, len(indexes)), dtype='float64')
+        except ValueError:
+            if decimal == decimals[-1]:
+                raise
+        else:
+            # The columns are sorted in the order of the indexes.
+            return data[indexes].values
+
+
+def sniff_weather_datafile_delimiter(line):
+    """
+    Return the delimiter used in the specified line with the column labels
+    of a csv weather datafile or None if no delimiter can be found.
+    """
+    for dlm in ['\t', ',', ';']:
+        if len(next(csv.reader([line], delimiter=dlm))) >= 2:
+            return dlm
+    return None
 
 
 def read_weather_datafile(filename):
@@ -327,9 +478,10 @@ def read_weather_datafile(filename):
     # The dataframe must use a datetime index.
 
     # Get info from header and grab the data from the file.
-    reader = open_weather_datafile(filename)
-    if reader is None:
+    content = open_weather_datafile(filename)
+    if content is None:
         return None, None
+    header, columns, data = content
 
     HEADER_REGEX = {
         'Station Name': r'(stationname|name)',
@@ -348,7 +500,7 @@ def read_weather_datafile(filename):
         'Elevation': float
         }
 
-    for i, row in enumerate(reader):
+    for row in header[:-1]:
         if len(row) == 0:
             continue
 
@@ -360,40 +512,7 @@ def read_weather_datafile(filename):
                 except ValueError:
                     # The default value will be kept.
                     print('Wrong format for entry "%s".' % key)
-        else:
-            if re.search(r'(time|datetime|year)', label, re.IGNORECASE):
-                istart = i + 1
-                break
 
-    # Fetch the valid columns from the data header.
-    COL_REGEX = OrderedDict([
-        ('Year', r'(year)'),
-        ('Month', r'(month)'),
-        ('Day', r'(day)'),
-        ('Tmax', r'(maxtemp)'),
-        ('Tmin', r'(mintemp)'),
-        ('Tavg', r'(meantemp)'),
-        ('Ptot', r'(totalprecip)'),
-        ('PET', r'(etp|evapo)'),
-        ('Rain', r'(rain)'),
-        ('Snow', r'(snow)')
-        ])
-    columns = []
-    indexes = []
-    for i, label in enumerate(row):
-        label = label.replace(" ", "").replace("_", "")
-        for column, regex in COL_REGEX.items():
-            if re.search(regex, label, re.IGNORECASE):
-                columns.append(column)
-                indexes.append(i)
-                break
-
-    # Format the numerical data.
-    data = np.array(reader[istart:])[:, indexes]
-    data = np.char.strip(data, ' ')
-    data[data == ''] = np.nan
-    data = np.char.replace(data, ',', '.')
-    data = data.astype('float')
     data = clean_endsof_file(data)
 
     # Format the data into a pandas dataframe.
@@ -450,38 +569,21 @@ def clean_endsof_file(data):
     """
     Remove nan values at the beginning and end of the record if any.
     """
+    isvalid = ~np.all(np.isnan(data[:, 3:]), axis=1)
+    if not np.any(isvalid):
+        print('Dataset is empty.')
+        return None
 
-    # ---- Beginning ----
-
-    n = len(data[:, 0])
-    while True:
-        if len(data[:, 0]) == 0:
-            print('Dataset is empty.')
-            return None
-
-        if np.all(np.isnan(data[0, 3:])):
-            data = np.delete(data, 0, axis=0)
-        else:
-            break
-
-    if n < len(data[:, 0]):
-        print('%d empty' % (n - len(data[:, 0])) +
+    istart = np.argmax(isvalid)
+    if istart > 0:
+        print('%d empty' % istart +
               ' rows of data removed at the beginning of the dataset.')
-
-    # ---- End ----
-
-    n = len(data[:, 0])
-    while True:
-        if np.all(np.isnan(data[-1, 3:])):
-            data = np.delete(data, -1, axis=0)
-        else:
-            break
-
-    if n < len(data[:, 0]):
-        print('%d empty' % (n - len(data[:, 0])) +
+    iend = len(isvalid) - np.argmax(isvalid[::-1])
+    if iend < len(isvalid):
+        print('%d empty' % (len(isvalid) - iend) +
               ' rows of data removed at the end of the dataset.')
 
-    return data
+    return data[istart:iend]
 
 
 # ----- Base functions: secondary variables
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © GWHAT Project Contributors
+# https://github.com/jnsebgosselin/gwhat
+#
+# This file is part of GWHAT (Ground-Water Hydrograph Analysis Toolbox).
+# Licensed under the terms of the GNU General Public License.
+
+"""
+Incremental backups of the hdf5 project files.
+
+The backup of a project is a complete project file with a .bak extension
+that is updated by copying only the parts of the project, called units,
+that were modified since the last backup. The units are the objects of the
+project that are located at most UNIT_DEPTH levels below the root, for
+example the water levels, the BRF or each GLUE result of a water level
+dataset. The signature of each unit is saved in a .bak.json file.
+
+To avoid reading the whole project at each backup, the modified units are
+first detected from a fingerprint of their metadata, which includes their
+names, shapes and attributes. The datasets of a project are marked with
+the time of their creation and of their last modification in place by the
+writers of the project, so that any change to their data also changes the
+fingerprint of their unit. Only the units whose fingerprint changed are
+then read to compute their signature.
+
+The previous version of the units that are replaced in the backup are kept
+in a small rolling set of generation files (.bak.1, .bak.2, etc.), so that
+the project can be restored to any of the last generations.
+"""
+
+# ---- Standard library imports
+from datetime import datetime
+import hashlib
+import json
+import os
+import os.path as osp
+from shutil import copyfile
+import time
+
+# ---- Third party imports
+import h5py
+import numpy as np
+
+# The number of generations of backups that are kept for a project.
+BACKUP_GENERATIONS = 3
+
+# The maximum depth below the root of the units of a project.
+UNIT_DEPTH = 3
+
+# The approximate size in bytes of the slabs of data that are read at once
+# to compute the signature of a dataset.
+SLAB_SIZE = 2**22
+
+# The key used to save the signature of the groups that are split in units.
+SKELETON = '<skeleton>'
+
+# The name of the dataset where the information needed to revert a
+# generation is saved in the generation files.
+GENERATION_INFO = '__backup__'
+
+# The name of the attribute where the time of the last modification of the
+# datasets of a project is saved.
+MODIFIED_ATTR = '__modified__'
+
+
+class BackupCancelled(Exception):
+    """Raised when the backup of a project is cancelled."""
+    pass
+
+
+def get_backup_filenames(filename):
+    """
+    Return the filenames of the backup, the signatures file and the
+    generation files of the specified project file.
+    """
+    bak_filename = filename + '.bak'
+    return (bak_filename, bak_filename + '.json',
+            ['{}.{}'.format(bak_filename, n) for
+             n in range(1, BACKUP_GENERATIONS + 1)])
+
+
+def get_project_units(h5file):
+    """
+    Return the list of the paths of the groups that are split in units and
+    the list of the paths of the units of the specified h5py file.
+    """
+    groups = ['/']
+    units = []
+
+    def split(group, depth):
+        for item in group.values():
+            if (isinstance(item, h5py.Group) and depth < UNIT_DEPTH and
+                    any(isinstance(child, h5py.Group) for
+                        child in item.values())):
+                groups.append(item.name)
+                split(item, depth + 1)
+            else:
+                units.append(item.name)
+    split(h5file, 1)
+    return groups, units
+
+
+def mark_h5obj_modified(h5obj):
+    """
+    Mark the specified h5py dataset with the current time, so that the
+    unit of the project that contains it is detected as modified by the
+    next backup of the project.
+    """
+    h5obj.attrs[MODIFIED_ATTR] = time.time()
+
+
+def calcul_unit_signature(h5obj, is_cancelled=None, with_data=True):
+    """
+    Return a signature of the attributes and data of the specified h5py
+    group or dataset.
+
+    The data of the datasets are read by slabs, so that large datasets do
+    not need to be loaded in memory at once and the calculation can be
+    cancelled between the slabs. When with_data is False, the data are
+    not read and only the names, shapes and attributes of the objects are
+    used to compute the signature.
+    """
+    hasher = hashlib.sha1()
+    objects = [h5obj]
+    if isinstance(h5obj, h5py.Group):
+        h5obj.visititems(lambda name, obj: objects.append(obj))
+    for obj in objects:
+        hasher.update(obj.name.encode('utf-8'))
+        _update_attrs_signature(hasher, obj.attrs)
+        if not isinstance(obj, h5py.Dataset):
+            continue
+        hasher.update('{}{}'.format(obj.dtype, obj.shape).encode('utf-8'))
+        if not with_data or obj.shape is None or obj.size == 0:
+            continue
+        if obj.ndim == 0:
+            _update_data_signature(hasher, obj[()])
+            continue
+        rowsize = max(obj.size // len(obj) * obj.dtype.itemsize, 1)
+        step = max(SLAB_SIZE // rowsize, 1)
+        for start in range(0, len(obj), step):
+            if is_cancelled is not None and is_cancelled():
+                raise BackupCancelled()
+            _update_data_signature(hasher, obj[start:start + step])
+    return hasher.hexdigest()
+
+
+def _update_attrs_signature(hasher, attrs):
+    for key in sorted(attrs.keys()):
+        hasher.update(key.encode('utf-8'))
+        _update_data_signature(hasher, attrs[key])
+
+
+def _update_data_signature(hasher, value):
+    value = np.asarray(value)
+    if value.dtype.kind in 'OSU':
+        hasher.update(repr(value.tolist()).encode('utf-8'))
+    else:
+        hasher.update(np.ascontiguousarray(value).tobytes())
+
+
+def calcul_project_signatures(h5file, is_cancelled=None, with_data=True):
+    """
+    Return a dict with the signatures of the units of the specified h5py
+    file and of the groups that are split in units.
+
+    When with_data is False, the signatures are only computed from the
+    metadata of the units, which is used as a fingerprint to detect the
+    units that were modified without reading their data.
+    """
+    groups, units = get_project_units(h5file)
+    signatures = {unit: calcul_unit_signature(
+        h5file[unit], is_cancelled, with_data) for unit in units}
+
+    hasher = hashlib.sha1()
+    for group in groups:
+        hasher.update(group.encode('utf-8'))
+        _update_attrs_signature(hasher, h5file[group].attrs)
+    signatures[SKELETON] = hasher.hexdigest()
+    return signatures
+
+
+def backup_project(h5file, is_cancelled=None):
+    """
+    Update the backup of the specified opened h5py project file with the
+    units that were modified since the last backup.
+
+    Return True if the backup was updated successfully or was already up
+    to date and False otherwise.
+    """
+    filename = h5file.filename
+    bak_filename, sig_filename, gen_filenames = get_backup_filenames(filename)
+
+    # Read the signatures and fingerprints of the last backup.
+    try:
+        with open(sig_filename, 'r') as f:
+            last_backup = json.load(f)
+        last_signatures = last_backup['signatures']
+        last_fingerprints = last_backup.get('fingerprints', {})
+        with h5py.File(bak_filename, 'r'):
+            pass
+    except (OSError, ValueError, KeyError):
+        last_signatures = None
+        last_fingerprints = {}
+
+    # Compute the signature of the units whose fingerprint changed since
+    # the last backup only.
+    try:
+        fingerprints = calcul_project_signatures(h5file, with_data=False)
+        signatures = {SKELETON: fingerprints[SKELETON]}
+        for unit, fingerprint in fingerprints.items():
+            if unit == SKELETON:
+                continue
+            if (last_signatures is not None and unit in last_signatures and
+                    last_fingerprints.get(unit) == fingerprint):
+                signatures[unit] = last_signatures[unit]
+            else:
+                signatures[unit] = calcul_unit_signature(
+                    h5file[unit], is_cancelled)
+    except BackupCancelled:
+        print('Backup of the project cancelled.')
+        return False
+    except (KeyError, RuntimeError, ValueError):
+        # The project was modified while computing the signatures.
+        print('Failed to compute the signatures of the project.')
+        return False
+
+    try:
+        if last_signatures is None:
+            print("Creating a backup of the project hdf5 file... ", end='')
+            _create_full_backup(h5file, bak_filename, is_cancelled)
+            for gen_filename in gen_filenames:
+                if osp.exists(gen_filename):
+                    os.remove(gen_filename)
+        else:
+            changed = sorted(
+                unit for unit in signatures if unit != SKELETON and
+                last_signatures.get(unit) != signatures[unit])
+            removed = sorted(
+                unit for unit in last_signatures if
+                unit != SKELETON and unit not in signatures)
+            if (not changed and not removed and
+                    last_signatures.get(SKELETON) == signatures[SKELETON]):
+                print("The backup of the project is up to date.")
+                return True
+
+            print(("Updating the backup of the project hdf5 file with {} "
+                   "modified items... ").format(len(changed) + len(removed)),
+                  end='')
+            with h5py.File(bak_filename, 'a') as bakfile:
+                bak_units = get_project_units(bakfile)[1]
+                added = [unit for unit in changed if unit not in bak_units]
+                replaced = [unit for unit in changed + removed if
+                            unit in bak_units]
+                _create_generation(bakfile, replaced, added, gen_filenames)
+                _update_backup(h5file, bakfile, changed, removed)
+
+        tmp_filename = sig_filename + '.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump({'created': datetime.now().isoformat(),
+                       'signatures': signatures,
+                       'fingerprints': fingerprints}, f)
+        os.replace(tmp_filename, sig_filename)
+    except BackupCancelled:
+        print('cancelled')
+        return False
+    except (OSError, KeyError, RuntimeError, ValueError) as error:
+        print('failed')
+        print(error)
+        if osp.exists(sig_filename):
+            # The backup might be in an inconsistent state, so that it
+            # will need to be created again from scratch.
+            os.remove(sig_filename)
+        return False
+    else:
+        print('done')
+        return True
+
+
+def _copy_h5obj(src_file, path, dst_file):
+    """Copy the object at path from src_file to the same path in dst_file."""
+    parent, name = path.rsplit('/', 1)
+    dst_parent = dst_file.require_group(parent) if parent else dst_file
+    src_file.copy(src_file[path], dst_parent, name=name)
+
+
+def _copy_attrs(src_attrs, dst_attrs):
+    """Replace the attributes of dst_attrs by those of src_attrs."""
+    for key in list(dst_attrs.keys()):
+        del dst_attrs[key]
+    for key, value in src_attrs.items():
+        dst_attrs[key] = value
+
+
+def _create_full_backup(h5file, bak_filename, is_cancelled=None):
+    """
+    Create a complete backup of the specified h5py project file.
+
+    The backup is written to a temporary file that replaces the backup
+    only once all the units were copied. The copy can be cancelled between
+    the units, in which case the temporary file is deleted.
+    """
+    tmp_filename = bak_filename + '.tmp'
+    try:
+        with h5py.File(tmp_filename, 'w') as bakfile:
+            groups, units = get_project_units(h5file)
+            for group in groups:
+                _copy_attrs(h5file[group].attrs,
+                            bakfile.require_group(group).attrs)
+            for unit in units:
+                if is_cancelled is not None and is_cancelled():
+                    raise BackupCancelled()
+                _copy_h5obj(h5file, unit, bakfile)
+    except BackupCancelled:
+        os.remove(tmp_filename)
+        raise
+    os.replace(tmp_filename, bak_filename)
+
+
+def _create_generation(bakfile, replaced, added, gen_filenames):
+    """
+    Save the version of the units and groups of the backup that are about
+    to be replaced, so that the backup can be reverted to its current
+    state later on.
+    """
+    tmp_filename = gen_filenames[0] + '.tmp'
+    with h5py.File(tmp_filename, 'w') as genfile:
+        groups, units = get_project_units(bakfile)
+        for group in groups:
+            _copy_attrs(bakfile[group].attrs,
+                        genfile.require_group(group).attrs)
+        for unit in replaced:
+            _copy_h5obj(bakfile, unit, genfile)
+        genfile.create_dataset(
+            GENERATION_INFO,
+            data=json.dumps(
+                {'groups': groups, 'replaced': replaced, 'added': added}),
+            dtype=h5py.special_dtype(vlen=str))
+
+    # Shift the previous generations, so that only the last
+    # BACKUP_GENERATIONS are kept.
+    if osp.exists(gen_filenames[-1]):
+        os.remove(gen_filenames[-1])
+    for i in reversed(range(len(gen_filenames) - 1)):
+        if osp.exists(gen_filenames[i]):
+            os.replace(gen_filenames[i], gen_filenames[i + 1])
+    os.replace(tmp_filename, gen_filenames[0])
+
+
+def _update_backup(h5file, bakfile, changed, removed):
+    """
+    Update the backup with the units that were changed or removed from the
+    project and with the attributes of the groups of the project.
+    """
+    for unit in changed + removed:
+        if unit in bakfile:
+            del bakfile[unit]
+    for unit in changed:
+        _copy_h5obj(h5file, unit, bakfile)
+
+    groups, units = get_project_units(h5file)
+    for group in groups:
+        _copy_attrs(h5file[group].attrs, bakfile.require_group(group).attrs)
+    for group in sorted(get_project_units(bakfile)[0], reverse=True):
+        if group not in groups and group in bakfile:
+            del bakfile[group]
+
+
+def restore_project_backup(filename, generation=0):
+    """
+    Restore the project file from its backup or from one of the previous
+    generations of its backup.
+
+    Return True if the project was restored successfully and False
+    otherwise.
+    """
+    bak_filename, sig_filename, gen_filenames = get_backup_filenames(filename)
+    tmp_filename = filename + '.restore'
+    print("Restoring project from backup... ", end='')
+    try:
+        copyfile(bak_filename, tmp_filename)
+        with h5py.File(tmp_filename, 'a') as h5file:
+            for gen_filename in gen_filenames[:generation]:
+                with h5py.File(gen_filename, 'r') as genfile:
+                    _revert_generation(h5file, genfile)
+        os.replace(tmp_filename, filename)
+    except (OSError, KeyError, ValueError) as error:
+        print('failed')
+        print(error)
+        if osp.exists(tmp_filename):
+            os.remove(tmp_filename)
+        return False
+    else:
+        print('done')
+        return True
+
+
+def _revert_generation(h5file, genfile):
+    """Revert the h5py project file to the state saved in genfile."""
+    info = json.loads(genfile[GENERATION_INFO][()])
+    groups, replaced, added = info['groups'], info['replaced'], info['added']
+    for unit in added + replaced:
+        if unit in h5file:
+            del h5file[unit]
+    for unit in replaced:
+        _copy_h5obj(genfile, unit, h5file)
+    for group in groups:
+        _copy_attrs(genfile[group].attrs, h5file.require_group(group).attrs)
+    for group in sorted(get_project_units(h5file)[0], reverse=True):
+        if group not in groups and group in h5file:
+            del h5file[group]
@@ -13,7 +13,7 @@ import os
 import os.path as osp
 
 # ---- Third party imports
-import numpy as np
+from xlrd import XLRDError
 from PyQt5.QtCore import Qt, QCoreApplication
 from PyQt5.QtCore import pyqtSignal as QSignal
 from PyQt5.QtWidgets import (
@@ -25,12 +25,12 @@ from gwhat.meteo.weather_viewer import WeatherViewer, ExportWeatherButton
 from gwhat.utils.icons import QToolButtonSmall
 from gwhat.utils import icons
 import gwhat.common.widgets as myqt
-from gwhat.common.utils import calc_dist_from_coord
 from gwhat.projet.reader_waterlvl import WLDataFrame
 from gwhat.projet.reader_projet import (INVALID_CHARS, is_dsetname_valid,
                                         make_dsetname_valid)
 from gwhat.meteo.weather_reader import WXDataFrame
-from gwhat.widgets.buttons import ToolBarWidget
+from gwhat.meteo.evapotranspiration import PET_METHODS
+from gwhat.widgets.buttons import ToolBarWidget, OnOffToolButton
 from gwhat.widgets.spinboxes import StrSpinBox
 
 
@@ -49,6 +49,7 @@ class DataManager(QWidget):
 
         self._wldset = None
         self._wxdset = None
+        self._virtual_wxdset = None
 
         self.setWindowFlags(Qt.Window)
         self.setWindowIcon(icons.get_icon('master'))
@@ -94,12 +95,18 @@ class DataManager(QWidget):
         self.btn_load_wl.setToolTip('Import a new water level dataset...')
         self.btn_load_wl.clicked.connect(self.import_wldataset)
 
+        self.btn_append_wl = QToolButtonSmall(icons.get_icon('merge_data'))
+        self.btn_append_wl.setToolTip(
+            'Append the data of a new file to the current dataset...')
+        self.btn_append_wl.clicked.connect(self.append_to_current_wldset)
+
         self.btn_del_wldset = QToolButtonSmall('delete_data')
         self.btn_del_wldset.setToolTip('Delete current dataset.')
         self.btn_del_wldset.clicked.connect(self.del_current_wldset)
 
         wl_toolbar = ToolBarWidget()
-        for widg in [self.btn_load_wl, self.btn_del_wldset]:
+        for widg in [self.btn_load_wl, self.btn_append_wl,
+                     self.btn_del_wldset]:
             wl_toolbar.addWidget(widg)
 
         # ---- Info Box
@@ -139,6 +146,22 @@ class DataManager(QWidget):
                                      ' from the observation well.</p>')
         btn_closest_meteo.clicked.connect(self.set_closest_wxdset)
 
+        self.btn_virtual_wxdset = OnOffToolButton('staList', size='small')
+        self.btn_virtual_wxdset.setToolTip(
+            "<p>Use the weather data interpolated at the observation well"
+            " from the nearest weather stations instead of the data of the"
+            " selected weather station.</p>")
+        self.btn_virtual_wxdset.sig_value_changed.connect(
+            self.virtual_wxdset_toggled)
+
+        btn_gapfill = QToolButtonSmall(icons.get_icon('fill_all_data'))
+        btn_gapfill.setToolTip(
+            "<p>Fill the missing data of all the weather datasets of the"
+            " project with the data of their best correlated neighbour"
+            " weather datasets.</p>")
+        btn_gapfill.clicked.connect(self.gapfill_wxdsets)
+        self.btn_gapfill_wxdsets = btn_gapfill
+
         btn_weather_normals = QToolButtonSmall(icons.get_icon('meteo'))
         btn_weather_normals.setToolTip(
             "Show the normals for the current weather dataset.")
@@ -147,9 +170,21 @@ class DataManager(QWidget):
         self.btn_export_weather = ExportWeatherButton(workdir=self.workdir)
         self.btn_export_weather.setIconSize(icons.get_iconsize('small'))
 
+        self.pet_method_cbox = QComboBox()
+        self.pet_method_cbox.setToolTip(
+            "Method used to compute the potential evapotranspiration of the "
+            "current dataset.")
+        self.pet_method_cbox.addItem('PET : as imported', '')
+        for method in PET_METHODS:
+            self.pet_method_cbox.addItem(
+                'PET : {}'.format(method.title()), method)
+        self.pet_method_cbox.currentIndexChanged.connect(
+            self.pet_method_changed)
+
         wx_toolbar = ToolBarWidget()
         for widg in [self.btn_load_meteo,
                      self.btn_del_wxdset, btn_closest_meteo,
+                     self.btn_virtual_wxdset, btn_gapfill,
                      btn_weather_normals, self.btn_export_weather]:
             wx_toolbar.addWidget(widg)
 
@@ -165,7 +200,8 @@ class DataManager(QWidget):
 
         layout.addWidget(self.wxdsets_cbox, 1, 0)
         layout.addWidget(self.meteo_info_widget, 2, 0)
-        layout.addWidget(wx_toolbar, 3, 0)
+        layout.addWidget(self.pet_method_cbox, 3, 0)
+        layout.addWidget(wx_toolbar, 4, 0)
 
         return grpbox
 
@@ -187,6 +223,7 @@ class DataManager(QWidget):
         self._projet = projet
         self._wldset = None
         self._wxdset = None
+        self._virtual_wxdset = None
         if projet is not None:
             self.update_wldsets(projet.get_last_opened_wldset())
             self.update_wxdsets(projet.get_last_opened_wxdset())
@@ -289,6 +326,9 @@ class DataManager(QWidget):
         QApplication.processEvents()
         self.update_wldset_info()
         self.wldsetChanged.emit(self.get_current_wldset())
+        if self.use_virtual_wxdset:
+            # The weather data must be interpolated at the new well.
+            self.wxdset_changed()
 
     def get_current_wldset(self):
         """Return the currently selected water level dataset."""
@@ -307,6 +347,49 @@ class DataManager(QWidget):
         self.wldsets_cbox.blockSignals(False)
         self.wldset_changed()
 
+    def append_to_current_wldset(self):
+        """
+        Open a dialog to select a water level datafile and append its data
+        to the currently selected water level dataset.
+        """
+        wldset = self.get_current_wldset()
+        if wldset is None:
+            return
+        if wldset.has_uncommited_changes:
+            self.emit_warning(
+                "Please first commit or cancel the changes made to the "
+                "water level data of the current dataset.")
+            return
+
+        filename, _ = QFileDialog.getOpenFileName(
+            self, 'Select a water level data file', self.workdir,
+            '(*.csv;*.xls;*.xlsx)')
+        for i in range(5):
+            QCoreApplication.processEvents()
+        if not filename:
+            return
+
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            wldf = WLDataFrame(filename)
+            if wldf.data is None:
+                raise ValueError(
+                    "The water level datafile is not formatted correctly.")
+            nnew = wldset.append_data(wldf)
+        except (OSError, ValueError, KeyError, XLRDError) as error:
+            QApplication.restoreOverrideCursor()
+            self.emit_warning(
+                ("Failed to append the data of <i>{}</i> to dataset "
+                 "<i>{}</i>.<br><br>{}").format(
+                     osp.basename(filename), wldset.name, error))
+            return
+        QApplication.restoreOverrideCursor()
+        if nnew:
+            self.wldset_changed()
+        self.sig_new_console_msg.emit((
+            "<font color=black>{} new water level data added to dataset "
+            "<i>{}</i>.</font>").format(nnew, wldset.name))
+
     def del_current_wldset(self):
         """Delete the currently selected water level dataset."""
         if self.wldsets_cbox.count() > 0:
@@ -319,6 +402,7 @@ class DataManager(QWidget):
                 elif reply == QMessageBox.Yes:
                     self._confirm_before_deleting_dset = dont_show_again
             self._wldset = None
+            self._virtual_wxdset = None
             self.projet.del_wldset(dsetname)
             self.update_wldsets()
             self.wldset_changed()
@@ -356,6 +440,7 @@ class DataManager(QWidget):
         """
         print("Saving the new weather dataset in the project.", end=" ")
         self.projet.add_wxdset(name, dataset)
+        self._virtual_wxdset = None
         self.update_wxdsets(name)
         self.wxdset_changed()
         print("done")
@@ -386,9 +471,43 @@ class DataManager(QWidget):
         """Handle when the currently selected weather dataset changed."""
         QApplication.processEvents()
         self.update_wxdset_info()
+        self.update_pet_method()
         self.btn_export_weather.set_model(self.get_current_wxdset())
         self.wxdsetChanged.emit(self.get_current_wxdset())
 
+    def update_pet_method(self):
+        """
+        Update the PET method shown in the GUI from the current weather
+        dataset.
+        """
+        wxdset = self.get_current_wxdset()
+        self.pet_method_cbox.blockSignals(True)
+        self.pet_method_cbox.setEnabled(
+            wxdset is not None and not self.use_virtual_wxdset)
+        if wxdset is not None and not self.use_virtual_wxdset:
+            self.pet_method_cbox.setCurrentIndex(
+                self.pet_method_cbox.findData(wxdset.get_pet_method()))
+        self.pet_method_cbox.blockSignals(False)
+
+    def pet_method_changed(self):
+        """
+        Handle when the PET method of the current weather dataset is
+        changed in the GUI.
+        """
+        wxdset = self.get_current_wxdset()
+        if wxdset is None:
+            return
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        method = self.pet_method_cbox.currentData()
+        wxdset.set_pet_method(method)
+        QApplication.restoreOverrideCursor()
+        self.wxdsetChanged.emit(wxdset)
+        self.sig_new_console_msg.emit((
+            "<font color=black>Potential evapotranspiration of weather "
+            "dataset <i>{}</i> set to {}.</font>").format(
+                wxdset.name,
+                method.title() if method else 'the imported values'))
+
     def del_current_wxdset(self):
         """Delete the currently selected weather dataset."""
         if self.wxdsets_cbox.count() > 0:
@@ -401,6 +520,7 @@ class DataManager(QWidget):
                 elif reply == QMessageBox.Yes:
                     self._confirm_before_deleting_dset = dont_show_again
             self._wxdset = None
+            self._virtual_wxdset = None
             self.projet.del_wxdset(dsetname)
             self.update_wxdsets()
             self.wxdset_changed()
@@ -410,6 +530,8 @@ class DataManager(QWidget):
 
     def get_current_wxdset(self):
         """Return the currently selected weather dataset dataframe."""
+        if self.use_virtual_wxdset:
+            return self.get_virtual_wxdset()
         if self.wxdsets_cbox.currentIndex() == -1:
             self._wxdset = None
         else:
@@ -433,14 +555,81 @@ class DataManager(QWidget):
         if self._wldset is None or self.wxdataset_count() == 0:
             return None
 
-        dist = calc_dist_from_coord(self._wldset['Latitude'],
-                                    self._wldset['Longitude'],
-                                    self.projet.get_wxdsets_lat(),
-                                    self.projet.get_wxdsets_lon())
-        closest_station = self.wxdsets[np.argmin(dist)]
+        names, dists = self.projet.get_closest_wxdsets(
+            self._wldset['Latitude'], self._wldset['Longitude'], k=1)
+        closest_station = names[0]
         self.set_current_wxdset(closest_station)
         return closest_station
 
+    def gapfill_wxdsets(self):
+        """
+        Fill the missing data of all the weather datasets of the project
+        with the data of their best correlated neighbour weather datasets.
+        """
+        if self.wxdataset_count() < 2:
+            self.emit_warning(
+                "At least two weather datasets are required to fill the"
+                " missing data of the weather datasets.")
+            return
+        reply = QMessageBox.question(
+            self, 'Gapfill Weather Data',
+            ("Do you want to fill the missing data of all the weather"
+             " datasets of the project with the data of their best"
+             " correlated neighbour weather datasets?<br><br>"
+             "This cannot be undone."),
+            QMessageBox.Yes | QMessageBox.No)
+        if reply == QMessageBox.No:
+            return
+
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        filled = self.projet.gapfill_wxdsets()
+        QApplication.restoreOverrideCursor()
+        self._wxdset = None
+        self._virtual_wxdset = None
+        self.wxdset_changed()
+        self.sig_new_console_msg.emit((
+            "<font color=black>{} missing weather data filled in {} weather"
+            " datasets.</font>").format(
+                sum(filled.values()),
+                sum(count > 0 for count in filled.values())))
+
+    # ---- Virtual weather dataset
+    @property
+    def use_virtual_wxdset(self):
+        """
+        Return whether the weather data interpolated at the current
+        observation well are used instead of the selected weather dataset.
+        """
+        return self.btn_virtual_wxdset.value()
+
+    def virtual_wxdset_toggled(self, value):
+        """
+        Handle when the use of the weather data interpolated at the current
+        observation well is toggled on or off.
+        """
+        self.wxdsets_cbox.setEnabled(not value)
+        self.btn_del_wxdset.setEnabled(not value)
+        self.wxdset_changed()
+
+    def get_virtual_wxdset(self):
+        """
+        Return the weather dataset interpolated at the current observation
+        well from the data of its nearest weather datasets or None if there
+        is no water level or weather dataset in the project.
+        """
+        wldset = self.get_current_wldset()
+        if wldset is None or self.wxdataset_count() == 0:
+            self._virtual_wxdset = None
+        elif (self._virtual_wxdset is None or
+                self._virtual_wxdset[0] != wldset.name):
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            self._virtual_wxdset = (
+                wldset.name,
+                self.projet.get_virtual_wxdsets([wldset.name])[wldset.name])
+            QApplication.restoreOverrideCursor()
+        return (None if self._virtual_wxdset is None else
+                self._virtual_wxdset[1])
+
     def show_weather_normals(self):
         """Show the weather normals for the current weather dataset."""
         if self.get_current_wxdset() is None:
@@ -13,12 +13,11 @@ from __future__ import division, unicode_literals
 import os
 import os.path as osp
 from datetime import datetime
-from shutil import copyfile
 
 # ---- Third party imports
 
 from PyQt5.QtCore import pyqtSignal as QSignal
-from PyQt5.QtCore import Qt, QPoint
+from PyQt5.QtCore import Qt, QPoint, QObject, QThread
 from PyQt5.QtWidgets import (QWidget, QLabel, QDesktopWidget, QPushButton,
                              QApplication, QGridLayout, QMessageBox, QDialog,
                              QLineEdit, QToolButton, QFileDialog)
@@ -26,6 +25,7 @@ from PyQt5.QtWidgets import (QWidget, QLabel, QDesktopWidget, QPushButton,
 # ---- Local imports
 
 from gwhat.projet.reader_projet import ProjetReader
+from gwhat.projet.backup import restore_project_backup
 from gwhat.utils import icons
 from gwhat.utils.icons import QToolButtonSmall
 from gwhat.projet.manager_data import DataManager
@@ -45,6 +45,16 @@ class ProjetManager(QWidget):
         self.new_projet_dialog.sig_new_project.connect(self.load_project)
 
         self.projet = None
+
+        # Setup the worker and thread that update the backup of the project
+        # in the background.
+        self.backup_worker = BackupWorker()
+        self.backup_thread = QThread()
+        self.backup_worker.moveToThread(self.backup_thread)
+        self.backup_thread.started.connect(self.backup_worker.backup_project)
+        self.backup_worker.sig_backup_finished.connect(
+            self.backup_thread.quit, Qt.DirectConnection)
+
         self.__initGUI__()
         if projet:
             self.load_project(projet)
@@ -141,7 +151,7 @@ class ProjetManager(QWidget):
 
         # If the project is corrupt.
         if self.projet.check_project_file() is True:
-            self.projet.backup_project_file()
+            self.start_project_backup()
         else:
             if osp.exists(filename + '.bak'):
                 msg_box = QMessageBox(
@@ -212,22 +222,45 @@ class ProjetManager(QWidget):
             return False
 
         # Then we try to restore the project from the backup.
-        print("Restoring project from backup... ", end='')
-        try:
-            os.remove(filename)
-            copyfile(filename + '.bak', filename)
-        except (OSError, PermissionError):
-            print('failed')
+        if restore_project_backup(filename):
+            return self.load_project(filename)
+        else:
             msg_box.exec_()
             return False
-        else:
-            print('done')
-            return self.load_project(filename)
+
+    def start_project_backup(self):
+        """
+        Start updating the backup of the current project in the background.
+        """
+        if self.projet is not None and not self.backup_thread.isRunning():
+            # The cancel flag is reset here and not when the backup starts
+            # in the thread, so that a cancel request made right after
+            # the thread is started is not lost.
+            self.backup_worker.reset()
+            self.backup_worker.projet = self.projet
+            self.backup_thread.start()
+
+    def stop_project_backup(self):
+        """
+        Cancel the backup of the current project if it is running and wait
+        for the backup thread to finish.
+        """
+        if self.backup_thread.isRunning():
+            self.backup_worker.cancel()
+            self.backup_thread.quit()
+            self.backup_thread.wait()
+        self.backup_worker.projet = None
+
+    def closeEvent(self, event):
+        """Qt method override to stop the backup of the project."""
+        self.stop_project_backup()
+        super(ProjetManager, self).closeEvent(event)
 
     def close_projet(self):
         """Close the currently opened hdf5 project file."""
+        self.stop_project_backup()
         if self.projet is not None:
-            self.projet.close()
+            self.projet.close(repack=True)
             self.projet = None
 
     def show_newproject_dialog(self):
@@ -236,6 +269,36 @@ class ProjetManager(QWidget):
         self.new_projet_dialog.show()
 
 
+class BackupWorker(QObject):
+    """
+    Worker that updates the backup of a project in a separate thread.
+    """
+    sig_backup_finished = QSignal(bool)
+
+    def __init__(self, parent=None):
+        super(BackupWorker, self).__init__(parent)
+        self.projet = None
+        self._cancelled = False
+
+    def cancel(self):
+        """Cancel the backup that is currently running."""
+        self._cancelled = True
+
+    def reset(self):
+        """Reset the cancel request before starting a new backup."""
+        self._cancelled = False
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def backup_project(self):
+        """Update the backup of the project."""
+        result = False
+        if self.projet is not None:
+            result = self.projet.backup_project_file(self.is_cancelled)
+        self.sig_backup_finished.emit(result)
+
+
 class NewProject(QDialog):
     # Dialog window to create a new WHAT project.
 
@@ -11,7 +11,6 @@ from __future__ import division, unicode_literals
 # ---- Standard library imports
 import os
 import os.path as osp
-from shutil import copyfile
 
 # ---- Third party imports
 import h5py
@@ -21,19 +20,42 @@ import datetime
 
 # ---- Local library imports
 from gwhat.meteo.weather_reader import WXDataFrameBase, METEO_VARIABLES
-from gwhat.projet.reader_waterlvl import WLDataFrameBase, WLDataset
+from gwhat.meteo.evapotranspiration import calcul_pet, PET_METHODS
+from gwhat.meteo.multistation import (
+    create_virtual_wxdsets, gapfill_wxdsets, LAPSE_RATE)
+from gwhat.projet.reader_waterlvl import (
+    WLDataFrameBase, COLUMNS, INDEX, find_waterlvl_measures_file,
+    read_waterlvl_measures, init_waterlvl_measures, load_waterlvl_measures)
 from gwhat.gwrecharge.glue import GLUEDataFrameBase
 from gwhat.common.utils import save_content_to_file
 from gwhat.utils.math import nan_as_text_tolist, calcul_rmse
-from gwhat.utils.dates import xldates_to_datetimeindex, xldates_to_strftimes
+from gwhat.utils.dates import xldates_to_datetime64, datetimeindex_to_xldates
+from gwhat.utils.decimation import MinMaxPyramid
+from gwhat.projet.station_catalog import StationCatalog
+from gwhat.projet.backup import backup_project, mark_h5obj_modified
+from gwhat.projet.storage import (
+    create_h5dataset, del_h5obj, is_repack_needed, rewrite_project_storage)
 
 INVALID_CHARS = ['\\', '/', ':', '*', '?', '"', '<', '>', '|']
 
+# The version of the schema of the project files. This version needs to be
+# increased when the format of the data saved in the project files changes,
+# so that the older project files are migrated once to the new format.
+SCHEMA_VERSION = 3
+
+# The value of the 'format' attribute of the h5py datasets where dates are
+# saved as int64 epoch values in nanoseconds.
+DATETIMES_FORMAT = 'epoch_ns'
+
+# The format of the ISO date strings used to save the dates in the project
+# files before version 0.4.2.
+ISO_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
 
 class ProjetReader(object):
-    def __init__(self, filename):
+    def __init__(self, filename, mode='a'):
         self.__db = None
-        self.load_projet(filename)
+        self.load_projet(filename, mode)
 
     def __del__(self):
         self.close()
@@ -50,21 +72,51 @@ class ProjetReader(object):
     def dirname(self):
         return os.path.dirname(self.filename)
 
-    def load_projet(self, filename):
-        """Open the hdf5 project file."""
+    @property
+    def readonly(self):
+        """Return whether the project file is opened in read-only mode."""
+        return is_h5obj_readonly(self.db)
+
+    def load_projet(self, filename, mode='a'):
+        """
+        Open the hdf5 project file in append mode or in read-only mode
+        if mode is 'r'.
+
+        The project file is migrated to the current schema version the
+        first time it is opened in append mode. Nothing is written to the
+        project file when it is opened after that, so that project files
+        at the current schema version can be opened in read-only mode.
+        """
         self.close()
+        self._wxcatalog = None
         print("Loading project from '{}'... ".format(osp.basename(filename)),
               end='')
         try:
-            if not osp.exists(osp.dirname(filename)):
+            if mode != 'r' and not osp.exists(osp.dirname(filename)):
                 os.makedirs(osp.dirname(filename))
-            self.__db = h5py.File(filename, mode='a')
+            self.__db = h5py.File(filename, mode=mode)
             print('done')
         except Exception:
             self.__db = None
             print('failed')
             raise ValueError('Project file is not valid!')
 
+        if self.db.attrs.get('schema_version', 0) < SCHEMA_VERSION:
+            if self.readonly:
+                self.close()
+                raise ValueError(
+                    "The project file needs to be migrated to the current "
+                    "schema version, which can't be done in read-only mode.")
+            self._migrate_project()
+
+    def _migrate_project(self):
+        """
+        Migrate the project file to the current schema version and save
+        this version in the project file.
+        """
+        print("Migrating project to schema version {}...".format(
+            SCHEMA_VERSION))
+
         # For newly created project and backward compatibility.
         for key in ['name', 'author', 'created', 'modified', 'version']:
             if key not in list(self.db.attrs.keys()):
@@ -81,8 +133,33 @@ class ProjetReader(object):
                 # Added in version 0.4.0 (see PR #267)
                 self.db[key].attrs['last_opened'] = 'None'
 
-    def close(self):
-        """Close the project hdf5 file."""
+        for name in self.wldsets:
+            migrate_wldset_h5grp(self.db['wldsets'][name])
+        for name in self.wxdsets:
+            migrate_wxdset_h5grp(self.db['wxdsets'][name])
+
+        if 'wlmeas' not in self.db:
+            # Added in version 0.4.2.
+            self._save_wlmeas_index([], [], [])
+        # Added in version 0.4.2.
+        self.get_wxdsets_catalog()
+
+        self.db.attrs['schema_version'] = SCHEMA_VERSION
+        self.db.flush()
+
+    def close(self, repack=False):
+        """
+        Close the project hdf5 file.
+
+        If repack is True, the project is repacked before it is closed if
+        the space that is not used anymore in the project file is too large.
+        """
+        if (repack and self.db is not None and not self.readonly and
+                is_repack_needed(self.db)):
+            try:
+                self.repack()
+            except (OSError, KeyError, ValueError, TypeError) as error:
+                print(error)
         try:
             self.db.close()
             self.__db = None
@@ -90,6 +167,26 @@ class ProjetReader(object):
             # projet is None or already closed.
             pass
 
+    def repack(self):
+        """
+        Copy the objects of the project that are still in use in a new
+        project file with the current storage policy and replace the
+        project file with it.
+
+        The space used by the objects that are deleted from the project,
+        for example the GLUE or BRF results, is never reclaimed otherwise.
+        Return the size in bytes of the space that was reclaimed.
+        """
+        filename = self.filename
+        self.close()
+        try:
+            size_before, size_after = rewrite_project_storage(filename)
+        finally:
+            self.load_projet(filename)
+        print('{:0.1f} MB reclaimed in the project hdf5 file.'.format(
+            (size_before - size_after) / 1024**2))
+        return size_before - size_after
+
     def check_project_file(self):
         """Check to ensure that the project hdf5 file is not corrupt."""
         item_names = []
@@ -100,31 +197,18 @@ class ProjetReader(object):
         else:
             return True
 
-    def backup_project_file(self):
-        """Copy the project hdf5 file in a file with a .bak extension."""
-        if self.db is not None:
-            filename = self.filename
-            self.db.close()
-            print("Creating a backup of the project hdf5 file... ", end='')
-            try:
-                copyfile(filename, filename + '.bak')
-            except (OSError, PermissionError):
-                print('failed')
-                return False
-            else:
-                print('done')
-                return True
-            finally:
-                self.load_projet(filename)
+    def backup_project_file(self, is_cancelled=None):
+        """
+        Update the backup of the project hdf5 file, which is saved in a
+        file with a .bak extension, with the parts of the project that were
+        modified since the last backup.
 
-        try:
-            copyfile(self.filename, bak_filename)
-        except (OSError, PermissionError):
-            print('failed')
+        The project file remains opened during the backup, so that this can
+        be done in a background thread while the project is being used.
+        """
+        if self.db is None:
             return False
-        else:
-            print('done')
-            return True
+        return backup_project(self.db, is_cancelled)
 
     # ---- Project Properties
     @property
@@ -206,7 +290,8 @@ class ProjetReader(object):
         """
         print("Getting wldset {}...".format(name), end=' ')
         if name in self.wldsets:
-            self.db['wldsets'].attrs['last_opened'] = name
+            if not self.readonly:
+                self.db['wldsets'].attrs['last_opened'] = name
             print('done')
             return WLDataFrameHDF5(self.db['wldsets/%s' % name])
         else:
@@ -227,16 +312,10 @@ class ProjetReader(object):
             grp = self.db['wldsets'].create_group(name)
 
             # Water level data
-            grp.create_dataset(
-                'Time',
-                data=np.array(df['Time'], dtype=h5py.special_dtype(vlen=str)))
-            # See http://docs.h5py.org/en/latest/strings.html as to why this
-            # is necessary to do this in order to save a list of strings in
-            # a dataset with h5py.
-
-            grp.create_dataset('WL', data=np.copy(df['WL']))
-            grp.create_dataset('BP', data=np.copy(df['BP']))
-            grp.create_dataset('ET', data=np.copy(df['ET']))
+            save_datetimes_to_h5grp(grp, 'Time', df.dates)
+            for colname in ['WL', 'BP', 'ET']:
+                create_h5dataset(grp, colname, np.copy(df[colname]),
+                                 maxshape=(None,))
 
             # Piezometric well info
             grp.attrs['filename'] = df['filename']
@@ -251,13 +330,13 @@ class ProjetReader(object):
             # Master Recession Curve
             mrc = grp.create_group('mrc')
             mrc.attrs['exists'] = 0
-            mrc.create_dataset('params', data=(0, 0), dtype='float64')
-            mrc.create_dataset('peak_indx', data=np.array([]),
-                               dtype='int16', maxshape=(None,))
-            mrc.create_dataset('recess', data=np.array([]),
-                               dtype='float64', maxshape=(None,))
-            mrc.create_dataset('time', data=np.array([]),
-                               dtype='float64', maxshape=(None,))
+            create_h5dataset(mrc, 'params', (0, 0), dtype='float64')
+            create_h5dataset(mrc, 'peak_indx', np.array([]),
+                             dtype='int16', maxshape=(None,))
+            create_h5dataset(mrc, 'recess', np.array([]),
+                             dtype='float64', maxshape=(None,))
+            create_h5dataset(mrc, 'time', np.array([]),
+                             dtype='float64', maxshape=(None,))
 
             # Barometric Response Function
             grp.create_group('brf')
@@ -271,23 +350,136 @@ class ProjetReader(object):
 
             # Manual water level measurements
             mmeas = grp.create_group('manual')
-            mmeas.create_dataset('Time', data=np.array([]), maxshape=(None,))
-            mmeas.create_dataset('WL', data=np.array([]), maxshape=(None,))
+            create_h5dataset(mmeas, 'Time', np.array([]), maxshape=(None,))
+            create_h5dataset(mmeas, 'WL', np.array([]), maxshape=(None,))
 
             self.db.flush()
 
             print('New dataset created sucessfully')
         except Exception:
             print('Unable to save dataset to project db')
-            del self.db['wldsets'][name]
+            del_h5obj(self.db['wldsets'], name)
 
         return WLDataFrameHDF5(grp)
 
     def del_wldset(self, name):
         """Delete the specified water level dataset."""
-        del self.db['wldsets/%s' % name]
+        del_h5obj(self.db, 'wldsets/%s' % name)
+        self._clear_virtual_wxdsets([name])
+        self.db.flush()
+
+    # ---- Manual water level measurements
+    def get_wlmeas(self, filename, well):
+        """
+        Return the manual water level measurements of the specified well
+        that are saved in the specified manual measurements file.
+
+        The measurements of the file are indexed by well in the project, so
+        that only the measurements of the specified well need to be read.
+        """
+        if self.readonly:
+            # The index can't be updated in read-only mode, so that the
+            # measurements are read directly from the file instead.
+            return load_waterlvl_measures(filename, well)
+        print('Loading manual water level measures for well %s...' % well,
+              end=" ")
+        self.update_wlmeas_index(filename)
+        grp = self.db['wlmeas']
+        wells = load_strings_from_h5dset(grp['wells'])
+        i = np.searchsorted(wells, well)
+        if i == len(wells) or wells[i] != well:
+            print("none")
+            return np.array([]), np.array([])
+        start, end = grp['offsets'][i:i + 2]
+        print("done")
+        return grp['Time'][start:end], grp['WL'][start:end]
+
+    def update_wlmeas_index(self, filename):
+        """
+        Update the index of the manual water level measurements saved in
+        the project from the specified manual measurements file.
+
+        The index is updated only if the file changed since the last update.
+        When lines were only added at the end of a csv file, only these
+        new lines are read and merged into the index.
+        """
+        fname = find_waterlvl_measures_file(filename)
+        if fname is None:
+            # The file does not exists, so we generate an empty file with
+            # a header.
+            init_waterlvl_measures(osp.dirname(filename))
+            fname = find_waterlvl_measures_file(filename)
+        fstat = os.stat(fname)
+
+        grp = self.db['wlmeas']
+        if (grp.attrs['filename'] == osp.basename(fname) and
+                grp.attrs['mtime'] == fstat.st_mtime and
+                grp.attrs['size'] == fstat.st_size):
+            return
+
+        # Check whether the data that were indexed previously are
+        # unchanged, in which case only the new lines need to be read.
+        offset = 0
+        if (grp.attrs['filename'] == osp.basename(fname) and
+                fname.endswith('.csv') and
+                fstat.st_size > grp.attrs['nbytes'] > 0):
+            tail = grp.attrs['tail'].tobytes()
+            with open(fname, 'rb') as f:
+                f.seek(grp.attrs['nbytes'] - len(tail))
+                if f.read(len(tail)) == tail and tail.endswith(b'\n'):
+                    offset = grp.attrs['nbytes']
+
+        well_name, time, wl, nbytes = read_waterlvl_measures(fname, offset)
+        if offset > 0:
+            offsets = grp['offsets'][...]
+            well_name = np.hstack([
+                np.repeat(load_strings_from_h5dset(grp['wells']),
+                          np.diff(offsets)),
+                well_name])
+            time = np.hstack([grp['Time'][...], time])
+            wl = np.hstack([grp['WL'][...], wl])
+        self._save_wlmeas_index(well_name, time, wl)
+
+        grp = self.db['wlmeas']
+        grp.attrs['filename'] = osp.basename(fname)
+        grp.attrs['mtime'] = fstat.st_mtime
+        grp.attrs['size'] = fstat.st_size
+        grp.attrs['nbytes'] = nbytes
+        with open(fname, 'rb') as f:
+            f.seek(max(nbytes - 256, 0))
+            grp.attrs['tail'] = np.frombuffer(
+                f.read(min(nbytes, 256)), dtype='uint8')
         self.db.flush()
 
+    def _save_wlmeas_index(self, well_name, time, wl):
+        """
+        Save the manual water level measurements in the project, sorted by
+        well and time, along with the offsets of the measurements of
+        each well.
+        """
+        well_name = np.array(well_name).astype('str')
+        time = np.array(time).astype('float')
+        wl = np.array(wl).astype('float')
+
+        indexes = np.lexsort((time, well_name))
+        well_name, time, wl = well_name[indexes], time[indexes], wl[indexes]
+        wells, offsets = np.unique(well_name, return_index=True)
+        offsets = np.hstack([offsets, len(well_name)]).astype('int64')
+
+        if 'wlmeas' in self.db:
+            del_h5obj(self.db, 'wlmeas')
+        grp = self.db.create_group('wlmeas')
+        create_h5dataset(grp, 'wells', wells.astype(object),
+                         dtype=h5py.special_dtype(vlen=str))
+        create_h5dataset(grp, 'offsets', offsets)
+        create_h5dataset(grp, 'Time', time)
+        create_h5dataset(grp, 'WL', wl)
+        grp.attrs['filename'] = ''
+        grp.attrs['mtime'] = 0
+        grp.attrs['size'] = 0
+        grp.attrs['nbytes'] = 0
+        grp.attrs['tail'] = np.array([], dtype='uint8')
+
     # ---- Weather Dataset Handlers
     @property
     def wxdsets(self):
@@ -301,15 +493,83 @@ class ProjetReader(object):
         """
         Return a list with the latitude coordinates of the weather datasets.
         """
-        return [self.db['wxdsets/%s' % name].attrs['Latitude'] for
-                name in self.wxdsets]
+        catalog = self.get_wxdsets_catalog()
+        indexes = {name: i for i, name in enumerate(catalog.names)}
+        return [catalog.latitudes[indexes[name]] for name in self.wxdsets]
 
     def get_wxdsets_lon(self):
         """
         Return a list with the longitude coordinates of the weather datasets.
         """
-        return [self.db['wxdsets/%s' % name].attrs['Longitude'] for
-                name in self.wxdsets]
+        catalog = self.get_wxdsets_catalog()
+        indexes = {name: i for i, name in enumerate(catalog.names)}
+        return [catalog.longitudes[indexes[name]] for name in self.wxdsets]
+
+    def get_wxdsets_catalog(self):
+        """
+        Return the catalog with the location of the stations of the weather
+        datasets that is used to answer spatial queries.
+
+        The location of the stations are saved in the project, so that the
+        attributes of every weather dataset do not need to be read each time
+        the project is opened.
+        """
+        if self._wxcatalog is None:
+            if ('wxcatalog' not in self.db or
+                    set(self._read_wxdsets_catalog()[0]) !=
+                    set(self.wxdsets)):
+                # Added in version 0.4.2.
+                names = self.wxdsets
+                lats = [self.db['wxdsets'][name].attrs['Latitude'] for
+                        name in names]
+                lons = [self.db['wxdsets'][name].attrs['Longitude'] for
+                        name in names]
+                if self.readonly:
+                    return StationCatalog(names, lats, lons)
+                self._save_wxdsets_catalog(names, lats, lons)
+            self._wxcatalog = StationCatalog(*self._read_wxdsets_catalog())
+        return self._wxcatalog
+
+    def _read_wxdsets_catalog(self):
+        """
+        Return the names and location of the stations of the weather
+        datasets that are saved in the catalog of the project.
+        """
+        grp = self.db['wxcatalog']
+        return (load_strings_from_h5dset(grp['name']).tolist(),
+                grp['latitude'][...], grp['longitude'][...])
+
+    def _save_wxdsets_catalog(self, names, latitudes, longitudes):
+        """
+        Save the names and location of the stations of the weather datasets
+        in the catalog of the project.
+        """
+        if 'wxcatalog' in self.db:
+            del_h5obj(self.db, 'wxcatalog')
+        grp = self.db.create_group('wxcatalog')
+        create_h5dataset(
+            grp, 'name', np.array(names, dtype=object),
+            dtype=h5py.special_dtype(vlen=str), maxshape=(None,))
+        for key, values in [('latitude', latitudes),
+                            ('longitude', longitudes)]:
+            create_h5dataset(grp, key, np.array(values, dtype='float64'),
+                             maxshape=(None,))
+        self._wxcatalog = None
+
+    def get_closest_wxdsets(self, latitude, longitude, k=1):
+        """
+        Return the names of the k weather datasets whose station is closest
+        to the specified location and their distances in km.
+        """
+        return self.get_wxdsets_catalog().nearest(latitude, longitude, k)
+
+    def get_wxdsets_within(self, latitude, longitude, radius):
+        """
+        Return the names of the weather datasets whose station is located
+        within the specified radius in km of the specified location and
+        their distances in km.
+        """
+        return self.get_wxdsets_catalog().within(latitude, longitude, radius)
 
     def get_last_opened_wxdset(self):
         """
@@ -326,7 +586,8 @@ class ProjetReader(object):
         print("Getting wxdset {}...".format(name), end=' ')
         if name in self.wxdsets:
             print('done')
-            self.db['wxdsets'].attrs['last_opened'] = name
+            if not self.readonly:
+                self.db['wxdsets'].attrs['last_opened'] = name
             return WXDataFrameHDF5(self.db['wxdsets/%s' % name])
         else:
             print('failed')
@@ -342,41 +603,132 @@ class ProjetReader(object):
         if not is_dsetname_valid(name):
             raise ValueError("The name of the dataset is not valid.")
         grp = self.db['wxdsets'].create_group(name)
-
-        # Save the metadata.
-        for key, value in wxdset.metadata.items():
-            grp.attrs[key] = value
-
-        # Save time.
-        strtimes = np.array(
-            wxdset.strftime(), dtype=h5py.special_dtype(vlen=str))
-        grp.create_dataset('Time', data=strtimes)
-        # See http://docs.h5py.org/en/latest/strings.html as to why this
-        # is necessary to do this in order to save a list of strings in
-        # a dataset with h5py.
-
-        # Save timeseries data
-        for variable in METEO_VARIABLES:
-            grp.create_dataset(
-                variable, data=np.copy(wxdset.data[variable].values))
-
-        # Save times where data was missing.
-        for variable in METEO_VARIABLES:
-            datetimeindex = wxdset.missing_value_indexes[variable]
-            strtimes = np.array(
-                datetimeindex.strftime("%Y-%m-%dT%H:%M:%S").values.tolist(),
-                dtype=h5py.special_dtype(vlen=str)
-                )
-            grp.create_dataset(
-                'Missing {}'.format(variable), data=strtimes)
+        save_wxdset_to_h5grp(grp, wxdset)
+
+        # Add the station to the catalog.
+        if 'wxcatalog' in self.db:
+            catalog = self.db['wxcatalog']
+            size = len(catalog['name'])
+            for key, value in [('name', name),
+                               ('latitude', grp.attrs['Latitude']),
+                               ('longitude', grp.attrs['Longitude'])]:
+                catalog[key].resize((size + 1,))
+                catalog[key][size] = value
+                mark_h5obj_modified(catalog[key])
+        self._wxcatalog = None
+        self._clear_virtual_wxdsets()
 
         print('Dataset {} created sucessfully.'.format(name))
         self.db.flush()
 
     def del_wxdset(self, name):
         """Delete the specified weather dataset."""
-        del self.db['wxdsets/%s' % name]
+        del_h5obj(self.db, 'wxdsets/%s' % name)
+
+        # Remove the station from the catalog.
+        if 'wxcatalog' in self.db:
+            names, lats, lons = self._read_wxdsets_catalog()
+            keep = np.array(names, dtype=object) != name
+            self._save_wxdsets_catalog(
+                np.array(names, dtype=object)[keep], lats[keep], lons[keep])
+        self._wxcatalog = None
+        self._clear_virtual_wxdsets()
+        self.db.flush()
+
+    def gapfill_wxdsets(self, k=3):
+        """
+        Fill the missing data of the weather datasets of the project with
+        the data of their k best correlated neighbour weather datasets.
+
+        Return a dict with the number of values that were gapfilled for
+        each weather dataset.
+        """
+        if len(self.wxdsets) < 2:
+            return {}
+        print("Gapfilling the weather datasets...", end=' ')
+        wxdsets = [WXDataFrameHDF5(self.db['wxdsets/%s' % name]) for
+                   name in self.wxdsets]
+        filled = gapfill_wxdsets(wxdsets, k)
+        for wxdset, station_filled in zip(wxdsets, filled):
+            wxdset.save_gapfilled_data(station_filled)
+        self._clear_virtual_wxdsets()
         self.db.flush()
+        print('done')
+        return {wxdset.name: sum(len(days) for var, days in
+                                 station_filled.items() if var != 'PET')
+                for wxdset, station_filled in zip(wxdsets, filled)}
+
+    # ---- Virtual weather datasets
+    def get_virtual_wxdsets(self, names=None, k=3, power=2,
+                            lapse_rate=LAPSE_RATE):
+        """
+        Return a dict with the virtual weather datasets interpolated at the
+        location of the specified water level datasets from the data of
+        their k nearest weather datasets.
+
+        The virtual weather datasets are saved in the project, so that
+        they are computed only for the water level datasets that have no
+        virtual weather dataset yet or that was interpolated with different
+        parameters. They are computed for all these wells at once.
+        """
+        names = self.wldsets if names is None else list(names)
+        if 'virtual_wxdsets' not in self.db and not self.readonly:
+            # Added in version 0.4.2.
+            self.db.create_group('virtual_wxdsets')
+        vgrp = self.db.get('virtual_wxdsets', {})
+        virtual = {}
+
+        params = {'idw_k': k, 'idw_power': power, 'lapse_rate': lapse_rate}
+        outdated = [
+            name for name in names if name not in vgrp or
+            any(vgrp[name].attrs[key] != value for
+                key, value in params.items())]
+        if outdated and len(self.wxdsets):
+            print("Interpolating weather data for {} wells...".format(
+                len(outdated)), end=' ')
+            sites = []
+            stations = set()
+            for name in outdated:
+                attrs = self.db['wldsets/%s' % name].attrs
+                sites.append({key: attrs[key] for key in
+                              ['Latitude', 'Longitude', 'Elevation']})
+                sites[-1]['Name'] = name
+                stations.update(self.get_closest_wxdsets(
+                    attrs['Latitude'], attrs['Longitude'], k)[0])
+            stations = sorted(stations)
+            virtual_wxdsets = create_virtual_wxdsets(
+                [WXDataFrameHDF5(self.db['wxdsets/%s' % station]) for
+                 station in stations], sites, k, power, lapse_rate)
+            if self.readonly:
+                # The virtual weather datasets can't be saved in the
+                # project in read-only mode.
+                virtual = dict(zip(outdated, virtual_wxdsets))
+            else:
+                for name, virtual_wxdset in zip(outdated, virtual_wxdsets):
+                    if name in vgrp:
+                        del_h5obj(vgrp, name)
+                    grp = vgrp.create_group(name)
+                    save_wxdset_to_h5grp(grp, virtual_wxdset)
+                    grp.attrs.update(params)
+                self.db.flush()
+            print('done')
+        return {name: virtual[name] if name in virtual else
+                WXDataFrameHDF5(vgrp[name]) for
+                name in names if name in virtual or name in vgrp}
+
+    def _clear_virtual_wxdsets(self, names=None):
+        """
+        Delete the virtual weather datasets of the specified water level
+        datasets or all of them if names is None.
+        """
+        if 'virtual_wxdsets' not in self.db:
+            return
+        if names is None:
+            del_h5obj(self.db, 'virtual_wxdsets')
+        else:
+            for name in names:
+                if name in self.db['virtual_wxdsets']:
+                    del_h5obj(self.db['virtual_wxdsets'], name)
 
 
 class WLDataFrameHDF5(WLDataFrameBase):
@@ -395,45 +747,72 @@ class WLDataFrameHDF5(WLDataFrameBase):
         self.dset = hdf5group
         self._undo_stack = []
 
-        columns = []
-        data = []
-        for colname in ['Time', 'WL', 'BP', 'ET']:
-            if len(self.dset[colname][...]):
-                data.append(self.dset[colname][...])
-                columns.append(colname)
-        data = np.vstack(tuple(data)).transpose()
-        columns = tuple(columns)
-        self._dataf = WLDataset(data, columns)
-
-        # Make older datasets compatible with newer format.
-        if isinstance(self.dset['Time'][0], (int, float)):
-            # Time needs to be converted from Excel numeric dates
-            # to ISO date strings (see PR #276).
-            print('Saving time as ISO date strings instead of Excel dates...',
-                  end=' ')
-            del self.dset['Time']
-            self.dset.create_dataset(
-                'Time',
-                data=np.array(self.strftime,
-                              dtype=h5py.special_dtype(vlen=str)))
-            self.dset.file.flush()
-            print('done')
-        if 'Well ID' not in list(self.dset.attrs.keys()):
-            # Added in version 0.2.1 (see PR #124).
-            self.dset.attrs['Well ID'] = ""
-            self.dset.file.flush()
-        if 'Province' not in list(self.dset.attrs.keys()):
-            # Added in version 0.2.1 (see PR #124).
-            self.dset.attrs['Province'] = ""
-            self.dset.file.flush()
-        if 'glue' not in list(self.dset.keys()):
-            # Added in version 0.3.1 (see PR #184)
-            self.dset.create_group('glue')
-            self.dset.file.flush()
+        # The data are read from the project only when they are needed.
+        self._dataf = None
+
+    @property
+    def data(self):
+        if self._dataf is None:
+            self._dataf = self._read_data()
+        return self._dataf
+
+    def _read_data(self, istart=0, iend=None):
+        """
+        Read the data saved in the project between the specified start and
+        end indexes and cast them into a pandas dataframe. The time is read
+        directly as datetime64 values, so that no parsing is required.
+        """
+        size = len(self.dset[INDEX])
+        iend = size if iend is None else iend
+        datetimes = pd.DatetimeIndex(
+            self.dset[INDEX][istart:iend].view('datetime64[ns]'), name=INDEX)
+
+        columns = [colname for colname in COLUMNS if colname != INDEX]
+        data = {}
+        for colname in columns:
+            if len(self.dset[colname]) == size:
+                data[colname] = self.dset[colname][istart:iend]
+            else:
+                # No data were saved in the project for that column.
+                data[colname] = np.full(len(datetimes), np.nan)
+        return pd.DataFrame(data, index=datetimes, columns=columns)
+
+    def get_xldate_bounds(self):
+        """
+        Return the Excel numeric dates of the first and last samples of
+        the dataset, reading only these two samples from the project.
+        """
+        if self.has_uncommited_changes:
+            return super().get_xldate_bounds()
+        size = len(self.dset[INDEX])
+        xldates = datetimeindex_to_xldates(pd.DatetimeIndex(np.array(
+            [self.dset[INDEX][0], self.dset[INDEX][size - 1]]
+            ).view('datetime64[ns]')))
+        return xldates[0], xldates[-1]
+
+    def get_data_window(self, tmin, tmax):
+        """
+        Return a dataframe with the data of the dataset that are comprised
+        between the specified start and end Excel numeric dates.
+
+        Only the data within the window are read from the project, using
+        a binary search on the time index to find the window bounds.
+        """
+        if self.has_uncommited_changes:
+            return super().get_data_window(tmin, tmax)
+        tmin, tmax = xldates_to_datetime64([tmin, tmax]).view('int64')
+        istart = searchsorted_h5dset(self.dset[INDEX], tmin, side='left')
+        iend = searchsorted_h5dset(self.dset[INDEX], tmax, side='right')
+        data = self._read_data(istart, iend)
+        if self.has_corrected_waterlevels():
+            data['WLc'] = self.dset['WLc'][istart:iend]
+        return data
 
     def __getitem__(self, key):
         if key in list(self.dset.attrs.keys()):
             return self.dset.attrs[key]
+        elif key == INDEX:
+            return self.strftime
         else:
             return self.dset[key][...]
 
@@ -449,11 +828,230 @@ class WLDataFrameHDF5(WLDataFrameBase):
     def commit(self):
         """Commit the changes made to the water level data to the project."""
         if self.has_uncommited_changes:
-            self.dset['WL'][:] = np.copy(self.waterlevels)
+            # Only the runs of data that were changed are written to
+            # the project.
+            waterlevels = self.waterlevels
+            for start, length in zip(*self._get_changed_runs()):
+                self.dset['WL'][start:start + length] = (
+                    waterlevels[start:start + length])
+                if 'WLc' in self.dset:
+                    # The corrected water levels of deleted data must be
+                    # deleted too.
+                    wlc = self.dset['WLc'][start:start + length]
+                    wlc[np.isnan(waterlevels[start:start + length])] = np.nan
+                    self.dset['WLc'][start:start + length] = wlc
+            for name in ['WL', 'WLc']:
+                if name in self.dset:
+                    mark_h5obj_modified(self.dset[name])
+            if 'lod' in self.dset:
+                # The level of detail pyramid needs to be rebuilt.
+                del_h5obj(self.dset, 'lod')
+            self._lod_pyramid = None
+            self._lod_pyramid_wlc = None
             self.dset.file.flush()
             self._undo_stack = []
             print('Changes commited successfully.')
 
+    def append_data(self, wldf):
+        """
+        Append the data of the water level dataset wldf, typically loaded
+        from a new logger download, to the data saved in the project.
+
+        Samples of wldf whose time is already in the project are ignored,
+        so that the values saved in the project are preserved. When all the
+        new samples are later than the last sample saved in the project,
+        only the new tail is written to the project. Otherwise, the data are
+        rewritten from the first inserted sample only.
+
+        Return the number of samples that were added to the project.
+        """
+        if self.has_uncommited_changes:
+            print("Cannot append data to the dataset because there are "
+                  "uncommited changes.")
+            return 0
+
+        # Sort the new data and drop the duplicated times.
+        columns = [colname for colname in COLUMNS if colname != INDEX]
+        newdata = wldf.data[columns]
+        newdata = newdata[~newdata.index.duplicated(keep='first')]
+        newdata = newdata.sort_index()
+        newtimes = newdata.index.values.astype('datetime64[ns]').view('int64')
+        if not len(newtimes):
+            return 0
+
+        # Drop the new samples whose time is already in the project. Only
+        # the times saved in the project that overlap the new data are read.
+        self._require_resizable_h5dsets()
+        time_dset = self.dset[INDEX]
+        size = len(time_dset)
+        istart = searchsorted_h5dset(time_dset, newtimes[0], side='left')
+        iend = searchsorted_h5dset(time_dset, newtimes[-1], side='right')
+        isnew = ~np.isin(newtimes, time_dset[istart:iend])
+        newtimes = newtimes[isnew]
+        newdata = newdata[isnew]
+        nnew = len(newtimes)
+        if nnew == 0:
+            print('No new data to append to the dataset.')
+            return 0
+
+        print('Appending {} new samples to the dataset...'.format(nnew),
+              end=' ')
+        # All data saved in the project before that index are left untouched.
+        ifirst = searchsorted_h5dset(time_dset, newtimes[0], side='left')
+        oldtimes = time_dset[ifirst:size]
+        mergedtimes = np.hstack([oldtimes, newtimes])
+        indexes = np.argsort(mergedtimes, kind='mergesort')
+        # The new positions in the dataset of the old and new samples.
+        positions = np.empty(len(indexes), dtype='int64')
+        positions[indexes] = np.arange(len(indexes)) + ifirst
+        oldpos = positions[:len(oldtimes)]
+        newpos = positions[len(oldtimes):]
+
+        # The master recession curve results are aligned with the water
+        # level data, so they need to be remapped to the new data. This is
+        # done before anything is written, so that the dataset is not left
+        # partially updated if this fails.
+        mrc_values = {}
+        if self.mrc_exists():
+            peak_indx = self.dset['mrc/peak_indx'][...].astype('int64')
+            mask = peak_indx >= ifirst
+            peak_indx[mask] = oldpos[peak_indx[mask] - ifirst]
+            mrc_values['peak_indx'] = peak_indx
+
+            for name in ['recess', 'time']:
+                values = self.dset['mrc/' + name][...]
+                if len(values) != size:
+                    continue
+                newvalues = np.full(len(oldpos) + nnew, np.nan)
+                newvalues[oldpos - ifirst] = values[ifirst:]
+                if name == 'time':
+                    newvalues[newpos - ifirst] = datetimeindex_to_xldates(
+                        pd.DatetimeIndex(newtimes.view('datetime64[ns]')))
+                mrc_values[name] = newvalues
+
+        for name in [INDEX] + columns:
+            if name == INDEX:
+                values = mergedtimes[indexes]
+            else:
+                values = np.hstack([self.dset[name][ifirst:size],
+                                    newdata[name].values])[indexes]
+            self.dset[name].resize((size + nnew,))
+            self.dset[name][ifirst:] = values
+            mark_h5obj_modified(self.dset[name])
+
+        if 'peak_indx' in mrc_values:
+            del_h5obj(self.dset, 'mrc/peak_indx')
+            create_h5dataset(self.dset['mrc'], 'peak_indx',
+                             mrc_values.pop('peak_indx'),
+                             dtype='int64', maxshape=(None,))
+        for name, newvalues in mrc_values.items():
+            self.dset['mrc/' + name].resize((size + nnew,))
+            self.dset['mrc/' + name][ifirst:] = newvalues
+            mark_h5obj_modified(self.dset['mrc/' + name])
+
+        if 'lod' in self.dset:
+            # The level of detail pyramid needs to be rebuilt.
+            del_h5obj(self.dset, 'lod')
+        if 'WLc' in self.dset:
+            # The corrected water levels need to be computed again.
+            del_h5obj(self.dset, 'WLc')
+        self._lod_pyramid = None
+        self._lod_pyramid_wlc = None
+        self._regular_data = {}
+        self._dataf = None
+        self.dset.file.flush()
+        print('done')
+        return nnew
+
+    def _require_resizable_h5dsets(self):
+        """
+        Make sure the time and data of the dataset are saved in resizable
+        h5py datasets, so that new data can be appended to them.
+        """
+        size = len(self.dset[INDEX])
+        for name in COLUMNS:
+            if self.dset[name].maxshape == (None,):
+                continue
+            # Changed in version 0.4.2.
+            values = self.dset[name][...]
+            if len(values) != size:
+                # No data were saved in the project for that column.
+                values = np.full(size, np.nan)
+            del_h5obj(self.dset, name)
+            create_h5dataset(self.dset, name, values, maxshape=(None,))
+
+    # ---- Corrected water levels
+    def save_corrected_waterlevels(self, wlc):
+        """
+        Save the water levels corrected for the barometric pressure and
+        earth tides effects in the project.
+        """
+        if len(wlc) != len(self.dset[INDEX]):
+            raise ValueError("The size of the corrected water levels must "
+                             "be the same as that of the dataset.")
+        if 'WLc' in self.dset:
+            del_h5obj(self.dset, 'WLc')
+        create_h5dataset(self.dset, 'WLc', np.asarray(wlc, dtype='float64'),
+                         maxshape=(None,))
+        self._lod_pyramid_wlc = None
+        self._regular_data = {}
+        self.dset.file.flush()
+
+    def has_corrected_waterlevels(self):
+        """
+        Return whether the water levels corrected for the barometric
+        pressure and earth tides effects were computed for this dataset.
+        """
+        return 'WLc' in self.dset
+
+    def get_corrected_waterlevels(self):
+        """
+        Return the water levels corrected for the barometric pressure and
+        earth tides effects or None if they were not computed for this
+        dataset. The uncommited deletions of water levels are applied to
+        the corrected water levels too.
+        """
+        if not self.has_corrected_waterlevels():
+            return None
+        wlc = self.dset['WLc'][...]
+        if self.has_uncommited_changes:
+            wlc[np.isnan(self.waterlevels)] = np.nan
+        return wlc
+
+    # ---- Level of detail
+    def get_lod_pyramid(self, corrected=False):
+        """
+        Return the min/max decimation pyramid of the water level data.
+
+        The pyramid is built from the data saved in the project the first
+        time it is needed and is then cached in the project. The pyramid of
+        the corrected water levels is only cached in memory.
+        """
+        if self.has_uncommited_changes or (
+                corrected and self.has_corrected_waterlevels()):
+            return super().get_lod_pyramid(corrected)
+        if self._lod_pyramid is None:
+            if 'lod' in self.dset:
+                grp = self.dset['lod']
+                self._lod_pyramid = MinMaxPyramid(
+                    [tuple(grp['level{}'.format(i + 1)][...]) for
+                     i in range(grp.attrs['nlevels'])],
+                    grp.attrs['factor'])
+            elif is_h5obj_readonly(self.dset):
+                super().get_lod_pyramid()
+            else:
+                print('Building the level of detail pyramid...', end=' ')
+                pyramid = super().get_lod_pyramid()
+                grp = self.dset.create_group('lod')
+                grp.attrs['factor'] = pyramid.factor
+                grp.attrs['nlevels'] = len(pyramid)
+                for i, (x, y) in enumerate(pyramid.levels):
+                    create_h5dataset(grp, 'level{}'.format(i + 1),
+                                     np.vstack([x, y]))
+                self.dset.file.flush()
+                print('done')
+        return self._lod_pyramid
+
     # ---- Manual measurements
     def set_wlmeas(self, time, wl):
         """Overwrite the water level measurements for this dataset."""
@@ -462,11 +1060,13 @@ class WLDataFrameHDF5(WLDataFrameBase):
             self.dset['manual/Time'][:] = time
             self.dset['manual/WL'].resize(np.shape(wl))
             self.dset['manual/WL'][:] = wl
+            mark_h5obj_modified(self.dset['manual/Time'])
+            mark_h5obj_modified(self.dset['manual/WL'])
         except TypeError:
-            del self.dset['manual']
+            del_h5obj(self.dset, 'manual')
             mmeas = self.dset.create_group('manual')
-            mmeas.create_dataset('Time', data=time, maxshape=(None,))
-            mmeas.create_dataset('WL', data=wl, maxshape=(None,))
+            create_h5dataset(mmeas, 'Time', time, maxshape=(None,))
+            create_h5dataset(mmeas, 'WL', wl, maxshape=(None,))
         self.dset.file.flush()
 
     def get_wlmeas(self):
@@ -489,6 +1089,9 @@ class WLDataFrameHDF5(WLDataFrameBase):
         self.dset['mrc/recess'].resize(np.shape(recess))
         self.dset['mrc/recess'][:] = recess
 
+        for name in ['params', 'peak_indx', 'time', 'recess']:
+            mark_h5obj_modified(self.dset['mrc/' + name])
+
         self.dset['mrc'].attrs['exists'] = 1
 
         self.dset.file.flush()
@@ -498,13 +1101,13 @@ class WLDataFrameHDF5(WLDataFrameBase):
         if 'mrc' not in list(self.dset.keys()):
             mrc = self.dset.create_group('mrc')
             mrc.attrs['exists'] = 0
-            mrc.create_dataset('params', data=(0, 0), dtype='float64')
-            mrc.create_dataset('peak_indx', data=np.array([]),
-                               dtype='int16', maxshape=(None,))
-            mrc.create_dataset('recess', data=np.array([]),
-                               dtype='float64', maxshape=(None,))
-            mrc.create_dataset('time', data=np.array([]),
-                               dtype='float64', maxshape=(None,))
+            create_h5dataset(mrc, 'params', (0, 0), dtype='float64')
+            create_h5dataset(mrc, 'peak_indx', np.array([]),
+                             dtype='int16', maxshape=(None,))
+            create_h5dataset(mrc, 'recess', np.array([]),
+                             dtype='float64', maxshape=(None,))
+            create_h5dataset(mrc, 'time', np.array([]),
+                             dtype='float64', maxshape=(None,))
         return bool(self.dset['mrc'].attrs['exists'])
 
     def save_mrc_tofile(self, filename):
@@ -578,7 +1181,7 @@ class WLDataFrameHDF5(WLDataFrameBase):
     def del_glue(self, idnum):
         """Delete GLUE results at idnum."""
         if idnum in self.glue_idnums():
-            del self.dset['glue'][idnum]
+            del_h5obj(self.dset['glue'], idnum)
             self.dset.file.flush()
             print('GLUE data %s deleted successfully' % idnum)
         else:
@@ -641,32 +1244,6 @@ class WLDataFrameHDF5(WLDataFrameBase):
         """
         grp = self.dset['brf'][name]
 
-        # Make older datasets compatible with newer format (see PR#).
-        flush = False
-        if 'err' in grp.keys():
-            grp['sdA'] = grp['err']
-            del grp['err']
-            flush = True
-        if 'SumA' not in grp.keys():
-            grp['SumA'] = grp['A']
-            del grp['A']
-            flush = True
-        if 'lag' in grp.keys():
-            grp['Lag'] = grp['lag']
-            del grp['lag']
-            flush = True
-        for key in ['date start', 'date end']:
-            if key in grp.keys():
-                grp.attrs[key] = (
-                    datetime.datetime(*grp[key][...], 0).isoformat())
-                del grp[key]
-                flush = True
-        if 'detrending' not in grp.attrs.keys():
-            grp.attrs['detrending'] = ''
-            flush = True
-        if flush:
-            self.dset.file.flush()
-
         # Cast the data into a pandas dataframe.
         keys = ['Lag', 'A', 'sdA', 'SumA', 'sdSumA', 'B',
                 'sdB', 'SumB', 'sdSumB']
@@ -696,8 +1273,8 @@ class WLDataFrameHDF5(WLDataFrameBase):
 
         # Save the data in the h5py group.
         for column in dataf.columns:
-            grp.create_dataset(
-                column, data=dataf[column].values, dtype='float64')
+            create_h5dataset(
+                grp, column, dataf[column].values, dtype='float64')
         grp.attrs['date start'] = date_start.isoformat()
         grp.attrs['date end'] = date_end.isoformat()
         grp.attrs['detrending'] = {
@@ -709,7 +1286,7 @@ class WLDataFrameHDF5(WLDataFrameBase):
     def del_brf(self, name):
         """Delete the BRF evaluation saved with the specified name."""
         if name in list(self.dset['brf'].keys()):
-            del self.dset['brf'][name]
+            del_h5obj(self.dset['brf'], name)
             self.dset.file.flush()
             print('BRF %s deleted successfully' % name)
         else:
@@ -801,6 +1378,9 @@ class WLDataFrameHDF5(WLDataFrameBase):
         if 'figframe_lw' not in keys:
             # Added in version 0.3.3 (see PR #228)
             layout['figframe_lw'] = 0
+        if 'corrected_wl_on' not in keys:
+            # Added in version 0.4.2.
+            layout['corrected_wl_on'] = False
 
         return layout
 
@@ -831,94 +1411,142 @@ class WXDataFrameHDF5(WXDataFrameBase):
         """Load and format the data from the h5py group."""
         self.dataset = dataset
 
-        # Make older datasets compatible with newer format.
-        if isinstance(dataset['Time'][0], (int, float)):
-            # Time needs to be converted from Excel numeric dates
-            # to ISO date strings (see jnsebgosselin/gwhat#297).
-            print('Saving time as ISO date strings instead of Excel dates...',
-                  end=' ')
-            strtimes = xldates_to_strftimes(dataset['Time'])
-            del dataset['Time']
-            dataset.create_dataset('Time', data=strtimes)
-            dataset.file.flush()
-            print('done')
-        if 'Location' not in list(dataset.attrs.keys()):
-            # Added in version 0.4.0 (see jnsebgosselin/gwhat#297).
-            if 'Province' in dataset.attrs.keys():
-                dataset.attrs['Location'] = dataset.attrs['Province']
-                del dataset.attrs['Province']
-            else:
-                dataset.attrs['Location'] = ''
-            dataset.file.flush()
-        if 'Station ID' not in list(dataset.attrs.keys()):
-            # Added in version 0.4.0 (see jnsebgosselin/gwhat#297).
-            if 'Climate Identifier' in dataset.attrs.keys():
-                dataset.attrs['Station ID'] = (
-                    dataset.attrs['Climate Identifier'])
-                del dataset.attrs['Climate Identifier']
-            else:
-                dataset.attrs['Station ID'] = ''
-            dataset.file.flush()
-        for key in ['yearly', 'monthly', 'normals', 'Period']:
-            # Removed in version 0.4.0 (see jnsebgosselin/gwhat#297).
-            if key in dataset.keys():
-                del dataset[key]
-                print(("Removing '{}' from project data because it is "
-                       "not needed anymore.").format(key))
-        for variable in METEO_VARIABLES:
-            key = 'Missing {}'.format(variable)
-            if (key in dataset.keys() and len(dataset[key]) > 0 and
-                    isinstance(dataset[key][0], (int, float))):
-                print(("Saving missing {} data time as ISO date strings "
-                       "instead of Excel dates...").format(variable),
-                      end=' ')
-                # The missing data were previously saved as a list
-                # of xldate periods separated by a nan value. To convert to
-                # the new format, we need to expand the datetimes values
-                # within each period and remove the nan values.
-                try:
-                    missing_idx = dataset[key][:-1]
-                    missing_idx = np.reshape(
-                        missing_idx, (len(missing_idx) // 3, 3))[:, 1:]
-
-                    restruct_missing_idx = []
-                    for period in missing_idx:
-                        restruct_missing_idx.extend(np.arange(*period))
-
-                    del dataset[key]
-                except ValueError:
-                    pass
-                else:
-                    strtimes = xldates_to_strftimes(restruct_missing_idx)
-                    dataset.create_dataset(key, data=strtimes)
-                dataset.file.flush()
-                print('done')
-
         # Get the metadata.
         for key in dataset.attrs.keys():
             self.metadata[key] = dataset.attrs[key]
 
         # Get and format the timeseries data.
         self.data = pd.DataFrame(
-            [],
+            {variable: dataset[variable][...] for
+             variable in METEO_VARIABLES},
             columns=METEO_VARIABLES,
-            index=pd.to_datetime(dataset['Time'], infer_datetime_format=True)
+            index=load_datetimes_from_h5grp(dataset, 'Time')
             )
-        for variable in METEO_VARIABLES:
-            self.data[variable] = np.copy(dataset[variable])
 
         # Get and format the missing value time indexes.
         self.missing_value_indexes = {}
         for variable in METEO_VARIABLES:
             key = 'Missing {}'.format(variable)
             if key in dataset.keys():
-                self.missing_value_indexes[variable] = pd.to_datetime(
-                    dataset[key][:], infer_datetime_format=True)
+                self.missing_value_indexes[variable] = (
+                    load_datetimes_from_h5grp(dataset, key))
+
+        # Get the potential evapotranspiration computed with the
+        # method selected for this dataset if any.
+        pet_method = self.get_pet_method()
+        if pet_method:
+            self.data['PET'] = dataset['pet/' + pet_method][...]
 
     @property
     def name(self):
         return osp.basename(self.dataset.name)
 
+    # ---- Normals
+    def get_cumsum_tables(self):
+        """
+        Return a dict with the cumulative sums over the years of the monthly
+        and yearly values of the weather variables saved in this dataset.
+
+        The tables are computed once and are saved in the project, so that
+        they are read from the project the next time the dataset is opened.
+        """
+        if self._cumsum_tables is None:
+            if 'cumsums' in self.dataset:
+                grp = self.dataset['cumsums']
+                self._cumsum_tables = {
+                    key: grp[key][...] for key in grp.keys()}
+                self._cumsum_tables['first_year'] = int(
+                    grp.attrs['first_year'])
+            elif is_h5obj_readonly(self.dataset):
+                super().get_cumsum_tables()
+            else:
+                tables = super().get_cumsum_tables()
+                grp = self.dataset.create_group('cumsums')
+                for key, value in tables.items():
+                    if key == 'first_year':
+                        grp.attrs[key] = value
+                    else:
+                        create_h5dataset(grp, key, value)
+                self.dataset.file.flush()
+        return self._cumsum_tables
+
+    # ---- Potential evapotranspiration
+    def get_pet_method(self):
+        """
+        Return the method used to compute the potential evapotranspiration
+        of this dataset or an empty string if the potential
+        evapotranspiration imported with the dataset is used.
+        """
+        if 'pet' not in self.dataset:
+            return ''
+        return self.dataset['pet'].attrs['method']
+
+    def set_pet_method(self, method):
+        """
+        Set the method used to compute the potential evapotranspiration
+        of this dataset. See PET_METHODS for the list of available methods.
+        Use an empty string to use the potential evapotranspiration imported
+        with the dataset.
+
+        The potential evapotranspiration computed with each method is
+        cached in the project, so that it is computed only once.
+        """
+        if method and method not in PET_METHODS:
+            raise ValueError("Supported PET methods are: ", PET_METHODS)
+        grp = self.dataset.require_group('pet')
+        if not method:
+            self.data['PET'] = self.dataset['PET'][...]
+        elif method in grp:
+            self.data['PET'] = grp[method][...]
+        else:
+            print('Computing PET with the {} method...'.format(method),
+                  end=' ')
+            self.data['PET'] = calcul_pet(
+                self.data, self.metadata['Latitude'], method).values
+            create_h5dataset(grp, method, self.data['PET'].values)
+            print('done')
+        grp.attrs['method'] = method
+
+        # The cumulative sums used to compute the normals need to be
+        # computed again.
+        if 'cumsums' in self.dataset:
+            del_h5obj(self.dataset, 'cumsums')
+        self._cumsum_tables = None
+        self.dataset.file.flush()
+
+    def save_gapfilled_data(self, filled):
+        """
+        Save in the project the data of this dataset that were gapfilled
+        at the time indexes saved for each variable in filled.
+        """
+        for variable, days in filled.items():
+            if not len(days):
+                continue
+            indexes = self.data.index.get_indexer(days)
+            values = self.dataset[variable][...]
+            values[indexes] = self.data[variable].values[indexes]
+            self.dataset[variable][...] = values
+            mark_h5obj_modified(self.dataset[variable])
+
+            key = 'Missing {}'.format(variable)
+            if key in self.dataset:
+                del_h5obj(self.dataset, key)
+            save_datetimes_to_h5grp(
+                self.dataset, key, self.missing_value_indexes[variable])
+
+        # The potential evapotranspiration computed from the air
+        # temperature and the cumulative sums used to compute the normals
+        # need to be computed again.
+        method = self.get_pet_method()
+        if 'pet' in self.dataset:
+            del_h5obj(self.dataset, 'pet')
+        if 'cumsums' in self.dataset:
+            del_h5obj(self.dataset, 'cumsums')
+        self._cumsum_tables = None
+        if method:
+            self.set_pet_method(method)
+        self.dataset.file.flush()
+
 
 class GLUEDataFrameHDF5(GLUEDataFrameBase):
     """
@@ -972,6 +1600,241 @@ def make_dsetname_valid(dsetname):
     return dsetname
 
 
+def save_wxdset_to_h5grp(h5grp, wxdset):
+    """
+    Save the metadata, daily data and missing value time indexes of a
+    weather dataset in the specified h5py group.
+    """
+    # Save the metadata.
+    for key, value in wxdset.metadata.items():
+        h5grp.attrs[key] = value
+
+    # Save time.
+    save_datetimes_to_h5grp(h5grp, 'Time', wxdset.data.index)
+
+    # Save timeseries data
+    for variable in METEO_VARIABLES:
+        create_h5dataset(
+            h5grp, variable, np.copy(wxdset.data[variable].values))
+
+    # Save times where data was missing.
+    for variable in METEO_VARIABLES:
+        save_datetimes_to_h5grp(
+            h5grp, 'Missing {}'.format(variable),
+            wxdset.missing_value_indexes[variable])
+
+
+def save_datetimes_to_h5grp(h5grp, name, datetimes):
+    """
+    Save a datetime index or an array of datetime64 values in a new
+    h5py dataset as int64 epoch values in nanoseconds.
+    """
+    create_h5dataset(
+        h5grp, name,
+        np.asarray(datetimes, dtype='datetime64[ns]').view('int64'),
+        dtype='int64', maxshape=(None,))
+    h5grp[name].attrs['units'] = 'ns since 1970-01-01T00:00:00'
+    h5grp[name].attrs['format'] = DATETIMES_FORMAT
+
+
+def load_datetimes_from_h5grp(h5grp, name):
+    """
+    Load the datetime values saved in the specified h5py dataset as
+    int64 epoch values and return them as a pandas datetime index.
+    """
+    return pd.DatetimeIndex(h5grp[name][...].view('datetime64[ns]'),
+                            name=INDEX)
+
+
+def load_strings_from_h5dset(h5dset):
+    """
+    Load the strings saved in the specified h5py dataset and return them
+    as a numpy array of str.
+
+    The strings are decoded if needed, since variable-length strings are
+    read as bytes with h5py 3.
+    """
+    return np.array([value.decode('utf-8') if isinstance(value, bytes) else
+                     value for value in h5dset[...]], dtype=str)
+
+
+def searchsorted_h5dset(h5dset, value, side='left'):
+    """
+    Find the index where the specified value should be inserted in a sorted
+    one dimensional h5py dataset to maintain order, reading only one value
+    from the dataset at each iteration of the binary search.
+    """
+    lo, hi = 0, len(h5dset)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        midval = h5dset[mid]
+        if midval < value or (side == 'right' and midval == value):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def is_h5obj_readonly(h5obj):
+    """
+    Return whether the file of the specified h5py object is opened in
+    read-only mode.
+    """
+    return h5obj.file.mode == 'r'
+
+
+def migrate_wldset_h5grp(h5grp):
+    """
+    Migrate the water level dataset saved in the specified h5py group from
+    the older formats to the current format.
+    """
+    if not is_datetimes_h5dset(h5grp['Time']):
+        # Time needs to be converted from Excel numeric dates or
+        # ISO date strings to int64 epoch values.
+        # Changed in version 0.4.2.
+        print('Saving time as int64 epoch values...', end=' ')
+        migrate_datetimes_h5dset(h5grp, 'Time')
+        print('done')
+    if 'Well ID' not in list(h5grp.attrs.keys()):
+        # Added in version 0.2.1 (see PR #124).
+        h5grp.attrs['Well ID'] = ""
+    if 'Province' not in list(h5grp.attrs.keys()):
+        # Added in version 0.2.1 (see PR #124).
+        h5grp.attrs['Province'] = ""
+    if 'glue' not in list(h5grp.keys()):
+        # Added in version 0.3.1 (see PR #184)
+        h5grp.create_group('glue')
+    if 'brf' in list(h5grp.keys()):
+        for name in h5grp['brf'].keys():
+            migrate_brf_h5grp(h5grp['brf'][name])
+
+
+def migrate_brf_h5grp(h5grp):
+    """
+    Migrate the BRF results saved in the specified h5py group from the
+    older formats to the current format.
+    """
+    # Make older datasets compatible with newer format (see PR#).
+    if 'err' in h5grp.keys():
+        h5grp['sdA'] = h5grp['err']
+        del h5grp['err']
+    if 'SumA' not in h5grp.keys():
+        h5grp['SumA'] = h5grp['A']
+        del h5grp['A']
+    if 'lag' in h5grp.keys():
+        h5grp['Lag'] = h5grp['lag']
+        del h5grp['lag']
+    for key in ['date start', 'date end']:
+        if key in h5grp.keys():
+            date = datetime.datetime(*h5grp[key][...], 0).isoformat()
+            del_h5obj(h5grp, key)
+            h5grp.attrs[key] = date
+    if 'detrending' not in h5grp.attrs.keys():
+        h5grp.attrs['detrending'] = ''
+
+
+def migrate_wxdset_h5grp(h5grp):
+    """
+    Migrate the weather dataset saved in the specified h5py group from
+    the older formats to the current format.
+    """
+    if not is_datetimes_h5dset(h5grp['Time']):
+        # Time needs to be converted from Excel numeric dates or
+        # ISO date strings to int64 epoch values.
+        # Changed in version 0.4.2.
+        print('Saving time as int64 epoch values...', end=' ')
+        migrate_datetimes_h5dset(h5grp, 'Time')
+        print('done')
+    if 'Location' not in list(h5grp.attrs.keys()):
+        # Added in version 0.4.0 (see jnsebgosselin/gwhat#297).
+        if 'Province' in h5grp.attrs.keys():
+            h5grp.attrs['Location'] = h5grp.attrs['Province']
+            del h5grp.attrs['Province']
+        else:
+            h5grp.attrs['Location'] = ''
+    if 'Station ID' not in list(h5grp.attrs.keys()):
+        # Added in version 0.4.0 (see jnsebgosselin/gwhat#297).
+        if 'Climate Identifier' in h5grp.attrs.keys():
+            h5grp.attrs['Station ID'] = h5grp.attrs['Climate Identifier']
+            del h5grp.attrs['Climate Identifier']
+        else:
+            h5grp.attrs['Station ID'] = ''
+    for key in ['yearly', 'monthly', 'normals', 'Period']:
+        # Removed in version 0.4.0 (see jnsebgosselin/gwhat#297).
+        if key in h5grp.keys():
+            del_h5obj(h5grp, key)
+            print(("Removing '{}' from project data because it is "
+                   "not needed anymore.").format(key))
+    for variable in METEO_VARIABLES:
+        key = 'Missing {}'.format(variable)
+        if (key in h5grp.keys() and len(h5grp[key]) > 0 and
+                isinstance(h5grp[key][0], (int, float))):
+            print(("Saving missing {} data time as int64 epoch values "
+                   "instead of Excel dates...").format(variable),
+                  end=' ')
+            # The missing data were previously saved as a list
+            # of xldate periods separated by a nan value. To convert to
+            # the new format, we need to expand the datetimes values
+            # within each period and remove the nan values.
+            try:
+                missing_idx = h5grp[key][:-1]
+                missing_idx = np.reshape(
+                    missing_idx, (len(missing_idx) // 3, 3))[:, 1:]
+
+                restruct_missing_idx = []
+                for period in missing_idx:
+                    restruct_missing_idx.extend(np.arange(*period))
+
+                del_h5obj(h5grp, key)
+            except ValueError:
+                pass
+            else:
+                save_datetimes_to_h5grp(
+                    h5grp, key,
+                    xldates_to_datetime64(restruct_missing_idx))
+            print('done')
+        elif key in h5grp.keys() and not is_datetimes_h5dset(
+                h5grp[key]):
+            # Changed in version 0.4.2.
+            migrate_datetimes_h5dset(h5grp, key)
+
+
+def is_datetimes_h5dset(h5dset):
+    """
+    Return whether the dates in the specified h5py dataset are saved as int64
+    epoch values.
+
+    This is determined from the format attribute of the dataset and not
+    from its dtype, since older datasets could contain Excel numeric dates
+    saved as integers.
+    """
+    return h5dset.attrs.get('format', '') == DATETIMES_FORMAT
+
+
+def migrate_datetimes_h5dset(h5grp, name):
+    """
+    Convert the dates saved in the specified h5py dataset, either as Excel
+    numeric dates or ISO date strings, to int64 epoch values.
+    """
+    if 'units' in h5grp[name].attrs and h5grp[name].dtype == np.int64:
+        # The dates are already saved as int64 epoch values, but the
+        # format attribute was not added yet.
+        # Changed in version 0.4.2.
+        h5grp[name].attrs['format'] = DATETIMES_FORMAT
+        return
+    values = h5grp[name][...]
+    if values.dtype.kind in 'iuf':
+        datetimes = xldates_to_datetime64(values)
+    else:
+        # The dates were saved as ISO date strings, which may be read as
+        # bytes depending on the version of h5py.
+        values = [value.decode('utf-8') if isinstance(value, bytes) else
+                  value for value in values]
+        datetimes = pd.to_datetime(values, format=ISO_DATETIME_FORMAT)
+    del_h5obj(h5grp, name)
+    save_datetimes_to_h5grp(h5grp, name, datetimes)
+
+
 def save_dict_to_h5grp(h5grp, dic):
     """
     Save the content of a dictionay recursively in a hdf5.
@@ -982,7 +1845,7 @@ def save_dict_to_h5grp(h5grp, dic):
         if isinstance(item, dict):
             save_dict_to_h5grp(h5grp.require_group(key), item)
         else:
-            h5grp.create_dataset(key, data=item)
+            create_h5dataset(h5grp, key, item)
 
 
 def load_dict_from_h5grp(h5grp):
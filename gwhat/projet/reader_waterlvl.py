@@ -25,6 +25,9 @@ from xlrd import xldate_as_tuple
 
 # ---- Local library imports
 from gwhat.common.utils import save_content_to_csv
+from gwhat.utils.decimation import MinMaxPyramid
+from gwhat.utils.dates import (
+    datetimeindex_to_xldates, xldates_to_datetimeindex, xldates_to_datetime64)
 
 FILE_EXTS = ['.csv', '.xls', '.xlsx']
 
@@ -90,9 +93,8 @@ class WLDataset(EmptyWLDataset):
             try:
                 # We assume first that the dates are stored in the
                 # Excel numeric format.
-                datetimes = self['Time'].astype('float64', errors='raise')
-                datetimes = pd.to_datetime(datetimes.apply(
-                    lambda date: xlrd.xldate.xldate_as_datetime(date, 0)))
+                datetimes = xldates_to_datetimeindex(
+                    self['Time'].astype('float64', errors='raise').values)
             except ValueError:
                 try:
                     # Try converting the strings to datetime objects.
@@ -198,37 +200,46 @@ def init_waterlvl_measures(dirname):
         save_content_to_csv(fname, fcontent)
 
 
-def load_waterlvl_measures(filename, well):
+def find_waterlvl_measures_file(filename):
     """
-    Load and read the water level manual measurements from the specified
-    resource file for the specified well.
+    Return the path of the manual measurements file that exists with the
+    specified filename, trying all supported extensions if the extension
+    is not specified. Return None if no such file exists.
     """
-    print('Loading manual water level measures for well %s...' % well, end=" ")
-    time_mes, wl_mes = np.array([]), np.array([])
-    # Determine the extension of the file.
     root, ext = os.path.splitext(filename)
     exts = [ext] if ext in FILE_EXTS else FILE_EXTS
     for ext in exts:
-        filename = root+ext
-        if os.path.exists(root+ext):
-            break
-    else:
-        # The file does not exists, so we generate an empty file with
-        # a header.
-        print("none")
-        init_waterlvl_measures(os.path.dirname(root))
-        return time_mes, wl_mes
+        if os.path.exists(root + ext):
+            return root + ext
+    return None
 
-    # Open and read the file.
-    if ext == '.csv':
-        with open(filename, 'r') as f:
-            reader = np.array(list(csv.reader(f, delimiter=',')))
-            data = np.array(reader[1:])
 
-            well_name = np.array(data[:, 0]).astype('str')
-            time = np.array(data[:, 1]).astype('float')
-            wl = np.array(data[:, 2]).astype('float')
+def read_waterlvl_measures(filename, offset=0):
+    """
+    Read the well names, times and water levels of all the manual
+    measurements saved in the specified file.
 
+    For csv files, the reading starts at the specified byte offset, so that
+    only the lines that were added to the file since a previous reading
+    need to be parsed. The number of bytes of the file that were read
+    is returned along with the data.
+    """
+    root, ext = os.path.splitext(filename)
+    if ext == '.csv':
+        with open(filename, 'rb') as f:
+            f.seek(offset)
+            content = f.read()
+        nbytes = offset + len(content)
+        reader = list(csv.reader(content.decode('utf8').splitlines(),
+                                 delimiter=','))
+        if offset == 0:
+            # Skip the header.
+            reader = reader[1:]
+        data = [row[:3] for row in reader if len(row) >= 3]
+
+        well_name = np.array([row[0] for row in data]).astype('str')
+        time = np.array([row[1] for row in data]).astype('float')
+        wl = np.array([row[2] for row in data]).astype('float')
     elif ext in ['.xlsx', '.xls']:
         with xlrd.open_workbook(filename) as wb:
             sheet = wb.sheet_by_index(0)
@@ -240,7 +251,26 @@ def load_waterlvl_measures(filename, well):
             well_name = np.array(well_name).astype('str')
             time = np.array(time).astype('float')
             wl = np.array(wl).astype('float')
+        nbytes = os.path.getsize(filename)
+    return well_name, time, wl, nbytes
 
+
+def load_waterlvl_measures(filename, well):
+    """
+    Load and read the water level manual measurements from the specified
+    resource file for the specified well.
+    """
+    print('Loading manual water level measures for well %s...' % well, end=" ")
+    time_mes, wl_mes = np.array([]), np.array([])
+    fname = find_waterlvl_measures_file(filename)
+    if fname is None:
+        # The file does not exists, so we generate an empty file with
+        # a header.
+        print("none")
+        init_waterlvl_measures(os.path.dirname(filename))
+        return time_mes, wl_mes
+
+    well_name, time, wl, _ = read_waterlvl_measures(fname)
     if len(well_name) > 0:
         rowx = np.where(well_name == well)[0]
         if len(rowx) > 0:
@@ -284,6 +314,9 @@ class WLDataFrameBase(Mapping):
         self.dset = None
         self._undo_stack = []
         self._dataf = EmptyWLDataset()
+        self._lod_pyramid = None
+        self._lod_pyramid_wlc = None
+        self._regular_data = {}
 
     def __load_dataset__(self):
         """Loads the dataset and save it in a store."""
@@ -309,14 +342,9 @@ class WLDataFrameBase(Mapping):
         Return a numpy array containing the Excel numerical dates
         corresponding to the dates of the dataset.
         """
-        if 'XLDATES' not in self._dataf.columns:
-            print('Converting datetimes to xldates...', end=' ')
-            timedeltas = (
-                self._dataf.index - xlrd.xldate.xldate_as_datetime(4000, 0))
-            self._dataf['XLDATES'] = (
-                timedeltas.total_seconds()/(3600 * 24) + 4000)
-            print('done')
-        return self._dataf['XLDATES'].values
+        if 'XLDATES' not in self.data.columns:
+            self.data['XLDATES'] = datetimeindex_to_xldates(self.data.index)
+        return self.data['XLDATES'].values
 
     @property
     def dates(self):
@@ -330,6 +358,137 @@ class WLDataFrameBase(Mapping):
     def waterlevels(self):
         return self.data['WL'].values
 
+    def get_waterlevels(self, corrected=False):
+        """
+        Return the water levels of the dataset or, if corrected is True and
+        they are available, the water levels corrected for the barometric
+        pressure and earth tides effects.
+        """
+        if corrected and self.has_corrected_waterlevels():
+            return self.get_corrected_waterlevels()
+        return self.waterlevels
+
+    def has_corrected_waterlevels(self):
+        """
+        Return whether water levels corrected for the barometric pressure
+        and earth tides effects are available for this dataset.
+        """
+        return False
+
+    def get_corrected_waterlevels(self):
+        """
+        Return the water levels corrected for the barometric pressure and
+        earth tides effects or None if they are not available.
+        """
+        return None
+
+    def get_xldate_bounds(self):
+        """
+        Return the Excel numeric dates of the first and last samples of
+        the dataset.
+        """
+        xldates = self.xldates
+        return xldates[0], xldates[-1]
+
+    def get_waterlevel_bounds(self, corrected=False):
+        """
+        Return the minimum and maximum water levels of the dataset or of the
+        corrected water levels if corrected is True and they are available.
+
+        The coarsest level of the level of detail pyramid keeps the minimum
+        and maximum values of each of its buckets, so the bounds are
+        computed from it when available.
+        """
+        pyramid = self.get_lod_pyramid(corrected)
+        waterlevels = (pyramid.levels[-1][1] if len(pyramid) else
+                       self.get_waterlevels(corrected))
+        return np.nanmin(waterlevels), np.nanmax(waterlevels)
+
+    def get_data_window(self, tmin, tmax):
+        """
+        Return a dataframe with the data of the dataset that are comprised
+        between the specified start and end Excel numeric dates. The
+        corrected water levels are included in a 'WLc' column when they
+        are available.
+        """
+        tmin, tmax = xldates_to_datetime64([tmin, tmax])
+        istart = self.data.index.searchsorted(tmin, side='left')
+        iend = self.data.index.searchsorted(tmax, side='right')
+        data = self.data.iloc[istart:iend][
+            [colname for colname in COLUMNS if colname != INDEX]]
+        if self.has_corrected_waterlevels():
+            data = data.assign(
+                WLc=self.get_corrected_waterlevels()[istart:iend])
+        return data
+
+    def get_regularized_data(self, dt, method='linear', max_gap=None,
+                             tmin=None, tmax=None):
+        """
+        Return a dataframe with the data of the dataset resampled on a
+        regular time grid of interval dt, optionally clipped between the
+        specified start and end Excel numeric dates.
+
+        The regularized data are computed for the whole dataset the first
+        time they are needed and are cached for each combination of
+        interval, method and maximum gap length. The corrected water levels
+        are included in a 'WLc' column when they are available.
+        See regularize_time_series for a description of the arguments.
+        """
+        key = (pd.Timedelta(dt), method,
+               None if max_gap is None else pd.Timedelta(max_gap))
+        if key not in self._regular_data:
+            data = self.data[
+                [colname for colname in COLUMNS if colname != INDEX]]
+            if self.has_corrected_waterlevels():
+                data = data.assign(WLc=self.get_corrected_waterlevels())
+            self._regular_data[key] = regularize_time_series(
+                data, dt, method, max_gap)
+        data = self._regular_data[key]
+        istart = (0 if tmin is None else data.index.searchsorted(
+            xldates_to_datetime64([tmin])[0], side='left'))
+        iend = (len(data) if tmax is None else data.index.searchsorted(
+            xldates_to_datetime64([tmax])[0], side='right'))
+        return data.iloc[istart:iend]
+
+    # ---- Level of detail
+    def get_lod_pyramid(self, corrected=False):
+        """
+        Return the min/max decimation pyramid of the water level data that
+        is used to plot the data with a level of detail matching the
+        resolution of the graphs. The pyramid of the corrected water levels
+        is returned instead if corrected is True and they are available.
+        """
+        if corrected and self.has_corrected_waterlevels():
+            if self._lod_pyramid_wlc is None:
+                self._lod_pyramid_wlc = MinMaxPyramid.build(
+                    self.xldates, self.get_corrected_waterlevels())
+            return self._lod_pyramid_wlc
+        if self._lod_pyramid is None:
+            self._lod_pyramid = MinMaxPyramid.build(
+                self.xldates, self.waterlevels)
+        return self._lod_pyramid
+
+    def get_lod_data(self, tmin, tmax, npixels, corrected=False):
+        """
+        Return the Excel numeric dates and water levels to plot between
+        tmin and tmax on an axis that is npixels wide, using the coarsest
+        level of detail that is visually identical to the full resolution
+        data. The corrected water levels are returned instead if corrected
+        is True and they are available.
+        """
+        corrected = corrected and self.has_corrected_waterlevels()
+        pyramid = self.get_lod_pyramid(corrected)
+        level = pyramid.get_level(tmin, tmax, npixels)
+        if level > 0:
+            return pyramid.get_data(level, tmin, tmax)
+        else:
+            # We add a margin on each side of the window, so that the lines
+            # are drawn up to the edges of the axis.
+            margin = tmax - tmin
+            data = self.get_data_window(tmin - margin, tmax + margin)
+            return (datetimeindex_to_xldates(data.index),
+                    data['WLc' if corrected else 'WL'].values)
+
     # ---- Versionning
     @property
     def has_uncommited_changes(self):
@@ -345,8 +504,12 @@ class WLDataFrameBase(Mapping):
     def undo(self):
         """Undo the last changes made to the water level data."""
         if self.has_uncommited_changes:
-            changes = self._undo_stack.pop(-1)
-            self._dataf['WL'][changes.index] = changes
+            starts, lengths, oldvalues = self._undo_stack.pop(-1)
+            self.data.iloc[runs_to_positions(starts, lengths),
+                           self.data.columns.get_loc('WL')] = oldvalues
+            self._lod_pyramid = None
+            self._lod_pyramid_wlc = None
+            self._regular_data = {}
 
     def clear_all_changes(self):
         """
@@ -359,17 +522,142 @@ class WLDataFrameBase(Mapping):
     def delete_waterlevels_at(self, indexes):
         """Delete the water level data at the specified indexes."""
         if len(indexes):
-            self._add_to_undo_stack(indexes)
-            self._dataf['WL'].iloc[indexes] = np.nan
+            positions = np.unique(indexes).astype('int64')
+            self._add_to_undo_stack(positions)
+            self.data.iloc[positions, self.data.columns.get_loc('WL')] = np.nan
+            self._lod_pyramid = None
+            self._lod_pyramid_wlc = None
+            self._regular_data = {}
+
+    def _add_to_undo_stack(self, positions):
+        """
+        Store the old water level values at the specified sorted integer
+        positions in a stack before changing or deleting them. This allow
+        to undo or cancel any changes made to the water level data before
+        commiting them.
+
+        The positions are stored as runs of consecutive positions, so that
+        the memory needed to store large selections of contiguous data
+        remains small.
+        """
+        if len(positions):
+            starts, lengths = positions_to_runs(positions)
+            self._undo_stack.append(
+                (starts, lengths, self.waterlevels[positions]))
 
-    def _add_to_undo_stack(self, indexes):
+    def _get_changed_runs(self):
         """
-        Store the old water level values at the specified indexes in a stack
-        before changing or deleting them. This allow to undo or cancel any
-        changes made to the water level data before commiting them.
+        Return the start positions and lengths of the runs of water level
+        data that were changed since the last commit.
         """
-        if len(indexes):
-            self._undo_stack.append(self._dataf['WL'].iloc[indexes].copy())
+        if not self.has_uncommited_changes:
+            return np.array([], dtype='int64'), np.array([], dtype='int64')
+        positions = np.unique(np.hstack(
+            [runs_to_positions(starts, lengths) for
+             starts, lengths, _ in self._undo_stack]))
+        return positions_to_runs(positions)
+
+
+def regularize_time_series(data, dt, method='linear', max_gap=None):
+    """
+    Resample the time series of a dataframe indexed by datetimes on a
+    regular time grid of interval dt, where all the columns of the
+    dataframe are processed at once.
+
+    The times of the grid are integer multiples of dt in nanoseconds since
+    the epoch, so that no rounding errors accumulate along the grid.
+    The values at the times of the grid where there is no valid sample are
+    filled with a linear interpolation between the previous and next valid
+    samples when method is 'linear', with the value of the nearest valid
+    sample when method is 'nearest' or are left as nan when method is None.
+    No value is filled when the previous and next valid samples are
+    separated by more than max_gap or at the edges of the data.
+
+    The intervals dt and max_gap can be anything that can be converted
+    to a pandas Timedelta, for example '15min' or '1D'.
+    """
+    if method not in ['linear', 'nearest', None]:
+        raise ValueError("The method must be 'linear', 'nearest' or None.")
+    dt = pd.Timedelta(dt).value
+    max_gap = None if max_gap is None else pd.Timedelta(max_gap).value
+
+    times = data.index.values.astype('datetime64[ns]').view('int64')
+    values = data.values.astype('float64')
+    nsamples, ncols = values.shape
+    if nsamples == 0:
+        grid = np.array([], dtype='int64')
+    else:
+        grid = np.arange(-(-times[0] // dt) * dt, times[-1] + 1, dt)
+
+    # For each column, find the indexes of the last valid sample at or
+    # before the time of each point of the grid and of the first valid
+    # sample strictly after it.
+    valid = ~np.isnan(values)
+    indexes = np.arange(nsamples)[:, None]
+    ileft = np.maximum.accumulate(np.where(valid, indexes, -1), axis=0)
+    iright = np.minimum.accumulate(
+        np.where(valid, indexes, nsamples)[::-1], axis=0)[::-1]
+    iright = np.vstack([iright, np.full((1, ncols), nsamples)])
+
+    isample = np.searchsorted(times, grid, side='right') - 1
+    ileft = ileft[isample]
+    iright = iright[isample + 1]
+    hasleft = ileft >= 0
+    hasright = iright < nsamples
+    ileft = np.clip(ileft, 0, max(nsamples - 1, 0))
+    iright = np.clip(iright, 0, max(nsamples - 1, 0))
+
+    columns = np.arange(ncols)
+    tgrid = grid[:, None]
+    tleft, tright = times[ileft], times[iright]
+    vleft, vright = values[ileft, columns], values[iright, columns]
+
+    filled = hasleft & hasright
+    if max_gap is not None:
+        filled &= (tright - tleft) <= max_gap
+    if method == 'linear':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weights = (tgrid - tleft) / (tright - tleft)
+        fvalues = vleft + weights * (vright - vleft)
+    elif method == 'nearest':
+        fvalues = np.where(tgrid - tleft <= tright - tgrid, vleft, vright)
+    else:
+        fvalues = np.full(filled.shape, np.nan)
+    exact = hasleft & (tleft == tgrid)
+    fvalues = np.where(exact, vleft, np.where(filled, fvalues, np.nan))
+
+    return pd.DataFrame(
+        fvalues, columns=data.columns,
+        index=pd.DatetimeIndex(grid.view('datetime64[ns]'), name=INDEX))
+
+
+def positions_to_runs(positions):
+    """
+    Encode an array of sorted unique integer positions as the start
+    positions and lengths of the runs of consecutive positions.
+    """
+    positions = np.asarray(positions, dtype='int64')
+    if not len(positions):
+        return np.array([], dtype='int64'), np.array([], dtype='int64')
+    breaks = np.where(np.diff(positions) != 1)[0] + 1
+    starts = positions[np.hstack([0, breaks])]
+    ends = positions[np.hstack([breaks - 1, len(positions) - 1])] + 1
+    return starts, ends - starts
+
+
+def runs_to_positions(starts, lengths):
+    """
+    Decode the start positions and lengths of runs of consecutive positions
+    into an array of integer positions.
+    """
+    if not len(starts):
+        return np.array([], dtype='int64')
+    # The positions are obtained with a cumulative sum of ones, where the
+    # first element of each run jumps to the start of the run.
+    steps = np.ones(np.sum(lengths), dtype='int64')
+    firsts = np.hstack([0, np.cumsum(lengths)[:-1]])
+    steps[firsts] = starts - np.hstack([0, starts[:-1] + lengths[:-1] - 1])
+    return np.cumsum(steps)
 
 
 class WLDataFrame(WLDataFrameBase):
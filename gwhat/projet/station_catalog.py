@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © GWHAT Project Contributors
+# https://github.com/jnsebgosselin/gwhat
+#
+# This file is part of GWHAT (Ground-Water Hydrograph Analysis Toolbox).
+# Licensed under the terms of the GNU General Public License.
+
+# ---- Third party imports
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Earth radius in km. This is the same value that is used in
+# gwhat.common.utils.calc_dist_from_coord.
+EARTH_RADIUS = 6373
+
+
+def latlon_to_xyz(latitudes, longitudes):
+    """
+    Return the cartesian coordinates on the unit sphere of locations given
+    in decimal degrees.
+    """
+    lat = np.radians(np.asarray(latitudes, dtype='float64'))
+    lon = np.radians(np.asarray(longitudes, dtype='float64'))
+    return np.column_stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class StationCatalog(object):
+    """
+    A spatial index of the location of stations that answers nearest
+    neighbours and within-radius queries.
+
+    The locations are indexed in a k-d tree on the unit sphere, where the
+    chord distance between two locations increases monotonically with their
+    great-circle distance. The distances returned by the queries are
+    great-circle distances in km.
+    """
+
+    def __init__(self, names, latitudes, longitudes):
+        self.names = np.array(names, dtype=object)
+        self.latitudes = np.asarray(latitudes, dtype='float64')
+        self.longitudes = np.asarray(longitudes, dtype='float64')
+        self._tree = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def tree(self):
+        """Return the k-d tree of the stations, building it if needed."""
+        if self._tree is None:
+            self._tree = cKDTree(
+                latlon_to_xyz(self.latitudes, self.longitudes))
+        return self._tree
+
+    def nearest(self, latitude, longitude, k=1):
+        """
+        Return the names of the k stations that are closest to the specified
+        location and their distances in km, sorted by increasing distance.
+        """
+        k = min(int(k), len(self))
+        if k == 0:
+            return [], np.array([])
+        chords, indexes = self.tree.query(
+            latlon_to_xyz([latitude], [longitude])[0], k=k)
+        return (self.names[np.atleast_1d(indexes)].tolist(),
+                self._chord_to_km(np.atleast_1d(chords)))
+
+    def within(self, latitude, longitude, radius):
+        """
+        Return the names of the stations that are located within the
+        specified radius in km of the specified location and their
+        distances in km, sorted by increasing distance.
+        """
+        if len(self) == 0:
+            return [], np.array([])
+        radius = min(float(radius) / EARTH_RADIUS, np.pi)
+        xyz = latlon_to_xyz([latitude], [longitude])[0]
+        indexes = np.array(self.tree.query_ball_point(
+            xyz, 2 * np.sin(radius / 2) * (1 + 1e-12)), dtype=int)
+        chords = np.sqrt(np.sum(
+            (self.tree.data[indexes] - xyz)**2, axis=1))
+        order = np.argsort(chords, kind='mergesort')
+        return (self.names[indexes[order]].tolist(),
+                self._chord_to_km(chords[order]))
+
+    @staticmethod
+    def _chord_to_km(chords):
+        """Convert chord distances on the unit sphere to distances in km."""
+        return 2 * EARTH_RADIUS * np.arcsin(
+            np.clip(np.asarray(chords) / 2, 0, 1))
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © GWHAT Project Contributors
+# https://github.com/jnsebgosselin/gwhat
+#
+# This file is part of GWHAT (Ground-Water Hydrograph Analysis Toolbox).
+# Licensed under the terms of the GNU General Public License.
+
+"""
+Storage policy of the datasets saved in the hdf5 project files.
+
+The numerical arrays of the projects are saved in chunks that are split
+along their time axis, which is assumed to be their longest axis, and that
+are compressed with a shuffle filter. Optionally, the float64 results that
+are derived from the data of the project, like the GLUE or BRF results,
+can be saved in single precision. The policy is set in the
+'project_storage' section of the configs of GWHAT.
+
+The space used by the objects that are deleted from a project file is not
+reclaimed by HDF5, so the size of the deleted objects is accumulated in an
+attribute of the project file and the projects are repacked in a new file
+with the current storage policy when this space becomes too large.
+"""
+
+# ---- Standard library imports
+from fnmatch import fnmatch
+import os
+import os.path as osp
+
+# ---- Third party imports
+import h5py
+import numpy as np
+
+# ---- Local library imports
+from gwhat.config.main import CONF
+from gwhat.projet.backup import mark_h5obj_modified
+
+# The compression filters that are supported to save the datasets.
+COMPRESSIONS = ['gzip', 'lzf', None]
+
+# The datasets with less values than this are not chunked nor compressed,
+# unless they are resizable.
+MIN_CHUNKED_SIZE = 1024
+
+# The maximum size in bytes of the chunks of the datasets.
+MAX_CHUNK_BYTES = 2**20
+
+# The estimated size in bytes of the metadata of each object of a project.
+OBJECT_METADATA_SIZE = 1024
+
+# The name of the attribute of the project files where the size in bytes of
+# the objects that were deleted since the last repack is saved.
+FREED_SPACE_ATTR = 'freed_space'
+
+# The projects are repacked when the space that is not used anymore in the
+# project file is larger than REPACK_MIN_FREESPACE and than this fraction
+# of the size of the file.
+REPACK_FREESPACE_RATIO = 0.3
+REPACK_MIN_FREESPACE = 2**20
+
+# The patterns of the paths of the datasets that are derived from the data
+# of the project and that can be saved in single precision.
+DERIVED_PATHS = ['/wldsets/*/glue/*', '/wldsets/*/brf/*',
+                 '/wxdsets/*/pet/*', '/wxdsets/*/cumsums/*']
+
+# The names of the datasets that are always saved in double precision,
+# because they contain dates saved as numerical values.
+TIME_NAMES = ['Time', 'time']
+
+
+def get_storage_policy():
+    """
+    Return a dict with the storage policy of the project files that is
+    set in the configs.
+    """
+    policy = {key: CONF.get('project_storage', key) for key in
+              ['compression', 'compression_level', 'shuffle',
+               'chunk_length', 'derived_float32']}
+    if policy['compression'] not in COMPRESSIONS:
+        policy['compression'] = None
+    return policy
+
+
+def set_storage_policy(**kwargs):
+    """
+    Set the storage policy of the project files in the configs.
+    """
+    for key, value in kwargs.items():
+        if key == 'compression' and value not in COMPRESSIONS:
+            raise ValueError(
+                "Supported compressions are: {}".format(COMPRESSIONS))
+        CONF.set('project_storage', key, value)
+
+
+def is_derived_h5path(path):
+    """
+    Return whether the dataset at the specified path in the project
+    contains results that are derived from the data of the project.
+    """
+    return (osp.basename(path) not in TIME_NAMES and
+            any(fnmatch(path, pattern) for pattern in DERIVED_PATHS))
+
+
+def calcul_chunk_shape(shape, maxshape, itemsize, chunk_length):
+    """
+    Return the shape of the chunks of a dataset, so that its data are
+    split in chunks of at most chunk_length values along its time axis.
+    """
+    chunks = [max(n, 1) for n in shape]
+    axis = int(np.argmax(shape))
+    if maxshape[axis] is None:
+        chunks[axis] = min(chunk_length, max(chunks[axis], MIN_CHUNKED_SIZE))
+    else:
+        chunks[axis] = min(chunk_length, chunks[axis])
+
+    # Split the other axes of the chunks if they are too large.
+    while np.prod(chunks) * itemsize > MAX_CHUNK_BYTES:
+        others = [1 if i == axis else n for i, n in enumerate(chunks)]
+        i = int(np.argmax(others)) if max(others) > 1 else axis
+        chunks[i] = (chunks[i] + 1) // 2
+    return tuple(chunks)
+
+
+def create_h5dataset(h5grp, name, data, dtype=None, maxshape=None,
+                     policy=None, **kwargs):
+    """
+    Create a new dataset in the h5py group with the specified data and
+    storage policy or with the storage policy set in the configs if None.
+
+    Only the numerical arrays are chunked and compressed. The other kind
+    of data, like strings, are saved as is. The new dataset is marked as
+    modified for the backups of the project.
+    """
+    policy = get_storage_policy() if policy is None else policy
+    values = np.asarray(data, dtype=dtype)
+    if values.dtype.kind not in 'biuf' or values.ndim == 0:
+        dset = h5grp.create_dataset(
+            name, data=data, dtype=dtype, maxshape=maxshape, **kwargs)
+        mark_h5obj_modified(dset)
+        return dset
+
+    if (policy['derived_float32'] and values.dtype == np.float64 and
+            is_derived_h5path('{}/{}'.format(h5grp.name, name))):
+        values = values.astype(np.float32)
+
+    if maxshape is None and values.size < MIN_CHUNKED_SIZE:
+        dset = h5grp.create_dataset(name, data=values, **kwargs)
+        mark_h5obj_modified(dset)
+        return dset
+
+    kwargs['chunks'] = calcul_chunk_shape(
+        values.shape, values.shape if maxshape is None else maxshape,
+        values.dtype.itemsize, policy['chunk_length'])
+    if policy['compression'] is not None:
+        kwargs['compression'] = policy['compression']
+        kwargs['shuffle'] = bool(policy['shuffle'])
+        if policy['compression'] == 'gzip':
+            kwargs['compression_opts'] = policy['compression_level']
+    dset = h5grp.create_dataset(
+        name, data=values, maxshape=maxshape, **kwargs)
+    mark_h5obj_modified(dset)
+    return dset
+
+
+def copy_h5grp_with_policy(src_grp, dst_grp, policy=None):
+    """
+    Copy recursively the content of src_grp in dst_grp with the specified
+    storage policy or with the storage policy set in the configs if None.
+    """
+    policy = get_storage_policy() if policy is None else policy
+    for key, value in src_grp.attrs.items():
+        dst_grp.attrs[key] = value
+    for name, item in src_grp.items():
+        if isinstance(item, h5py.Group):
+            copy_h5grp_with_policy(
+                item, dst_grp.create_group(name), policy)
+        else:
+            maxshape = item.maxshape
+            if item.chunks is None or maxshape == item.shape:
+                maxshape = None
+            dset = create_h5dataset(
+                dst_grp, name, item[()], dtype=item.dtype,
+                maxshape=maxshape, policy=policy)
+            for key, value in item.attrs.items():
+                dset.attrs[key] = value
+
+
+def calcul_h5obj_size(h5obj):
+    """
+    Return an estimate of the size in bytes used in the file by the
+    specified h5py group or dataset, including the estimated size of the
+    metadata of its objects.
+    """
+    sizes = [0, 0]
+
+    def visit(obj):
+        sizes[1] += 1
+        if isinstance(obj, h5py.Dataset):
+            sizes[0] += obj.id.get_storage_size()
+    visit(h5obj)
+    if isinstance(h5obj, h5py.Group):
+        h5obj.visititems(lambda name, obj: visit(obj))
+    return sizes[0] + sizes[1] * OBJECT_METADATA_SIZE
+
+
+def del_h5obj(h5grp, name):
+    """
+    Delete the object at the specified name in the h5py group and add its
+    size to the space that was freed in the project file.
+    """
+    size = calcul_h5obj_size(h5grp[name])
+    del h5grp[name]
+    h5file = h5grp.file
+    h5file.attrs[FREED_SPACE_ATTR] = (
+        int(h5file.attrs.get(FREED_SPACE_ATTR, 0)) + size)
+
+
+def calcul_project_freespace(h5file):
+    """
+    Return an estimate of the size in bytes of the space of the opened
+    h5py project file that is not used anymore.
+
+    HDF5 does not keep track of the space that was freed in the previous
+    sessions, so this is the size of the objects that were deleted with
+    del_h5obj since the project was last repacked.
+    """
+    return max(int(h5file.attrs.get(FREED_SPACE_ATTR, 0)),
+               h5file.id.get_freespace())
+
+
+def is_repack_needed(h5file):
+    """
+    Return whether the space that is not used anymore in the opened h5py
+    project file is large enough for the project to be repacked.
+    """
+    freespace = calcul_project_freespace(h5file)
+    return (freespace > REPACK_MIN_FREESPACE and
+            freespace > REPACK_FREESPACE_RATIO * h5file.id.get_filesize())
+
+
+def rewrite_project_storage(filename, policy=None):
+    """
+    Rewrite all the datasets of the closed project file with the specified
+    storage policy or with the storage policy set in the configs if None.
+
+    The project is rewritten in a temporary file that replaces the project
+    file only once it is complete. Return the sizes in bytes of the
+    project file before and after it was rewritten.
+    """
+    print("Rewriting the datasets of the project hdf5 file... ", end='')
+    tmp_filename = filename + '.rewrite'
+    try:
+        with h5py.File(filename, 'r') as src_file:
+            with h5py.File(tmp_filename, 'w') as dst_file:
+                copy_h5grp_with_policy(src_file, dst_file, policy)
+                if FREED_SPACE_ATTR in dst_file.attrs:
+                    del dst_file.attrs[FREED_SPACE_ATTR]
+        size_before = osp.getsize(filename)
+        os.replace(tmp_filename, filename)
+    except (OSError, KeyError, ValueError, TypeError):
+        print('failed')
+        if osp.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+    print('done')
+    return size_before, osp.getsize(filename)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description=("Rewrite the datasets of GWHAT project files with the "
+                     "storage policy set in the configs."))
+    parser.add_argument('filenames', nargs='+', help="The project files.")
+    for filename in parser.parse_args().filenames:
+        size_before, size_after = rewrite_project_storage(filename)
+        print('{}: {:0.1f} MB -> {:0.1f} MB'.format(
+            filename, size_before / 1024**2, size_after / 1024**2))
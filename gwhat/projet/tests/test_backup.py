@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © GWHAT Project Contributors
+# https://github.com/jnsebgosselin/gwhat
+#
+# This file is part of GWHAT (Ground-Water Hydrograph Analysis Toolbox).
+# Licensed under the terms of the GNU General Public License.
+
+# ---- Standard library imports
+import json
+import os
+import os.path as osp
+
+# ---- Third party imports
+import h5py
+import numpy as np
+import pytest
+
+# ---- Local library imports
+from gwhat.meteo.weather_reader import WXDataFrame
+from gwhat.projet.reader_waterlvl import WLDataFrame
+from gwhat.projet.reader_projet import ProjetReader
+import gwhat.projet.backup
+from gwhat.projet.backup import (
+    calcul_project_signatures, get_project_units, restore_project_backup,
+    BACKUP_GENERATIONS, GENERATION_INFO)
+
+DATADIR = osp.join(osp.dirname(osp.realpath(__file__)), 'data')
+WXFILENAME = osp.join(DATADIR, 'sample_weather_datafile.out')
+WLFILENAME = osp.join(DATADIR, 'sample_water_level_datafile.csv')
+
+
+# ---- Pytest Fixtures
+@pytest.fixture
+def project(tmpdir):
+    project = ProjetReader(osp.join(str(tmpdir), "backup_test.gwt"))
+    project.add_wldset('well1', WLDataFrame(WLFILENAME))
+    project.add_wldset('well2', WLDataFrame(WLFILENAME))
+    project.add_wxdset('station1', WXDataFrame(WXFILENAME))
+    return project
+
+
+def read_attrs(attrs):
+    return {key: np.asarray(value).tolist() for key, value in attrs.items()}
+
+
+def read_project_content(filename):
+    """Return a dict with the content of the project hdf5 file."""
+    content = {}
+    with h5py.File(filename, 'r') as h5file:
+        content['/'] = read_attrs(h5file.attrs)
+
+        def visit(name, obj):
+            content[name] = read_attrs(obj.attrs)
+            if isinstance(obj, h5py.Dataset):
+                data = obj[...]
+                content[name]['__data__'] = (
+                    data.tolist() if data.dtype.kind == 'O' else
+                    data.tobytes())
+        h5file.visititems(visit)
+    return content
+
+
+def read_generation_info(filename):
+    with h5py.File(filename, 'r') as genfile:
+        return json.loads(genfile[GENERATION_INFO][()])
+
+
+# ---- Tests
+def test_project_units(project):
+    """
+    Test that the projects are split in units as expected.
+    """
+    groups, units = get_project_units(project.db)
+    assert '/wldsets/well1' in groups
+    assert '/wldsets/well1/WL' in units
+    assert '/wldsets/well1/brf' in units
+    assert '/wxdsets/station1' in units
+    assert '/wldsets/well1/glue' in units
+
+
+def test_incremental_backup(project):
+    """
+    Test that only the units of the projects that were modified since the
+    last backup are copied in the backup.
+    """
+    filename = project.filename
+    assert project.backup_project_file() is True
+    assert read_project_content(filename + '.bak') == (
+        read_project_content(filename))
+    assert not osp.exists(filename + '.bak.1')
+    content1 = read_project_content(filename)
+
+    # Assert that no generation is created when nothing changed.
+    assert project.backup_project_file() is True
+    assert not osp.exists(filename + '.bak.1')
+
+    # Modify the water levels of a well in place and delete a weather
+    # dataset and assert that only these units are updated in the backup.
+    station1_units = sorted(
+        unit for unit in get_project_units(project.db)[1] if
+        unit.startswith('/wxdsets/station1'))
+    wldset = project.get_wldset('well1')
+    wldset.delete_waterlevels_at([3, 4, 5])
+    wldset.commit()
+    project.del_wxdset('station1')
+    project.name = 'modified'
+    assert project.backup_project_file() is True
+    assert read_project_content(filename + '.bak') == (
+        read_project_content(filename))
+
+    # Note that the weather datasets group is now empty, so that it is
+    # itself a unit of the project.
+    info = read_generation_info(filename + '.bak.1')
+    assert info['added'] == ['/wxdsets']
+    assert info['replaced'] == (
+        ['/wldsets/well1/WL', '/wxcatalog'] + station1_units)
+    content2 = read_project_content(filename)
+
+    # Assert that the project can be restored from any generation.
+    project.add_wxdset('station2', WXDataFrame(WXFILENAME))
+    assert project.backup_project_file() is True
+    assert read_generation_info(filename + '.bak.1')['added'] == sorted(
+        unit for unit in get_project_units(project.db)[1] if
+        unit.startswith('/wxdsets/station2'))
+    content3 = read_project_content(filename)
+    project.close()
+
+    for generation, expected in enumerate([content3, content2, content1]):
+        assert restore_project_backup(filename, generation) is True
+        assert read_project_content(filename) == expected
+
+
+def test_backup_reads_modified_units_only(project, mocker):
+    """
+    Test that only the data of the units whose fingerprint changed since
+    the last backup are read to compute their signature.
+    """
+    filename = project.filename
+    assert project.backup_project_file() is True
+
+    # Assert that no data is read when nothing changed.
+    calcul_unit_signature = mocker.spy(
+        gwhat.projet.backup, 'calcul_unit_signature')
+
+    def get_read_units():
+        units = [call[0][0].name for call in
+                 calcul_unit_signature.call_args_list if
+                 call[0][2:] != (False,)]
+        calcul_unit_signature.reset_mock()
+        return units
+
+    assert project.backup_project_file() is True
+    assert get_read_units() == []
+
+    # Modify the MRC of a well in place and assert that only its unit is
+    # read and updated in the backup.
+    project.get_wldset('well2').set_mrc(1, 2, [1, 5], [1, 2, 3], [4, 5, 6])
+    assert project.backup_project_file() is True
+    assert get_read_units() == ['/wldsets/well2/mrc']
+    assert read_generation_info(filename + '.bak.1')['replaced'] == [
+        '/wldsets/well2/mrc']
+    assert read_project_content(filename + '.bak') == (
+        read_project_content(filename))
+
+    # Assert that the changes made in place to the data of a unit are
+    # detected even if its shape does not change.
+    project.get_wldset('well2').set_mrc(3, 4, [2, 6], [1, 2, 3], [7, 8, 9])
+    assert project.backup_project_file() is True
+    assert get_read_units() == ['/wldsets/well2/mrc']
+    assert read_project_content(filename + '.bak') == (
+        read_project_content(filename))
+
+
+def test_backup_generations(project):
+    """
+    Test that only the last generations of backups are kept.
+    """
+    filename = project.filename
+    for i in range(BACKUP_GENERATIONS + 3):
+        project.name = 'name {}'.format(i)
+        assert project.backup_project_file() is True
+    for n in range(1, BACKUP_GENERATIONS + 1):
+        assert osp.exists('{}.bak.{}'.format(filename, n))
+    assert not osp.exists('{}.bak.{}'.format(filename, n + 1))
+    project.close()
+
+    assert restore_project_backup(filename, BACKUP_GENERATIONS) is True
+    with h5py.File(filename, 'r') as h5file:
+        assert h5file.attrs['name'] == 'name 2'
+
+
+def test_backup_cancelled_or_invalid(project, mocker):
+    """
+    Test that the backup is created again from scratch when the signatures
+    of the last backup are missing and that it can be cancelled.
+    """
+    filename = project.filename
+    assert project.backup_project_file(lambda: True) is False
+    assert not osp.exists(filename + '.bak')
+
+    # Assert that the full backup can be cancelled between the units.
+    mock_copy = mocker.patch.object(
+        gwhat.projet.backup, '_copy_h5obj',
+        wraps=gwhat.projet.backup._copy_h5obj)
+    assert project.backup_project_file(
+        lambda: mock_copy.call_count > 0) is False
+    assert mock_copy.call_count == 1
+    assert not osp.exists(filename + '.bak')
+    assert not osp.exists(filename + '.bak.tmp')
+    mocker.stopall()
+
+    assert project.backup_project_file() is True
+    signatures = calcul_project_signatures(project.db)
+    with open(filename + '.bak.json') as f:
+        assert json.load(f)['signatures'] == signatures
+
+    os.remove(filename + '.bak.json')
+    project.name = 'modified'
+    assert project.backup_project_file() is True
+    assert not osp.exists(filename + '.bak.1')
+    assert read_project_content(filename + '.bak') == (
+        read_project_content(filename))
+
+
+if __name__ == "__main__":
+    pytest.main(['-x', os.path.basename(__file__), '-v', '-rw'])
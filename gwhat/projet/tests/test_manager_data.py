@@ -13,12 +13,15 @@ import os
 import os.path as osp
 
 # ---- Third Party Libraries Imports
+import numpy as np
+import pandas as pd
 import pytest
 from PyQt5.QtCore import Qt
 
 
 # ---- Local Libraries Imports
-from gwhat.meteo.weather_reader import WXDataFrame
+from gwhat.meteo.weather_reader import WXDataFrame, METEO_VARIABLES
+from gwhat.meteo.multistation import VirtualWXDataFrame
 from gwhat.projet.reader_waterlvl import WLDataFrame
 from gwhat.projet.reader_projet import ProjetReader
 from gwhat.projet.manager_data import (DataManager, QFileDialog, QMessageBox,
@@ -114,6 +117,95 @@ def test_delete_weather_data(datamanager, mocker, qtbot):
     assert mock_exec_.call_count == 2
 
 
+def test_weather_pet_method(datamanager, qtbot):
+    """
+    Test setting the method used to compute the potential
+    evapotranspiration of the current weather dataset.
+    """
+    datamanager.new_wxdset_imported('wxdset1', WXDataFrame(WXFILENAME))
+    assert datamanager.pet_method_cbox.currentData() == ''
+
+    with qtbot.waitSignal(datamanager.wxdsetChanged, raising=True):
+        datamanager.pet_method_cbox.setCurrentIndex(
+            datamanager.pet_method_cbox.findData('oudin'))
+    assert datamanager.get_current_wxdset().get_pet_method() == 'oudin'
+
+    # Assert the method is shown correctly when changing the dataset.
+    datamanager.new_wxdset_imported('wxdset2', WXDataFrame(WXFILENAME))
+    assert datamanager.pet_method_cbox.currentData() == ''
+    datamanager.set_current_wxdset('wxdset1')
+    assert datamanager.pet_method_cbox.currentData() == 'oudin'
+
+
+def test_virtual_weather_data(datamanager, qtbot):
+    """
+    Test that the weather data interpolated at the current observation well
+    can be used instead of the data of the selected weather dataset.
+    """
+    datamanager.new_wldset_imported('wldset1', WLDataFrame(WLFILENAME))
+    datamanager.new_wxdset_imported('wxdset1', WXDataFrame(WXFILENAME))
+    datamanager.new_wxdset_imported('wxdset2', WXDataFrame(WXFILENAME))
+    assert datamanager.get_current_wxdset().name == 'wxdset2'
+
+    with qtbot.waitSignal(datamanager.wxdsetChanged, raising=True):
+        datamanager.btn_virtual_wxdset.setValue(True)
+    wxdset = datamanager.get_current_wxdset()
+    assert wxdset.metadata['Station Name'] == 'Virtual wldset1'
+    assert len(wxdset.data) == len(
+        datamanager.projet.get_wxdset('wxdset1').data)
+    assert not datamanager.wxdsets_cbox.isEnabled()
+    assert not datamanager.pet_method_cbox.isEnabled()
+
+    # Assert that the interpolated weather dataset is cached.
+    assert datamanager.get_current_wxdset() is wxdset
+
+    with qtbot.waitSignal(datamanager.wxdsetChanged, raising=True):
+        datamanager.btn_virtual_wxdset.setValue(False)
+    assert datamanager.get_current_wxdset().name == 'wxdset2'
+    assert datamanager.wxdsets_cbox.isEnabled()
+
+
+def test_gapfill_weather_data(datamanager, mocker, qtbot):
+    """
+    Test that the missing data of the weather datasets of the project can
+    be filled from the data manager.
+    """
+    np.random.seed(0)
+    index = pd.date_range('2000-01-01', '2001-12-31', freq='D')
+    tavg = 10 - 15 * np.cos(2 * np.pi * index.dayofyear / 365)
+    ptot = np.random.exponential(3, len(index))
+    expected = pd.DataFrame(
+        {'Tmax': tavg + 5, 'Tmin': tavg - 5, 'Tavg': tavg, 'Ptot': ptot,
+         'Rain': ptot, 'Snow': 0, 'PET': 1},
+        index=index, columns=METEO_VARIABLES)
+    missing = index[100:110]
+    metadata = WXDataFrame(WXFILENAME).metadata
+    for i in range(2):
+        data = expected.copy()
+        if i == 0:
+            data.loc[missing, 'Tavg'] = 0
+        datamanager.new_wxdset_imported(
+            'wxdset{}'.format(i), VirtualWXDataFrame(
+                metadata, data,
+                {var: missing if i == 0 and var == 'Tavg' else
+                 pd.DatetimeIndex([]) for var in METEO_VARIABLES}))
+    datamanager.set_current_wxdset('wxdset0')
+
+    # Click to gapfill the weather datasets, but cancel.
+    mock_question = mocker.patch.object(
+        QMessageBox, 'question', return_value=QMessageBox.No)
+    qtbot.mouseClick(datamanager.btn_gapfill_wxdsets, Qt.LeftButton)
+    assert np.all(datamanager.get_current_wxdset().data.loc[
+        missing, 'Tavg'] == 0)
+
+    # Click to gapfill the weather datasets and answer Yes.
+    mock_question.return_value = QMessageBox.Yes
+    with qtbot.waitSignal(datamanager.sig_new_console_msg, raising=True):
+        qtbot.mouseClick(datamanager.btn_gapfill_wxdsets, Qt.LeftButton)
+    assert np.allclose(datamanager.get_current_wxdset().data.loc[
+        missing, 'Tavg'], expected.loc[missing, 'Tavg'], atol=0.5)
+
+
 def test_import_waterlevel_data(datamanager, mocker, qtbot):
     """Test importing and saving water level data to the project."""
     datamanager.new_waterlvl_win.setModal(False)
@@ -176,6 +268,38 @@ def test_delete_waterlevel_data(datamanager, mocker, qtbot):
     assert mock_exec_.call_count == 2
 
 
+def test_append_waterlevel_data(datamanager, mocker, qtbot):
+    """
+    Test appending the data of a water level datafile to the current
+    water level dataset.
+    """
+    datamanager.new_wldset_imported('wldset1', WLDataFrame(WLFILENAME))
+    wldset = datamanager.get_current_wldset()
+    nsamples = len(wldset.data)
+
+    # Mock the file dialog to return the path of the water level datafile.
+    mocker.patch.object(
+        QFileDialog, 'getOpenFileName', return_value=(WLFILENAME, '*.csv'))
+
+    # Click to append the data. Since the datafile is the same that was used
+    # to create the dataset, no new data should be added to the dataset.
+    with qtbot.waitSignal(datamanager.sig_new_console_msg, raising=True):
+        qtbot.mouseClick(datamanager.btn_append_wl, Qt.LeftButton)
+    assert len(datamanager.get_current_wldset().data) == nsamples
+
+    # Assert that a warning is shown and that no message is sent to the
+    # console when the data can't be appended to the dataset.
+    mocker.patch.object(
+        wldset.__class__, 'append_data', side_effect=OSError('Disk full'))
+    mock_warning = mocker.patch.object(QMessageBox, 'warning')
+    mock_console = mocker.Mock()
+    datamanager.sig_new_console_msg.connect(mock_console)
+    qtbot.mouseClick(datamanager.btn_append_wl, Qt.LeftButton)
+    assert mock_warning.call_count == 1
+    assert 'Disk full' in mock_warning.call_args[0][2]
+    assert mock_console.call_count == 0
+
+
 def test_last_opened_datasets(qtbot, projectpath):
     """
     Test that the data manager recall correctly the water level and weather
@@ -9,8 +9,10 @@
 # ---- Standard library imports
 import os
 import os.path as osp
+import time
 
 # ---- Third party imports
+import h5py
 import pytest
 
 # ---- Local imports
@@ -75,7 +77,7 @@ def projmanager(qtbot):
 
 
 # ---- Tests
-def test_create_new_projet(projmanager, mocker, projectpath):
+def test_create_new_projet(projmanager, mocker, projectpath, qtbot):
     """
     Test the creation of a new project.
     """
@@ -104,13 +106,14 @@ def test_create_new_projet(projmanager, mocker, projectpath):
     projmanager.new_projet_dialog.save_project()
     assert projmanager.project_display.text() == NAME
     assert osp.exists(projectpath)
+    qtbot.waitUntil(lambda: not projmanager.backup_thread.isRunning())
     assert osp.exists(projectpath + '.bak')
 
     # Close the project.
     projmanager.close_projet()
 
 
-def test_load_projet(projmanager, mocker, projectfile):
+def test_load_projet(projmanager, mocker, projectfile, qtbot):
     """
     Test loading a valid existing project.
     """
@@ -119,6 +122,7 @@ def test_load_projet(projmanager, mocker, projectfile):
     mocker.patch.object(
         QFileDialog, 'getOpenFileName', return_value=(projectfile, '*.gwt'))
     projmanager.select_project()
+    qtbot.waitUntil(lambda: osp.exists(projectfile + '.bak.json'))
     assert osp.exists(projectfile + '.bak')
 
     # Assert that the project has been loaded correctly and that its name is
@@ -317,5 +321,47 @@ def test_restore_corrupt_project(projmanager, mocker, projectfile, bakfile):
     assert isinstance(projmanager.projet, ProjetReader)
 
 
+def test_backup_project_in_background(projmanager, mocker, projectfile,
+                                      qtbot):
+    """
+    Test that the backup of a project is updated in the background after
+    the project is loaded and that the project is not closed during the
+    backup.
+    """
+    projmanager.load_project(projectfile)
+    assert projmanager.projet.db is not None
+    qtbot.waitUntil(lambda: not projmanager.backup_thread.isRunning())
+    assert osp.exists(projectfile + '.bak')
+    assert not osp.exists(projectfile + '.bak.1')
+
+    # Modify the project and assert that the backup is updated.
+    projmanager.projet.name = 'modified name'
+    projmanager.start_project_backup()
+    qtbot.waitUntil(lambda: not projmanager.backup_thread.isRunning())
+    assert osp.exists(projectfile + '.bak.1')
+    with h5py.File(projectfile + '.bak', 'r') as bakfile:
+        assert bakfile.attrs['name'] == 'modified name'
+
+    # Assert that a cancel request made right after the backup is started
+    # is not lost when the backup starts in the thread.
+    def wait_until_cancelled(is_cancelled):
+        while not is_cancelled():
+            time.sleep(0.01)
+        return False
+    mock_backup = mocker.patch.object(
+        ProjetReader, 'backup_project_file', side_effect=wait_until_cancelled)
+    projmanager.start_project_backup()
+    projmanager.backup_worker.cancel()
+    qtbot.waitUntil(lambda: not projmanager.backup_thread.isRunning())
+    assert mock_backup.call_count == 1
+
+    # Assert that closing the project cancels the backup if it is running.
+    projmanager.start_project_backup()
+    qtbot.waitUntil(lambda: mock_backup.call_count == 2)
+    projmanager.close_projet()
+    assert not projmanager.backup_thread.isRunning()
+    assert projmanager.projet is None
+
+
 if __name__ == "__main__":
     pytest.main(['-x', os.path.basename(__file__), '-v', '-rw'])
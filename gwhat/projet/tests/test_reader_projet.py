@@ -0,0 +1,677 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright © GWHAT Project Contributors
+# https://github.com/jnsebgosselin/gwhat
+#
+# This file is part of GWHAT (Ground-Water Hydrograph Analysis Toolbox).
+# Licensed under the terms of the GNU General Public License.
+# -----------------------------------------------------------------------------
+
+
+# ---- Standard library imports
+import datetime
+import os
+import os.path as osp
+
+# ---- Third party imports
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+
+# ---- Local library imports
+from gwhat.meteo.weather_reader import WXDataFrame, METEO_VARIABLES
+from gwhat.meteo.multistation import VirtualWXDataFrame
+from gwhat.projet.reader_waterlvl import WLDataFrame
+from gwhat.projet.reader_projet import ProjetReader, SCHEMA_VERSION
+from gwhat.common.utils import save_content_to_csv, calc_dist_from_coord
+from gwhat.utils.decimation import MinMaxPyramid
+
+DATADIR = osp.join(osp.dirname(osp.realpath(__file__)), 'data')
+WXFILENAME = osp.join(DATADIR, 'sample_weather_datafile.out')
+WLFILENAME = osp.join(DATADIR, 'sample_water_level_datafile.csv')
+
+
+# ---- Pytest Fixtures
+@pytest.fixture
+def projectpath(tmpdir):
+    return osp.join(str(tmpdir), "reader_projet_test.gwt")
+
+
+@pytest.fixture
+def project(projectpath):
+    return ProjetReader(projectpath)
+
+
+@pytest.fixture
+def wldataset():
+    return WLDataFrame(WLFILENAME)
+
+
+@pytest.fixture
+def wxdataset():
+    return WXDataFrame(WXFILENAME)
+
+
+# ---- Tests
+def test_wldset_time_storage(project, wldataset):
+    """
+    Test that the time of water level datasets are saved as int64 epoch
+    values in the project and that older datasets are migrated correctly.
+    """
+    project.add_wldset('dataset', wldataset)
+    assert project.db['wldsets/dataset/Time'].dtype == np.dtype('int64')
+
+    wldset = project.get_wldset('dataset')
+    assert (wldset.data.index == wldataset.data.index).all()
+    assert np.array_equal(wldset.waterlevels, wldataset.waterlevels)
+    assert wldset['Time'] == wldataset['Time']
+
+    # Save the time as ISO date strings as it was done in older versions.
+    grp = project.db['wldsets/dataset']
+    del grp['Time']
+    grp.create_dataset('Time', data=np.array(
+        wldataset.strftime, dtype=h5py.special_dtype(vlen=str)))
+    del project.db.attrs['schema_version']
+    project.load_projet(project.filename)
+
+    wldset = project.get_wldset('dataset')
+    assert project.db['wldsets/dataset/Time'].dtype == np.dtype('int64')
+    assert (wldset.data.index == wldataset.data.index).all()
+
+    # Save the time as integer Excel numeric dates and assert that they
+    # are not mistaken for int64 epoch values.
+    grp = project.db['wldsets/dataset']
+    del grp['Time']
+    grp.create_dataset('Time', data=np.floor(wldataset.xldates).astype(int))
+    del project.db.attrs['schema_version']
+    project.load_projet(project.filename)
+
+    wldset = project.get_wldset('dataset')
+    assert project.db['wldsets/dataset/Time'].attrs['format'] == 'epoch_ns'
+    assert (wldset.data.index == wldataset.data.index.floor('D')).all()
+
+
+def test_wldset_data_window(project, wldataset):
+    """
+    Test that reading a time window of a water level dataset is working
+    as expected and does not load the whole dataset in memory.
+    """
+    project.add_wldset('dataset', wldataset)
+    wldset = project.get_wldset('dataset')
+
+    xldates = wldataset.xldates
+    for tmin, tmax in [(xldates[3], xldates[7]),
+                       (xldates[3] - 0.001, xldates[7] + 0.001),
+                       (xldates[0] - 10, xldates[-1] + 10),
+                       (xldates[-1] + 1, xldates[-1] + 10)]:
+        window = wldset.get_data_window(tmin, tmax)
+        assert wldset._dataf is None
+
+        expected = wldataset.get_data_window(tmin, tmax)
+        assert (window.index == expected.index).all()
+        assert np.array_equal(window['WL'].values, expected['WL'].values)
+        assert np.array_equal(window['BP'].values, expected['BP'].values)
+    assert len(wldset.get_data_window(xldates[3], xldates[7])) == 5
+    assert wldset.get_xldate_bounds() == (xldates[0], xldates[-1])
+    assert wldset._dataf is None
+
+    # Assert that the whole dataset is loaded when needed.
+    assert np.array_equal(wldset.waterlevels, wldataset.waterlevels)
+    assert wldset._dataf is not None
+
+
+def test_wldset_lod_pyramid(project, wldataset):
+    """
+    Test that the level of detail pyramid of a water level dataset is
+    cached in the project and rebuilt when changes are commited.
+    """
+    project.add_wldset('dataset', wldataset)
+    wldset = project.get_wldset('dataset')
+    assert 'lod' not in project.db['wldsets/dataset']
+
+    wldset.get_lod_pyramid()
+    assert 'lod' in project.db['wldsets/dataset']
+    time, wl = wldset.get_lod_data(
+        wldataset.xldates[0], wldataset.xldates[-1], 1000)
+    assert np.array_equal(wl, wldataset.waterlevels)
+
+    # Assert that the range of the water levels is taken from the
+    # coarsest level of the pyramid.
+    expected = (np.nanmin(wldataset.waterlevels),
+                np.nanmax(wldataset.waterlevels))
+    assert wldset.get_waterlevel_bounds() == expected
+    wldset._lod_pyramid = MinMaxPyramid.build(
+        wldataset.xldates, wldataset.waterlevels, minsize=10)
+    assert len(wldset._lod_pyramid) > 0
+    assert wldset.get_waterlevel_bounds() == expected
+    wldset._lod_pyramid = None
+
+    # Assert that uncommited changes are shown in the plotted data.
+    wldset.delete_waterlevels_at([3, 4])
+    time, wl = wldset.get_lod_data(
+        wldataset.xldates[0], wldataset.xldates[-1], 1000)
+    assert np.isnan(wl[3]) and np.isnan(wl[4])
+
+    wldset.commit()
+    assert 'lod' not in project.db['wldsets/dataset']
+
+
+def test_wldset_commit(project, wldataset):
+    """
+    Test that the changes made to the water level data are commited to the
+    project as expected.
+    """
+    project.add_wldset('dataset', wldataset)
+    wldset = project.get_wldset('dataset')
+    wldset.save_corrected_waterlevels(wldataset.waterlevels + 1)
+    wldset.delete_waterlevels_at([3, 4, 5, 10])
+    wldset.delete_waterlevels_at([8])
+    wldset.undo()
+    wldset.commit()
+    assert not wldset.has_uncommited_changes
+
+    expected_wl = wldataset.waterlevels.copy()
+    expected_wl[[3, 4, 5, 10]] = np.nan
+    np.testing.assert_array_equal(
+        project.db['wldsets/dataset/WL'][...], expected_wl)
+
+    # Assert that the corrected water levels were deleted too.
+    np.testing.assert_array_equal(
+        wldset.get_corrected_waterlevels(), expected_wl + 1)
+
+
+def test_wldset_corrected_waterlevels(project, wldataset):
+    """
+    Test that the corrected water levels can be used instead of the
+    measured water levels in the data of a water level dataset.
+    """
+    project.add_wldset('dataset', wldataset)
+    wldset = project.get_wldset('dataset')
+    xldates = wldataset.xldates
+    expected_wl = wldataset.waterlevels
+
+    # Assert that the measured water levels are used when no corrected
+    # water levels were computed for the dataset.
+    assert not wldset.has_corrected_waterlevels()
+    assert np.array_equal(wldset.get_waterlevels(True), expected_wl)
+    assert 'WLc' not in wldset.get_data_window(xldates[0], xldates[-1])
+
+    wldset.save_corrected_waterlevels(expected_wl + 1)
+    assert wldset.has_corrected_waterlevels()
+    assert np.array_equal(wldset.get_waterlevels(True), expected_wl + 1)
+    assert np.array_equal(wldset.get_waterlevels(), expected_wl)
+    assert wldset.get_waterlevel_bounds(True) == (
+        np.nanmin(expected_wl) + 1, np.nanmax(expected_wl) + 1)
+
+    time, wl = wldset.get_lod_data(xldates[0], xldates[-1], 1000, True)
+    assert np.array_equal(wl, expected_wl + 1)
+    window = wldset.get_data_window(xldates[3], xldates[7])
+    assert np.array_equal(window['WLc'].values, expected_wl[3:8] + 1)
+    data = wldset.get_regularized_data('1D')
+    assert np.allclose(data['WLc'].values, data['WL'].values + 1,
+                       equal_nan=True)
+
+    # Assert that the uncommited deletions are applied to the corrected
+    # water levels too.
+    wldset.delete_waterlevels_at([3, 4])
+    time, wl = wldset.get_lod_data(xldates[0], xldates[-1], 1000, True)
+    assert np.isnan(wl[3]) and np.isnan(wl[4])
+    wldset.undo()
+    time, wl = wldset.get_lod_data(xldates[0], xldates[-1], 1000, True)
+    assert np.array_equal(wl, expected_wl + 1)
+
+
+def test_wldset_append_data(project, wldataset):
+    """
+    Test that appending new data to a water level dataset saved in the
+    project is working as expected when the new data overlap the old ones.
+    """
+    project.add_wldset('dataset', wldataset)
+
+    # Keep only some of the samples in the project to simulate a dataset
+    # that was created from an older logger download.
+    grp = project.db['wldsets/dataset']
+    keep = [0, 1, 2, 5, 6, 7]
+    for name in ['Time', 'WL', 'BP', 'ET']:
+        values = grp[name][...][keep]
+        del grp[name]
+        grp.create_dataset(name, data=values)
+
+    wldset = project.get_wldset('dataset')
+    wldset.set_mrc(1, 1, [1, 4], wldset.xldates, np.arange(6))
+    wldset.get_lod_pyramid()
+    wldset.save_corrected_waterlevels(np.arange(6))
+    assert len(wldset.data) == 6
+
+    # Append the full dataset.
+    assert wldset.append_data(wldataset) == 9
+    assert wldset.append_data(wldataset) == 0
+    assert 'lod' not in grp
+    assert wldset.get_corrected_waterlevels() is None
+    assert grp['WL'].maxshape == (None,)
+    assert (wldset.data.index == wldataset.data.index).all()
+    assert np.array_equal(wldset.waterlevels, wldataset.waterlevels)
+    assert np.allclose(wldset['mrc/time'], wldataset.xldates)
+    assert np.array_equal(wldset['mrc/peak_indx'], [1, 6])
+    assert np.array_equal(wldset['mrc/recess'][keep], np.arange(6))
+    assert np.isnan(wldset['mrc/recess'][[3, 4] + list(range(8, 15))]).all()
+
+
+def test_wldset_append_data_tail(project, wldataset):
+    """
+    Test that appending new data after the last sample of a water level
+    dataset with a master recession curve is working as expected.
+    """
+    project.add_wldset('dataset', wldataset)
+    grp = project.db['wldsets/dataset']
+    for name in ['Time', 'WL', 'BP', 'ET']:
+        values = grp[name][...][:6]
+        del grp[name]
+        grp.create_dataset(name, data=values)
+
+    wldset = project.get_wldset('dataset')
+    wldset.set_mrc(1, 1, [1, 4], wldset.xldates, np.arange(6))
+    assert wldset.append_data(wldataset) == len(wldataset.data) - 6
+    assert (wldset.data.index == wldataset.data.index).all()
+    assert np.array_equal(wldset['mrc/peak_indx'], [1, 4])
+    assert np.allclose(wldset['mrc/time'], wldataset.xldates)
+    assert np.array_equal(wldset['mrc/recess'][:6], np.arange(6))
+    assert np.isnan(wldset['mrc/recess'][6:]).all()
+
+
+def test_wlmeas_index(project, tmpdir):
+    """
+    Test that the manual water level measurements are indexed by well in
+    the project and that the index is updated when the file changes.
+    """
+    filename = osp.join(str(tmpdir), 'waterlvl_manual_measurements.csv')
+    save_content_to_csv(filename, [
+        ['Well_ID', 'Time (days)', 'Obs. (mbgs)'],
+        ['Test', 40842.54167, 1.6],
+        ['Test2', 41402.34375, 3.56],
+        ['Test', 40623.54167, 1.43]])
+
+    time, wl = project.get_wlmeas(filename, 'Test')
+    assert np.array_equal(time, [40623.54167, 40842.54167])
+    assert np.array_equal(wl, [1.43, 1.6])
+    time, wl = project.get_wlmeas(filename, 'Dummy')
+    assert len(time) == 0 and len(wl) == 0
+
+    # Save the names of the wells as bytes, as they are read with h5py 3,
+    # and assert that the index can still be read and updated.
+    grp = project.db['wlmeas']
+    wells = [name.encode('utf-8') for name in grp['wells'][...]]
+    del grp['wells']
+    grp.create_dataset(
+        'wells', data=wells, dtype=h5py.special_dtype(vlen=bytes))
+    time, wl = project.get_wlmeas(filename, 'Test')
+    assert np.array_equal(wl, [1.43, 1.6])
+
+    # Append new measurements at the end of the file.
+    save_content_to_csv(filename, [
+        ['Test', 41065.54167, 1.57],
+        ["é@#^'", 41240.8125, 3.75]], mode='a')
+    nbytes = project.db['wlmeas'].attrs['nbytes']
+    time, wl = project.get_wlmeas(filename, 'Test')
+    assert project.db['wlmeas'].attrs['nbytes'] > nbytes
+    assert np.array_equal(time, [40623.54167, 40842.54167, 41065.54167])
+    assert np.array_equal(wl, [1.43, 1.6, 1.57])
+    time, wl = project.get_wlmeas(filename, "é@#^'")
+    assert np.array_equal(time, [41240.8125])
+    time, wl = project.get_wlmeas(filename, 'Test2')
+    assert np.array_equal(wl, [3.56])
+
+    # Rewrite the file completely.
+    save_content_to_csv(filename, [
+        ['Well_ID', 'Time (days)', 'Obs. (mbgs)'],
+        ['Test2', 41402.34375, 3.56]])
+    time, wl = project.get_wlmeas(filename, 'Test')
+    assert len(time) == 0 and len(wl) == 0
+    time, wl = project.get_wlmeas(filename, 'Test2')
+    assert np.array_equal(wl, [3.56])
+
+
+def test_wxdset_time_storage(project, wxdataset):
+    """
+    Test that the time of weather datasets are saved as int64 epoch
+    values in the project and that older datasets are migrated correctly.
+    """
+    project.add_wxdset('dataset', wxdataset)
+    assert project.db['wxdsets/dataset/Time'].dtype == np.dtype('int64')
+
+    wxdset = project.get_wxdset('dataset')
+    assert (wxdset.data.index == wxdataset.data.index).all()
+
+    # Save the time as ISO date strings as it was done in older versions.
+    grp = project.db['wxdsets/dataset']
+    del grp['Time']
+    grp.create_dataset('Time', data=np.array(
+        wxdataset.strftime(), dtype=h5py.special_dtype(vlen=str)))
+    # Note that the strings are saved as bytes for the missing data, since
+    # they are read back as bytes with h5py 3.
+    del grp['Missing Tavg']
+    grp.create_dataset('Missing Tavg', data=np.array(
+        [b'2000-11-05T00:00:00', b'2000-11-06T00:00:00'],
+        dtype=h5py.special_dtype(vlen=bytes)))
+    del project.db.attrs['schema_version']
+    project.load_projet(project.filename)
+
+    wxdset = project.get_wxdset('dataset')
+    assert project.db['wxdsets/dataset/Time'].dtype == np.dtype('int64')
+    assert (wxdset.data.index == wxdataset.data.index).all()
+    assert (wxdset.missing_value_indexes['Tavg'].strftime('%Y-%m-%d') ==
+            ['2000-11-05', '2000-11-06']).all()
+
+
+def test_wxdsets_catalog(project, wxdataset):
+    """
+    Test that the catalog of the weather stations of a project returns the
+    same stations as a brute-force search and is kept up to date.
+    """
+    np.random.seed(0)
+    lats = np.random.uniform(44, 50, 25)
+    lons = np.random.uniform(-80, -62, 25)
+    for i, (lat, lon) in enumerate(zip(lats, lons)):
+        wxdataset.metadata['Latitude'] = lat
+        wxdataset.metadata['Longitude'] = lon
+        project.add_wxdset('station{:02d}'.format(i), wxdataset)
+    names = ['station{:02d}'.format(i) for i in range(25)]
+    assert np.allclose(project.get_wxdsets_lat(), lats)
+    assert np.allclose(project.get_wxdsets_lon(), lons)
+
+    dists = calc_dist_from_coord(46.8, -71.2, lats, lons)
+    closest, closest_dists = project.get_closest_wxdsets(46.8, -71.2, k=3)
+    assert closest == [names[i] for i in np.argsort(dists)[:3]]
+    assert np.allclose(closest_dists, np.sort(dists)[:3])
+
+    within, within_dists = project.get_wxdsets_within(46.8, -71.2, 150)
+    assert within == [names[i] for i in np.argsort(dists) if dists[i] <= 150]
+    assert np.allclose(within_dists, np.sort(dists[dists <= 150]))
+
+    # Assert that the catalog is updated when a dataset is deleted.
+    project.del_wxdset(closest[0])
+    assert project.get_closest_wxdsets(46.8, -71.2)[0] == [closest[1]]
+    assert len(project.db['wxcatalog/name']) == 24
+
+    # Assert that the catalog is rebuilt when it is missing in the project.
+    del project.db['wxcatalog']
+    project.load_projet(project.filename)
+    assert project.get_closest_wxdsets(46.8, -71.2)[0] == [closest[1]]
+    assert 'wxcatalog' in project.db
+
+    # Assert that the names of the catalog are decoded when they are read
+    # as bytes and that deleted stations are removed from the catalog.
+    catalog_names = project._read_wxdsets_catalog()[0]
+    del project.db['wxcatalog/name']
+    project.db['wxcatalog'].create_dataset(
+        'name', data=[name.encode('utf-8') for name in catalog_names],
+        dtype=h5py.special_dtype(vlen=bytes), maxshape=(None,))
+    project.load_projet(project.filename)
+    assert isinstance(project.db['wxcatalog/name'][0], bytes)
+    assert np.allclose(project.get_wxdsets_lat(), np.delete(
+        lats, names.index(closest[0])))
+    project.del_wxdset(closest[1])
+    assert closest[1] not in project._read_wxdsets_catalog()[0]
+    assert project.get_closest_wxdsets(46.8, -71.2)[0] == [closest[2]]
+
+    # Assert that the catalog is rebuilt when its stations do not match
+    # the weather datasets of the project, even if their number is the same.
+    project.db['wxdsets'].move(closest[2], 'renamed')
+    project.load_projet(project.filename)
+    assert project.get_closest_wxdsets(46.8, -71.2)[0] == ['renamed']
+    assert sorted(project.db['wxcatalog/name'][...].tolist()) == sorted(
+        project.wxdsets)
+
+
+def test_gapfill_wxdsets(project, wxdataset):
+    """
+    Test that the missing data of the weather datasets are filled from the
+    neighbour weather datasets and saved in the project.
+    """
+    np.random.seed(0)
+    index = pd.date_range('2000-01-01', '2002-12-31', freq='D')
+    tavg = 10 - 15 * np.cos(2 * np.pi * index.dayofyear / 365)
+    ptot = np.random.exponential(3, len(index))
+    variables = ['Tmax', 'Tmin', 'Tavg', 'Ptot']
+    expected = pd.DataFrame(
+        {'Tmax': tavg + 5, 'Tmin': tavg - 5, 'Tavg': tavg, 'Ptot': ptot,
+         'Rain': ptot, 'Snow': 0, 'PET': 1},
+        index=index, columns=METEO_VARIABLES)
+    missing = index[100:200]
+    for i in range(3):
+        noise = np.random.normal(0, 0.1, len(index))
+        data = expected.copy()
+        data[['Tmax', 'Tmin', 'Tavg']] += noise[:, None] if i else 0
+        if i == 0:
+            data.loc[missing, variables] = 0
+        project.add_wxdset('station{}'.format(i), VirtualWXDataFrame(
+            wxdataset.metadata, data,
+            {var: missing if i == 0 else pd.DatetimeIndex([]) for
+             var in METEO_VARIABLES}))
+    project.get_wxdset('station0').set_pet_method('oudin')
+    pet = project.db['wxdsets/station0/pet/oudin'][...]
+
+    filled = project.gapfill_wxdsets()
+    assert filled == {'station0': 6 * len(missing), 'station1': 0,
+                      'station2': 0}
+
+    wxdset = project.get_wxdset('station0')
+    for var in variables:
+        assert np.allclose(wxdset.data.loc[missing, var],
+                           expected.loc[missing, var], atol=0.5)
+        assert wxdset.missing_value_indexes[var].equals(missing)
+    assert np.array_equal(wxdset.data['Tavg'].values[:100],
+                          expected['Tavg'].values[:100])
+
+    # Assert that the potential evapotranspiration was computed again.
+    assert wxdset.get_pet_method() == 'oudin'
+    assert not np.allclose(wxdset.data['PET'].values[100:200],
+                           pet[100:200])
+    assert np.array_equal(wxdset.data['PET'].values[:100], pet[:100])
+
+
+def test_virtual_wxdsets(project, wldataset, wxdataset, mocker):
+    """
+    Test that the virtual weather datasets of the wells are interpolated
+    from their nearest weather datasets and cached in the project.
+    """
+    for i, lon in enumerate([-72, -73, -80]):
+        wxdataset.metadata['Latitude'] = 45
+        wxdataset.metadata['Longitude'] = lon
+        wxdataset.metadata['Station Name'] = 'Station{}'.format(i)
+        project.add_wxdset('station{}'.format(i), wxdataset)
+    for name, lon in [('well1', -72.4), ('well2', -79)]:
+        project.add_wldset(name, wldataset)
+        attrs = project.db['wldsets'][name].attrs
+        attrs['Latitude'] = 45
+        attrs['Longitude'] = lon
+        attrs['Elevation'] = wxdataset.metadata['Elevation']
+
+    virtual_wxdsets = project.get_virtual_wxdsets(k=2)
+    assert list(virtual_wxdsets.keys()) == ['well1', 'well2']
+    assert virtual_wxdsets['well1'].metadata['Location'] == (
+        'Station0, Station1')
+    assert virtual_wxdsets['well2'].metadata['Location'] == (
+        'Station2, Station1')
+    assert np.allclose(virtual_wxdsets['well1'].data['Tavg'].values,
+                       wxdataset.data['Tavg'].values)
+    assert 'virtual_wxdsets/well1' in project.db
+
+    # Assert that the virtual weather datasets are read from the project.
+    mocked_create = mocker.patch(
+        'gwhat.projet.reader_projet.create_virtual_wxdsets')
+    virtual_wxdsets = project.get_virtual_wxdsets(['well1'], k=2)
+    assert mocked_create.call_count == 0
+    assert list(virtual_wxdsets.keys()) == ['well1']
+    mocker.stopall()
+
+    # Assert that the virtual weather datasets are updated when the
+    # parameters or the weather datasets of the project change.
+    project.get_virtual_wxdsets(['well1'], k=3)
+    assert project.db['virtual_wxdsets/well1'].attrs['idw_k'] == 3
+    assert 'virtual_wxdsets/well2' in project.db
+
+    project.del_wldset('well2')
+    assert 'virtual_wxdsets/well2' not in project.db
+
+    project.del_wxdset('station2')
+    assert 'virtual_wxdsets' not in project.db
+
+
+def test_wxdset_normals(project, wxdataset):
+    """
+    Test that the tables used to compute the normals of weather datasets
+    are saved in the project and updated when the PET method changes.
+    """
+    project.add_wxdset('dataset', wxdataset)
+    wxdset = project.get_wxdset('dataset')
+    assert 'cumsums' not in project.db['wxdsets/dataset']
+
+    expected = wxdataset.get_monthly_normals()
+    assert np.allclose(wxdset.get_monthly_normals().values, expected.values)
+    assert 'cumsums' in project.db['wxdsets/dataset']
+
+    # Assert that the tables are read from the project.
+    wxdset = project.get_wxdset('dataset')
+    tables = wxdset.get_cumsum_tables()
+    assert tables['first_year'] == wxdataset.get_cumsum_tables()['first_year']
+    assert np.allclose(wxdset.get_monthly_normals().values, expected.values)
+
+    # Assert the tables are updated when the PET method changes.
+    wxdset.set_pet_method('oudin')
+    assert 'cumsums' not in project.db['wxdsets/dataset']
+    normals = wxdset.get_monthly_normals()
+    assert np.allclose(normals['PET'].values, wxdset.data['PET'].groupby(
+        [wxdset.data.index.year, wxdset.data.index.month]).mean()
+        .groupby(level=1).mean().values)
+
+
+def test_wxdset_pet_method(project, wxdataset, mocker):
+    """
+    Test that the potential evapotranspiration of weather datasets can be
+    computed with different methods and that it is cached in the project.
+    """
+    project.add_wxdset('dataset', wxdataset)
+    wxdset = project.get_wxdset('dataset')
+    assert wxdset.get_pet_method() == ''
+    imported_pet = wxdset.data['PET'].values.copy()
+
+    wxdset.set_pet_method('hargreaves')
+    assert wxdset.get_pet_method() == 'hargreaves'
+    hargreaves_pet = wxdset.data['PET'].values.copy()
+    assert not np.allclose(hargreaves_pet, imported_pet)
+
+    # Assert that the PET is read from the project when it was already
+    # computed for a method.
+    wxdset.set_pet_method('oudin')
+    mocked_calcul_pet = mocker.patch(
+        'gwhat.projet.reader_projet.calcul_pet')
+    wxdset.set_pet_method('hargreaves')
+    assert mocked_calcul_pet.call_count == 0
+    assert np.array_equal(wxdset.data['PET'].values, hargreaves_pet)
+
+    # Assert that the PET method is remembered when reading the dataset.
+    wxdset = project.get_wxdset('dataset')
+    assert wxdset.get_pet_method() == 'hargreaves'
+    assert np.array_equal(wxdset.data['PET'].values, hargreaves_pet)
+
+    wxdset.set_pet_method('')
+    assert np.array_equal(wxdset.data['PET'].values, imported_pet)
+    with pytest.raises(ValueError):
+        wxdset.set_pet_method('dummy')
+
+
+def test_project_readonly(project, wldataset, wxdataset, tmpdir):
+    """
+    Test that projects are migrated once to the current schema version and
+    that they can be read afterwards without writing to the project file.
+    """
+    filename = project.filename
+    project.add_wldset('well1', wldataset)
+    project.add_wxdset('station1', wxdataset)
+    project.add_wxdset('station2', wxdataset)
+    assert project.db.attrs['schema_version'] == SCHEMA_VERSION
+    del project.db.attrs['schema_version']
+    del project.db['wxcatalog']
+    project.close()
+
+    # Assert that projects need to be migrated before they can be opened
+    # in read-only mode.
+    with pytest.raises(ValueError):
+        ProjetReader(filename, mode='r')
+
+    project.load_projet(filename)
+    assert project.db.attrs['schema_version'] == SCHEMA_VERSION
+    assert 'wxcatalog' in project.db
+    project.close()
+
+    with open(filename, 'rb') as f:
+        content = f.read()
+    wlmeas_filename = osp.join(str(tmpdir), 'waterlvl_manual_measurements.csv')
+    save_content_to_csv(wlmeas_filename, [
+        ['Well_ID', 'Time (days)', 'Obs. (mbgs)'],
+        ['well1', 40842.54167, 1.6]])
+
+    project = ProjetReader(filename, mode='r')
+    assert project.readonly
+    project2 = ProjetReader(filename, mode='r')
+    assert project2.wldsets == ['well1']
+    project2.close()
+
+    wldset = project.get_wldset('well1')
+    assert (wldset.data.index == wldataset.data.index).all()
+    assert wldset.get_lod_pyramid() is not None
+    wxdset = project.get_wxdset('station1')
+    assert (wxdset.data.index == wxdataset.data.index).all()
+    assert 'first_year' in wxdset.get_cumsum_tables()
+    assert project.get_closest_wxdsets(
+        wldset['Latitude'], wldset['Longitude'])[0][0] in project.wxdsets
+    time, wl = project.get_wlmeas(wlmeas_filename, 'well1')
+    assert np.array_equal(wl, [1.6])
+    assert len(project.get_virtual_wxdsets(k=1)) == 1
+    project.close(repack=True)
+
+    with open(filename, 'rb') as f:
+        assert f.read() == content
+
+
+def test_brf_migration_readonly(project, wldataset):
+    """
+    Test that the BRF results saved in the older formats are migrated with
+    the project, so that they can be read afterwards in read-only mode.
+    """
+    filename = project.filename
+    project.add_wldset('well1', wldataset)
+    grp = project.db['wldsets/well1/brf'].create_group('1')
+    grp['lag'] = np.arange(3) / 96
+    grp['A'] = [0.3, 0.4, 0.45]
+    grp['err'] = [0.01, 0.02, 0.03]
+    grp['date start'] = [2017, 7, 7, 10, 45]
+    grp['date end'] = [2017, 9, 25, 21, 45]
+    del project.db.attrs['schema_version']
+    project.close()
+
+    project.load_projet(filename)
+    assert project.db.attrs['schema_version'] == SCHEMA_VERSION
+    project.close()
+    with open(filename, 'rb') as f:
+        content = f.read()
+
+    project = ProjetReader(filename, mode='r')
+    brf = project.get_wldset('well1').get_brf('1')
+    assert np.allclose(brf['Lag'].values, np.arange(3) / 96)
+    assert np.allclose(brf['SumA'].values, [0.3, 0.4, 0.45])
+    assert np.allclose(brf['sdA'].values, [0.01, 0.02, 0.03])
+    assert 'A' not in brf.columns
+    assert brf.date_start == datetime.datetime(2017, 7, 7, 10, 45)
+    assert brf.date_end == datetime.datetime(2017, 9, 25, 21, 45)
+    assert brf.detrending == ''
+    project.close()
+
+    with open(filename, 'rb') as f:
+        assert f.read() == content
+
+
+if __name__ == "__main__":
+    pytest.main(['-x', os.path.basename(__file__), '-v', '-rw'])
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © GWHAT Project Contributors
+# https://github.com/jnsebgosselin/gwhat
+#
+# This file is part of GWHAT (Ground-Water Hydrograph Analysis Toolbox).
+# Licensed under the terms of the GNU General Public License.
+
+# ---- Standard library imports
+import os
+import os.path as osp
+
+# ---- Third party imports
+import h5py
+import numpy as np
+import pytest
+
+# ---- Local library imports
+from gwhat.meteo.weather_reader import WXDataFrame
+from gwhat.projet.reader_waterlvl import WLDataFrame
+from gwhat.projet.reader_projet import ProjetReader
+from gwhat.projet.storage import (
+    calcul_chunk_shape, calcul_project_freespace, create_h5dataset,
+    get_storage_policy, is_repack_needed, rewrite_project_storage,
+    FREED_SPACE_ATTR, MIN_CHUNKED_SIZE, REPACK_MIN_FREESPACE)
+
+DATADIR = osp.join(osp.dirname(osp.realpath(__file__)), 'data')
+WXFILENAME = osp.join(DATADIR, 'sample_weather_datafile.out')
+WLFILENAME = osp.join(DATADIR, 'sample_water_level_datafile.csv')
+
+NO_COMPRESSION = {'compression': None, 'compression_level': 0,
+                  'shuffle': False, 'chunk_length': 16384,
+                  'derived_float32': False}
+
+
+# ---- Pytest Fixtures
+@pytest.fixture
+def project(tmpdir):
+    project = ProjetReader(osp.join(str(tmpdir), "storage_test.gwt"))
+    project.add_wldset('well1', WLDataFrame(WLFILENAME))
+    project.add_wxdset('station1', WXDataFrame(WXFILENAME))
+    return project
+
+
+def read_datasets(filename):
+    """Return a dict with the data of the datasets of the project file."""
+    datasets = {}
+    with h5py.File(filename, 'r') as h5file:
+        def visit(name, obj):
+            if isinstance(obj, h5py.Dataset):
+                data = obj[...]
+                datasets[name] = (
+                    obj.dtype, obj.maxshape,
+                    data.tolist() if data.dtype.kind == 'O' else
+                    data.tobytes())
+        h5file.visititems(visit)
+    return datasets
+
+
+# ---- Tests
+def test_calcul_chunk_shape():
+    """
+    Test that the datasets are split in chunks along their time axis.
+    """
+    assert calcul_chunk_shape((100000,), (100000,), 8, 16384) == (16384,)
+    assert calcul_chunk_shape((5000,), (5000,), 8, 16384) == (5000,)
+    assert calcul_chunk_shape((0,), (None,), 8, 16384) == (MIN_CHUNKED_SIZE,)
+    assert calcul_chunk_shape((2, 50000), (2, 50000), 8, 16384) == (2, 16384)
+
+    # The chunks of the GLUE results are split along the axis of the models
+    # too when they are too large.
+    assert calcul_chunk_shape(
+        (1000, 20000), (1000, 20000), 8, 16384) == (8, 16384)
+
+
+def test_create_h5dataset(project):
+    """
+    Test that the numerical arrays are chunked and compressed and that the
+    derived results are saved in single precision when set in the policy.
+    """
+    policy = get_storage_policy()
+    assert policy['compression'] == 'gzip'
+
+    dset = project.db['wldsets/well1/WL']
+    assert dset.compression == 'gzip'
+    assert dset.shuffle
+    assert dset.chunks is not None
+    assert dset.maxshape == (None,)
+    assert project.db['wxdsets/station1/Time'].compression == 'gzip'
+
+    policy['derived_float32'] = True
+    policy['compression'] = 'lzf'
+    grp = project.db['wldsets/well1/glue'].create_group('1')
+    values = np.random.rand(2, MIN_CHUNKED_SIZE)
+    for name in ['recharge', 'Time']:
+        create_h5dataset(grp, name, values, policy=policy)
+    create_h5dataset(grp, 'count', 5, policy=policy)
+    create_h5dataset(grp, 'Station', 'station1', policy=policy)
+    assert grp['recharge'].dtype == np.float32
+    assert grp['recharge'].compression == 'lzf'
+    assert np.allclose(grp['recharge'][...], values)
+    assert grp['Time'].dtype == np.float64
+    assert grp['count'][()] == 5
+    # Variable-length strings are read as bytes with h5py 3.
+    station = grp['Station'][()]
+    if isinstance(station, bytes):
+        station = station.decode('utf-8')
+    assert station == 'station1'
+
+    # Assert that the small datasets are not chunked.
+    assert project.db['wldsets/well1/mrc/params'].chunks is None
+
+
+def test_rewrite_project_storage(project):
+    """
+    Test that the datasets of existing projects are rewritten with the
+    storage policy without altering their data.
+    """
+    filename = project.filename
+    project.close()
+    rewrite_project_storage(filename, NO_COMPRESSION)
+    expected = read_datasets(filename)
+    with h5py.File(filename, 'r') as h5file:
+        assert h5file['wldsets/well1/WL'].compression is None
+
+    size_before, size_after = rewrite_project_storage(filename)
+    assert size_after < size_before
+    assert not osp.exists(filename + '.rewrite')
+    datasets = read_datasets(filename)
+    assert datasets == expected
+    with h5py.File(filename, 'r') as h5file:
+        assert h5file['wldsets/well1/WL'].compression == 'gzip'
+
+    project = ProjetReader(filename)
+    assert len(project.get_wldset('well1').data) > 0
+    project.close()
+
+
+def test_repack_project(project):
+    """
+    Test that the space used by the objects deleted from the project is
+    reclaimed when the project is repacked.
+    """
+    filename = project.filename
+    project.add_wldset('well2', WLDataFrame(WLFILENAME))
+    grp = project.db['wldsets/well1/glue'].create_group('1')
+    create_h5dataset(grp, 'hydrograph',
+                     np.random.rand(10, REPACK_MIN_FREESPACE // 16))
+    project.close()
+    project.load_projet(filename)
+    assert not is_repack_needed(project.db)
+
+    # Assert that deleting the GLUE results does not shrink the file.
+    size_glue = osp.getsize(filename)
+    project.get_wldset('well1').del_glue('1')
+    project.close()
+    size_before = osp.getsize(filename)
+    assert size_before >= size_glue
+
+    project.load_projet(filename)
+    assert is_repack_needed(project.db)
+    expected = read_datasets(filename)
+    reclaimed = project.repack()
+    assert reclaimed > REPACK_MIN_FREESPACE
+    assert osp.getsize(filename) == size_before - reclaimed
+    assert project.db is not None
+    assert project.wldsets == ['well1', 'well2']
+    assert FREED_SPACE_ATTR not in project.db.attrs
+    assert not is_repack_needed(project.db)
+    project.close()
+    assert read_datasets(filename) == expected
+
+    # Assert that the project is repacked automatically when closed only
+    # when the space that is not used anymore is large enough.
+    size_after = osp.getsize(filename)
+    project.load_projet(filename)
+    grp = project.db['wldsets/well2/glue'].create_group('1')
+    create_h5dataset(grp, 'hydrograph',
+                     np.random.rand(10, REPACK_MIN_FREESPACE // 16))
+    project.close(repack=True)
+    assert osp.getsize(filename) > size_after + REPACK_MIN_FREESPACE
+
+    project.load_projet(filename)
+    project.del_wldset('well2')
+    project.close(repack=True)
+    assert osp.getsize(filename) < size_after
+    assert not osp.exists(filename + '.rewrite')
+
+
+def test_repack_not_needed_without_deletions(tmpdir):
+    """
+    Test that a project file with many small resizable datasets is not
+    repacked when no object was deleted from it.
+    """
+    filename = osp.join(str(tmpdir), "no_deletions.gwt")
+    with h5py.File(filename, 'w') as h5file:
+        for i in range(800):
+            grp = h5file.create_group('dataset{}'.format(i))
+            for name in ['Time', 'WL', 'BP', 'ET', 'WLc', 'recess']:
+                create_h5dataset(grp, name, np.random.rand(50),
+                                 maxshape=(None,))
+        assert calcul_project_freespace(h5file) < REPACK_MIN_FREESPACE
+        assert not is_repack_needed(h5file)
+
+    rewrite_project_storage(filename)
+    with h5py.File(filename, 'r') as h5file:
+        assert not is_repack_needed(h5file)
+
+
+if __name__ == "__main__":
+    pytest.main(['-x', os.path.basename(__file__), '-v', '-rw'])
@@ -11,6 +11,7 @@ import os
 import os.path as osp
 
 # ---- Third Party Libraries Imports
+import numpy as np
 import pytest
 from PyQt5.QtCore import Qt
 
@@ -70,6 +71,25 @@ def test_hydrocalc_init(hydrocalc, mocker):
     assert hydrocalc
 
 
+
+def test_mrc_corrected_waterlevels(hydrocalc):
+    """
+    Test that the corrected water levels are used to evaluate the MRC when
+    they are selected.
+    """
+    hydrocalc.dmngr.set_current_wldset(hydrocalc.dmngr.wldsets[0])
+    wldset = hydrocalc.wldset
+    wldset.save_corrected_waterlevels(wldset.waterlevels + 1)
+
+    hydrocalc.MRC_wlseries.setCurrentIndex(1)
+    assert hydrocalc.use_corrected_wl
+    np.testing.assert_array_equal(
+        hydrocalc.water_lvl, wldset.waterlevels + 1)
+
+    hydrocalc.MRC_wlseries.setCurrentIndex(0)
+    np.testing.assert_array_equal(hydrocalc.water_lvl, wldset.waterlevels)
+
+
 if __name__ == "__main__":
     pytest.main(['-x', os.path.basename(__file__), '-v', '-rw'])
     # pytest.main()
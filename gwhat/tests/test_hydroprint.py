@@ -11,6 +11,7 @@ import os
 import os.path as osp
 
 # ---- Third Party Libraries Imports
+import numpy as np
 import pytest
 from PyQt5.QtCore import Qt
 
@@ -151,6 +152,7 @@ def test_graph_layout(hydroprint, mocker, qtbot):
     assert layout['legend_on'] is True
     assert layout['title_on'] is True
     assert layout['trend_line'] is False
+    assert layout['corrected_wl_on'] is False
     assert layout['wxdset'] == "MARIEVILLE"
     assert layout['WLmin'] == 3.75
     assert layout['WLscale'] == 0.25
@@ -206,6 +208,30 @@ def test_graph_layout(hydroprint, mocker, qtbot):
     assert hydroprint.datum_widget.currentText() == 'Ground Surface'
 
 
+def test_draw_trend_line(hydroprint):
+    """
+    Test that the trend line of the water levels is drawn over the whole
+    range of the data, even if the moving average window extends beyond
+    the data at its edges.
+    """
+    hydrograph = hydroprint.hydrograph
+    hydrograph.trend_line = 1
+    try:
+        hydrograph.draw_waterlvl()
+        tfilt, wlfilt = hydrograph.l1_ax2.get_data()
+        assert len(wlfilt) > 0
+        assert not np.any(np.isnan(np.asarray(wlfilt, dtype=float)))
+        # Assert that the daily resampled data are cached in the dataset.
+        assert len(hydrograph.wldset._regular_data) > 0
+
+        time, water_lvl = hydrograph.l2_ax2.get_data()
+        assert np.min(tfilt) <= np.min(time) + hydrograph.trend_MAW
+        assert np.max(tfilt) >= np.max(time) - hydrograph.trend_MAW
+    finally:
+        hydrograph.trend_line = 0
+        hydrograph.draw_waterlvl()
+
+
 def test_clear_hydrograph(hydroprint, mocker, tmp_path):
     """
     Test that the hydrograph is cleared correctly when the water level or
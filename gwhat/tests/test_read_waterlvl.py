@@ -15,13 +15,15 @@ import csv
 # ---- Third party imports
 import pytest
 import numpy as np
+import pandas as pd
 import xlsxwriter
 
 # ---- Local library imports
 from gwhat.common.utils import (save_content_to_excel, save_content_to_csv,
                                 delete_file)
 from gwhat.projet.reader_waterlvl import (
-        load_waterlvl_measures, init_waterlvl_measures, WLDataFrame)
+        load_waterlvl_measures, init_waterlvl_measures, WLDataFrame,
+        positions_to_runs, runs_to_positions, regularize_time_series)
 
 DATA = [['Well name = ', "êi!@':i*"],
         ['well id : ', '1234ABC'],
@@ -81,6 +83,86 @@ def test_reading_waterlvl(datatmpdir, ext):
     assert np.abs(np.min(df.xldates - expected_results['Time'])) < 10e-6
 
 
+def test_undo_waterlevel_changes(datatmpdir):
+    """
+    Test that deleting water level data and undoing the changes is
+    working as expected.
+    """
+    df = WLDataFrame(osp.join(datatmpdir, FILENAME + '.csv'))
+    expected_wl = df.waterlevels.copy()
+
+    df.delete_waterlevels_at([2, 0])
+    df.delete_waterlevels_at([1, 2])
+    assert np.isnan(df.waterlevels).all()
+    starts, lengths = df._get_changed_runs()
+    assert list(starts) == [0] and list(lengths) == [3]
+
+    df.undo()
+    assert np.isnan(df.waterlevels[[0, 2]]).all()
+    assert df.waterlevels[1] == expected_wl[1]
+
+    df.undo()
+    assert np.array_equal(df.waterlevels, expected_wl)
+    assert not df.has_uncommited_changes
+
+
+def test_positions_runs():
+    """Test the run length encoding of integer positions."""
+    positions = np.array([0, 1, 2, 5, 7, 8, 12])
+    starts, lengths = positions_to_runs(positions)
+    assert list(starts) == [0, 5, 7, 12]
+    assert list(lengths) == [3, 1, 2, 1]
+    assert np.array_equal(runs_to_positions(starts, lengths), positions)
+    assert len(runs_to_positions(*positions_to_runs([]))) == 0
+
+
+def test_regularize_time_series():
+    """
+    Test that resampling time series on a regular time grid is working
+    as expected for all filling methods.
+    """
+    data = pd.DataFrame(
+        {'WL': [1, 2, 4, np.nan, 7, 8], 'BP': [np.nan, 1, 1, 1, 1, 1]},
+        index=pd.to_datetime(['2000-01-01 00:00', '2000-01-01 00:15',
+                              '2000-01-01 00:45', '2000-01-01 01:00',
+                              '2000-01-01 02:00', '2000-01-01 02:07']))
+
+    expected_wl = {
+        'linear': [1, 2, 3, 4, 4.6, 5.2, 5.8, 6.4, 7],
+        'nearest': [1, 2, 2, 4, 4, 4, 7, 7, 7],
+        None: [1, 2, np.nan, 4, np.nan, np.nan, np.nan, np.nan, 7]}
+    for method in ['linear', 'nearest', None]:
+        regdata = regularize_time_series(data, '15min', method)
+        assert len(regdata) == 9
+        assert regdata.index[-1] == pd.Timestamp('2000-01-01 02:00')
+        np.testing.assert_array_equal(
+            regdata['WL'].values, expected_wl[method])
+        assert np.isnan(regdata['BP'].values[0])
+
+    # Assert that gaps longer than max_gap are not filled.
+    regdata = regularize_time_series(data, '15min', 'linear', max_gap='1H')
+    np.testing.assert_array_equal(
+        regdata['WL'].values, [1, 2, 3, 4] + [np.nan] * 4 + [7])
+    np.testing.assert_array_equal(regdata['BP'].values[1:], [1] * 8)
+
+
+def test_regularized_data_cache(datatmpdir):
+    """
+    Test that the regularized data of a water level dataset are cached and
+    updated when the water level data are changed.
+    """
+    df = WLDataFrame(osp.join(datatmpdir, FILENAME + '.csv'))
+    regdata = df.get_regularized_data('15min')
+    assert not regdata['WL'].isnull().any()
+    df.get_regularized_data('15min')
+    df.get_regularized_data('15min', 'nearest')
+    assert len(df._regular_data) == 2
+
+    df.delete_waterlevels_at([0, 1, 2])
+    assert len(df._regular_data) == 0
+    assert df.get_regularized_data('15min')['WL'].isnull().all()
+
+
 # Test water_level_measurements.
 # -------------------------------
 
@@ -12,13 +12,106 @@
 import h5py
 import numpy as np
 import pandas as pd
-import xlrd
 from xlrd import xldate_as_tuple
-from xlrd.xldate import xldate_as_datetime
-from PyQt5.QtCore import QDate, QDateTime
 
 
-def format_time_data(self, timedata):
+# The Excel numeric dates corresponding to the Unix epoch (1970-01-01) in
+# the 1900-based (datemode=0) and 1904-based (datemode=1) date systems.
+XLDATE_UNIX_EPOCH = {0: 25569, 1: 24107}
+MS_PER_DAY = 86400 * 1000
+NS_PER_DAY = 86400 * 10**9
+NAT_INT64 = np.iinfo('int64').min
+
+
+# ---- Vectorized date conversion
+def xldates_to_datetime64(xldates, datemode=0):
+    """
+    Convert a list or numpy array of Excel numeric dates to a numpy array
+    of datetime64[ns], using integer arithmetic only.
+
+    The result is rounded to the millisecond, the same as it is done in
+    xlrd.xldate.xldate_as_datetime. Missing values are converted to NaT.
+
+    A value of 0 is used if the workbook was created in Windows (1900-based),
+    while a value of 1 is used if it was created on macOS (1904-based).
+    """
+    xldates = np.asarray(xldates, dtype='float64')
+    isnan = np.isnan(xldates)
+    xldates = np.where(isnan, 0, xldates)
+
+    days = np.floor(xldates)
+    msecs = np.round((xldates - days) * MS_PER_DAY).astype('int64')
+    days = days.astype('int64') - XLDATE_UNIX_EPOCH[datemode]
+    if datemode == 0:
+        # Excel wrongly considers 1900 as a leap year, so that the dates
+        # before 1900-03-01 are shifted by one day.
+        days += (xldates < 60)
+
+    nsecs = days * NS_PER_DAY + msecs * 10**6
+    nsecs[isnan] = NAT_INT64
+    return nsecs.view('datetime64[ns]')
+
+
+def datetime64_to_xldates(datetimes, datemode=0):
+    """
+    Convert a list or numpy array of datetime64 to a numpy array of Excel
+    numeric dates, using integer arithmetic only. NaT are converted to nan.
+    """
+    nsecs = np.asarray(datetimes, dtype='datetime64[ns]').view('int64')
+    days, nsecs_of_day = np.divmod(nsecs, NS_PER_DAY)
+    if datemode == 0:
+        days = days - (days < 61 - XLDATE_UNIX_EPOCH[0])
+    xldates = (days + XLDATE_UNIX_EPOCH[datemode]).astype('float64')
+    xldates += nsecs_of_day / NS_PER_DAY
+    xldates[nsecs == NAT_INT64] = np.nan
+    return xldates
+
+
+def xldates_to_ymd(xldates, datemode=0):
+    """
+    Return the years, months and days arrays corresponding to a list or
+    numpy array of Excel numeric dates.
+
+    This is based on the 'civil_from_days' algorithm of Howard Hinnant
+    (http://howardhinnant.github.io/date_algorithms.html).
+    """
+    days = (xldates_to_datetime64(xldates, datemode)
+            .astype('datetime64[D]').view('int64'))
+    z = days + 719468
+    era = np.floor_divide(z, 146097)
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = np.where(mp < 10, mp + 3, mp - 9)
+    year = yoe + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def ymd_to_xldates(years, months, days, datemode=0):
+    """
+    Return the Excel numeric dates corresponding to the specified
+    years, months and days arrays.
+
+    This is based on the 'days_from_civil' algorithm of Howard Hinnant
+    (http://howardhinnant.github.io/date_algorithms.html).
+    """
+    years = np.asarray(years, dtype='int64')
+    months = np.asarray(months, dtype='int64')
+    days = np.asarray(days, dtype='int64')
+
+    years = years - (months <= 2)
+    era = np.floor_divide(years, 400)
+    yoe = years - era * 400
+    doy = (153 * np.where(months > 2, months - 3, months + 9) + 2) // 5
+    doy += days - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    datetimes = (era * 146097 + doe - 719468).view('datetime64[D]')
+    return datetime64_to_xldates(datetimes, datemode)
+
+
+def format_time_data(timedata):
     """
     Format a numpy array containing time data, either in a string or Excel
     numeric format, and return a pandas datetime index.
@@ -27,7 +120,7 @@ def format_time_data(self, timedata):
     try:
         # We first assume that the dates are stored in the
         # Excel numeric format.
-        timedata = timedata.astype('float64', errors='raise')
+        timedata = np.asarray(timedata).astype('float64')
     except ValueError:
         try:
             # Try converting the strings to datetime objects.
@@ -37,13 +130,7 @@ def format_time_data(self, timedata):
         except ValueError:
             print('WARNING: the dates are not formatted correctly.')
     else:
-        try:
-            # Try converting the Excel numeric dates to pandas
-            # datetime objects.
-            datetimes = pd.to_datetime(datetimes.apply(
-                lambda date: xlrd.xldate.xldate_as_datetime(date, 0)))
-        except Exception:
-            print('Warning: the dates are not formatted correctly.')
+        datetimes = xldates_to_datetimeindex(timedata)
     return datetimes
 
 
@@ -51,9 +138,7 @@ def datetimeindex_to_xldates(datetimeindex):
     """
     Convert a datetime index to a numpy array of Excel numerical date format.
     """
-    timedeltas = datetimeindex - xldate_as_datetime(4000, 0)
-    xldates = timedeltas.total_seconds() / (3600 * 24) + 4000
-    return xldates.values
+    return datetime64_to_xldates(datetimeindex.values)
 
 
 def xldates_to_datetimeindex(xldates):
@@ -61,8 +146,7 @@ def xldates_to_datetimeindex(xldates):
     Format a list or numpy array of Excel numeric dates into a
     pandas datetime index.
     """
-    return pd.to_datetime(
-        [xlrd.xldate.xldate_as_datetime(xldate, 0) for xldate in xldates])
+    return pd.DatetimeIndex(xldates_to_datetime64(xldates))
 
 
 def xldates_to_strftimes(xldates):
@@ -84,6 +168,9 @@ def qdate_from_xldate(xldate, datemode=0):
     A value of 0 is used of the workbook was created in Windows (1900-based),
     while a value of 1 is used if it was created on macOS (1904-based).
     """
+    # PyQt5 is imported here so that the non-gui date helpers of this
+    # module can be used without Qt installed.
+    from PyQt5.QtCore import QDate
     date_tuple = xldate_as_tuple(xldate, datemode)
     return QDate(date_tuple[0], date_tuple[1], date_tuple[2])
 
@@ -95,6 +182,7 @@ def qdatetime_from_xldate(xldate, datemode=0):
     A value of 0 is used of the workbook was created in Windows (1900-based),
     while a value of 1 is used if it was created on macOS (1904-based).
     """
+    from PyQt5.QtCore import QDateTime
     date_tuple = xldate_as_tuple(xldate, datemode)
     return QDateTime(date_tuple[0], date_tuple[1], date_tuple[2],
                      date_tuple[3], date_tuple[4])
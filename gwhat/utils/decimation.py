@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright © GWHAT Project Contributors
+# https://github.com/jnsebgosselin/gwhat
+#
+# This file is part of GWHAT (Ground-Water Hydrograph Analysis Toolbox).
+# Licensed under the terms of the GNU General Public License.
+# -----------------------------------------------------------------------------
+
+
+# ---- Third party imports
+import numpy as np
+
+
+class MinMaxPyramid(object):
+    """
+    A multi-resolution min/max decimation pyramid of a time series.
+
+    Each level of the pyramid splits the time series in buckets of
+    factor**level consecutive samples and keeps only the minimum and
+    maximum values of each bucket, in the order in which they occur.
+    When a bucket spans no more than one pixel of the axis where the data
+    are plotted, the decimated series is visually identical to the full
+    resolution series.
+    """
+
+    def __init__(self, levels, factor=4):
+        super(MinMaxPyramid, self).__init__()
+        # A list of the (x, y) arrays of each level of the pyramid, starting
+        # with level 1. Level 0 corresponds to the full resolution series,
+        # which is not stored in the pyramid.
+        self.levels = levels
+        self.factor = factor
+
+    @classmethod
+    def build(cls, x, y, factor=4, minsize=2000):
+        """
+        Build the min/max decimation pyramid of the time series x, y.
+
+        Levels are added to the pyramid until the number of decimated
+        points is smaller than minsize.
+        """
+        x = np.asarray(x, dtype='float64')
+        y = np.asarray(y, dtype='float64')
+        levels = []
+        while len(x) > minsize:
+            # Each bucket of the previous level is represented by two points,
+            # so that the buckets of the next level are formed by grouping
+            # 2 * factor points of the previous level.
+            x, y = minmax_decimate(x, y, 2 * factor if levels else factor)
+            levels.append((x, y))
+        return cls(levels, factor)
+
+    def __len__(self):
+        return len(self.levels)
+
+    def bucket_size(self, level):
+        """Return the number of samples in each bucket of the level."""
+        return 0 if level == 0 else self.factor**level
+
+    def get_level(self, xmin, xmax, npixels):
+        """
+        Return the coarsest level of the pyramid for which a bucket spans
+        no more than one pixel when the data between xmin and xmax are
+        plotted on an axis that is npixels wide.
+        """
+        if not len(self.levels) or npixels <= 0:
+            return 0
+        # We estimate the number of full resolution samples between
+        # xmin and xmax from the first level of the pyramid.
+        x = self.levels[0][0]
+        nsamples = (np.searchsorted(x, xmax, side='right') -
+                    np.searchsorted(x, xmin, side='left')) / 2
+        nsamples *= self.bucket_size(1)
+
+        level = 0
+        while (level < len(self.levels) and
+               self.bucket_size(level + 1) <= nsamples / npixels):
+            level += 1
+        return level
+
+    def get_data(self, level, xmin=None, xmax=None):
+        """
+        Return the x and y data of the specified level of the pyramid
+        between xmin and xmax, plus one point on each side, so that the
+        lines are drawn up to the edges of the axis.
+        """
+        x, y = self.levels[level - 1]
+        istart = (0 if xmin is None else
+                  max(np.searchsorted(x, xmin, side='left') - 1, 0))
+        iend = (len(x) if xmax is None else
+                np.searchsorted(x, xmax, side='right') + 1)
+        return x[istart:iend], y[istart:iend]
+
+
+def minmax_decimate(x, y, bucket_size):
+    """
+    Split the time series x, y in buckets of the specified number of
+    consecutive samples and return the time series that is formed by the
+    minimum and maximum values of each bucket, in the order in which
+    they occur.
+
+    Buckets where all values are nan are kept as nan so that gaps in the
+    data are still shown in the graphs.
+    """
+    nbuckets = int(np.ceil(len(x) / bucket_size))
+    npad = nbuckets * bucket_size - len(x)
+    x = np.hstack([x, np.full(npad, x[-1])]).reshape(nbuckets, bucket_size)
+    y = np.hstack([y, np.full(npad, np.nan)]).reshape(nbuckets, bucket_size)
+
+    isnan = np.isnan(y)
+    imin = np.argmin(np.where(isnan, np.inf, y), axis=1)
+    imax = np.argmax(np.where(isnan, -np.inf, y), axis=1)
+    allnan = np.all(isnan, axis=1)
+    imin[allnan] = 0
+    imax[allnan] = 0
+
+    # Order the min and max values of each bucket in time.
+    ifirst = np.minimum(imin, imax)
+    ilast = np.maximum(imin, imax)
+    rows = np.arange(nbuckets)
+    xdec = np.vstack([x[rows, ifirst], x[rows, ilast]]).T.flatten()
+    ydec = np.vstack([y[rows, ifirst], y[rows, ilast]]).T.flatten()
+    return xdec, ydec
@@ -9,6 +9,8 @@
 import numpy as np
 import datetime
 
+from gwhat.utils.dates import xldates_to_ymd, ymd_to_xldates
+
 
 def calcul_rmse(Xobs, Xpre):
     """Compute the root-mean square error."""
@@ -37,6 +39,67 @@ def clip_time_series(tclip, tp, xp):
     return tp, xp
 
 
+def downsample_time_series(t, x, period='day', how='last'):
+    """
+    Downsample the time series t, x on a calendar period basis, where t is
+    an array of numerical Excel times. The period can be either 'day',
+    'month' or 'year' and the value of each period is either the 'last'
+    value measured during that period or the 'mean', 'min' or 'max' of the
+    values measured during that period, ignoring nan values.
+
+    Return the numerical Excel times corresponding to the start of each
+    period, from the first to the last period of the time series, and the
+    downsampled values. The value of a period where there is no measurement
+    at all is nan.
+    """
+    t = np.asarray(t, dtype='float64')
+    x = np.asarray(x, dtype='float64')
+    if len(t) == 0:
+        return np.array([]), np.array([])
+
+    argsort = np.argsort(t, kind='mergesort')
+    t = t[argsort]
+    x = x[argsort]
+
+    # Determine the calendar period of each measurement.
+    if period == 'day':
+        keys = np.floor(t).astype('int64')
+    elif period in ['month', 'year']:
+        years, months, _ = xldates_to_ymd(t)
+        keys = years * 12 + months - 1 if period == 'month' else years
+    else:
+        raise ValueError("The period must be 'day', 'month' or 'year'.")
+
+    # Find the index of the first and last measurement of each period.
+    ukeys, ifirst = np.unique(keys, return_index=True)
+    ilast = np.hstack([ifirst[1:], len(keys)]) - 1
+
+    if how == 'last':
+        values = x[ilast]
+    elif how == 'min':
+        values = np.fmin.reduceat(x, ifirst)
+    elif how == 'max':
+        values = np.fmax.reduceat(x, ifirst)
+    elif how == 'mean':
+        isvalid = ~np.isnan(x)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = (np.add.reduceat(np.where(isvalid, x, 0), ifirst) /
+                      np.add.reduceat(isvalid.astype('int64'), ifirst))
+    else:
+        raise ValueError("The method must be 'last', 'mean', 'min' or 'max'.")
+
+    allkeys = np.arange(keys[0], keys[-1] + 1)
+    xp = np.full(len(allkeys), np.nan)
+    xp[ukeys - keys[0]] = values
+    if period == 'day':
+        tp = allkeys
+    elif period == 'month':
+        tp = ymd_to_xldates(allkeys // 12, allkeys % 12 + 1, 1)
+    elif period == 'year':
+        tp = ymd_to_xldates(allkeys, 1, 1)
+    return tp, xp
+
+
 def convert_date_to_datetime(years, months, days):
     """
     Produce datetime series from years, months, and days series.
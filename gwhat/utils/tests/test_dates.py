@@ -10,10 +10,15 @@
 import os
 
 # ---- Third party imports
+import numpy as np
+import pandas as pd
 import pytest
+from xlrd.xldate import xldate_as_datetime
 
 # ---- Local imports
-from gwhat.utils.dates import qdate_from_xldate
+from gwhat.utils.dates import (
+    qdate_from_xldate, xldates_to_datetimeindex, datetimeindex_to_xldates,
+    xldates_to_ymd, ymd_to_xldates)
 
 
 # ---- Tests
@@ -29,5 +34,44 @@ def test_qdate_from_xldate():
         assert qdate.year() == 2017
 
 
+def test_xldates_to_datetimeindex():
+    """
+    Assert that the vectorized conversion of Excel numeric dates to datetimes
+    gives the same results as xlrd and that the conversion back to Excel
+    numeric dates is working as expected.
+    """
+    xldates = np.hstack([np.arange(61, 100, 0.37),
+                         np.linspace(40000, 45000, 1000) + 0.123456789,
+                         [np.nan]])
+    expected = pd.to_datetime(
+        [xldate_as_datetime(xldate, 0) for xldate in xldates[:-1]])
+
+    datetimes = xldates_to_datetimeindex(xldates)
+    assert (datetimes[:-1] == expected).all()
+    assert pd.isnull(datetimes[-1])
+
+    results = datetimeindex_to_xldates(datetimes)
+    assert np.allclose(results[:-1], xldates[:-1], rtol=0, atol=1e-8)
+    assert np.isnan(results[-1])
+
+
+def test_xldates_to_ymd():
+    """
+    Assert that the vectorized conversion between Excel numeric dates and
+    years, months and days arrays is working as expected.
+    """
+    xldates = np.arange(61, 50000, 17) + 0.5
+    years, months, days = xldates_to_ymd(xldates)
+    expected = pd.to_datetime(
+        [xldate_as_datetime(xldate, 0) for xldate in xldates])
+    assert np.array_equal(years, expected.year)
+    assert np.array_equal(months, expected.month)
+    assert np.array_equal(days, expected.day)
+
+    assert np.array_equal(
+        ymd_to_xldates(years, months, days), np.floor(xldates))
+    assert ymd_to_xldates([2017], [9], [22])[0] == 43000
+
+
 if __name__ == "__main__":
     pytest.main(['-x', os.path.basename(__file__), '-v', '-rw'])
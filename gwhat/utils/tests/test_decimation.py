@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © GWHAT Project Contributors
+# https://github.com/jnsebgosselin/gwhat
+#
+# This file is part of GWHAT (Ground-Water Hydrograph Analysis Toolbox).
+# Licensed under the terms of the GNU General Public License.
+
+# ---- Standard imports
+import os
+
+# ---- Third party imports
+import numpy as np
+import pytest
+
+# ---- Local imports
+from gwhat.utils.decimation import MinMaxPyramid, minmax_decimate
+
+
+# ---- Tests
+def test_minmax_decimate():
+    """
+    Assert that the min and max values of each bucket are returned in the
+    order in which they occur and that empty buckets are kept as nan.
+    """
+    x = np.arange(10, dtype=float)
+    y = np.array([1, 5, 0, np.nan, np.nan, np.nan, 2, 9, 3, 4])
+    xdec, ydec = minmax_decimate(x, y, 3)
+    assert np.array_equal(xdec, [1, 2, 3, 3, 6, 7, 9, 9])
+    assert np.array_equal(ydec[[0, 1, 4, 5, 6, 7]], [5, 0, 2, 9, 4, 4])
+    assert np.all(np.isnan(ydec[[2, 3]]))
+
+
+def test_minmax_pyramid():
+    """
+    Assert that the levels of the pyramid are selected according to the
+    width of the axis and that the min and max values are preserved at
+    each level.
+    """
+    x = np.arange(100000) / 96
+    y = np.sin(x) + np.random.rand(len(x))
+    y[5000:7000] = np.nan
+    pyramid = MinMaxPyramid.build(x, y, factor=4, minsize=2000)
+    assert len(pyramid) == 4
+
+    # The full resolution data must be used when zoomed in enough.
+    assert pyramid.get_level(x[0], x[999], 1000) == 0
+    assert pyramid.get_level(x[0], x[3999], 1000) == 1
+    assert pyramid.get_level(x[0], x[-1], 1000) == 3
+
+    for level in range(1, len(pyramid) + 1):
+        xdec, ydec = pyramid.get_data(level)
+        assert np.nanmin(ydec) == np.nanmin(y)
+        assert np.nanmax(ydec) == np.nanmax(y)
+        assert np.all(np.diff(xdec) >= 0)
+        # Assert that the gap in the data is preserved.
+        assert np.all(np.isnan(ydec[(xdec > x[5300]) & (xdec < x[6700])]))
+
+    # Assert that the data returned for a window is bounded by one point
+    # outside of the window on each side.
+    xdec, ydec = pyramid.get_data(2, x[20000], x[30000])
+    assert xdec[0] < x[20000] and xdec[1] >= x[20000]
+    assert xdec[-1] > x[30000] and xdec[-2] <= x[30000]
+
+
+if __name__ == "__main__":
+    pytest.main(['-x', os.path.basename(__file__), '-v', '-rw'])
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © GWHAT Project Contributors
+# https://github.com/jnsebgosselin/gwhat
+#
+# This file is part of GWHAT (Ground-Water Hydrograph Analysis Toolbox).
+# Licensed under the terms of the GNU General Public License.
+
+# ---- Standard imports
+import os
+import subprocess
+import sys
+
+# ---- Third party imports
+import numpy as np
+import pytest
+
+# ---- Local imports
+from gwhat.utils.math import downsample_time_series
+from gwhat.utils.dates import ymd_to_xldates
+
+
+# ---- Tests
+def test_downsample_time_series_daily():
+    """
+    Assert that only the last measurement made on a given day is kept in the
+    daily time series and that days without any measurement are nan.
+    """
+    t = np.array([43101.75, 43101.25, 43102.5, 43104.1, 43104.9, 43104.5])
+    x = np.array([2, 1, np.nan, 4, 6, 5])
+
+    td, xd = downsample_time_series(t, x, 'day', 'last')
+    assert np.array_equal(td, [43101, 43102, 43103, 43104])
+    np.testing.assert_array_equal(xd, [2, np.nan, np.nan, 6])
+
+    td, xd = downsample_time_series(t, x, 'day', 'mean')
+    np.testing.assert_array_equal(xd, [1.5, np.nan, np.nan, 5])
+
+    td, xd = downsample_time_series(t, x, 'day', 'min')
+    np.testing.assert_array_equal(xd, [1, np.nan, np.nan, 4])
+
+    td, xd = downsample_time_series(t, x, 'day', 'max')
+    np.testing.assert_array_equal(xd, [2, np.nan, np.nan, 6])
+
+
+def test_downsample_time_series_monthly_yearly():
+    """
+    Assert that downsampling time series on a monthly and yearly basis is
+    working as expected.
+    """
+    t = ymd_to_xldates(
+        [2017, 2017, 2018, 2018], [11, 11, 1, 3], [1, 30, 15, 2])
+    x = np.array([1, 2, 3, 4])
+
+    tm, xm = downsample_time_series(t, x, 'month', 'mean')
+    assert np.array_equal(tm, ymd_to_xldates(
+        [2017, 2017, 2018, 2018, 2018], [11, 12, 1, 2, 3], [1] * 5))
+    np.testing.assert_array_equal(xm, [1.5, np.nan, 3, np.nan, 4])
+
+    ty, xy = downsample_time_series(t, x, 'year', 'max')
+    assert np.array_equal(ty, ymd_to_xldates([2017, 2018], [1, 1], [1, 1]))
+    np.testing.assert_array_equal(xy, [2, 4])
+
+
+def test_math_does_not_import_qt():
+    """
+    Test that the math utilities can be imported without pulling in PyQt5.
+    """
+    code = ("import sys; import gwhat.utils.math; "
+            "sys.exit(any(m.startswith('PyQt5') for m in sys.modules))")
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__)))))] +
+        [p for p in [env.get('PYTHONPATH')] if p])
+    assert subprocess.call([sys.executable, '-c', code], env=env) == 0
+
+
+if __name__ == "__main__":
+    pytest.main(['-x', os.path.basename(__file__), '-v', '-rw'])